@@ -0,0 +1,32 @@
+"""
+Monte Carlo balance simulator for the event outcome model in support/resolution.py.
+Prints the success and injury rates for a grid of party levels and hazard levels, to check the coefficients
+give the difficulty curve intended before changing them in the game.
+
+Usage: python balance.py --resolutions 200000 --action Engage
+"""
+import argparse
+
+from support.resolution import ACTIONS, simulate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate event outcomes to tune the resolution model.")
+    parser.add_argument("--resolutions", type=int, default=200000, help="Events to resolve for each level and hazard level.")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 3, 5, 8], help="Party levels to simulate.")
+    parser.add_argument("--hazards", type=int, nargs="+", default=[0, 1, 2, 3, 4], help="Hazard levels to simulate.")
+    parser.add_argument("--action", choices=list(ACTIONS), default="Engage", help="The action every party takes.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a repeatable run.")
+    args = parser.parse_args()
+
+    result = simulate(args.resolutions, args.levels, args.hazards, args.action, args.seed)
+    header = "level " + "".join(f"  {'hazard ' + str(hazard):<13}" for hazard in args.hazards)
+    print("Success / injury rate")
+    print(header)
+    for i, level in enumerate(args.levels):
+        print(f"{level:<6}" + "".join(f"  {result['success'][i, j]:5.1%} / {result['injury'][i, j]:5.1%}" for j in range(len(args.hazards))))
+    print(f"{result['rate'] / 1e6:.1f} million resolutions per second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Memory and construction-time benchmark for the hot game entities (Character and Location).
+
+Compares the current slotted dataclasses against the pydantic models they replaced.
+Run from the repository root with: python -m benchmarks.bench_entities [count]
+"""
+import pickle, sys, timeit, tracemalloc
+from typing import Callable, List, Optional
+from pydantic import BaseModel, Field
+
+from support.character import Character
+from support.location import Location
+
+
+class PydanticCharacter(BaseModel):
+    name: str = Field(...)
+    description: str = Field(...)
+    specialization: str = Field(...)
+    talent: Optional[str] = Field(None)
+    level: int = Field(1)
+    xp: int = Field(0)
+    hp: int = Field(1)
+    gear: List[str] = Field(default_factory=list)
+
+
+class PydanticLocation(BaseModel):
+    name: str = Field(...)
+    region_name: str = Field(...)
+    distance: float = Field(...)
+    description: str = Field(...)
+    discovered: bool = Field(...)
+
+
+# Shared strings so the measurement is of the entity overhead rather than the text itself
+NAME = "Vessa Korrin"
+DESCRIPTION = "A weathered scout who knows every dry riverbed between here and the salt flats."
+SPECIALIZATION = "Tracking"
+REGION = "The Ashen Reach"
+
+
+def make_character(cls) -> Callable[[int], object]:
+    return lambda i: cls(name=NAME, description=DESCRIPTION, specialization=SPECIALIZATION, talent=None,
+                         level=1, xp=0, hp=1, gear=[])
+
+
+def make_location(cls) -> Callable[[int], object]:
+    return lambda i: cls(name=NAME, region_name=REGION, distance=float(i), description=DESCRIPTION, discovered=True)
+
+
+def bytes_per_entity(factory: Callable[[int], object], count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    entities = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del entities
+    return total / count
+
+
+def construction_us(factory: Callable[[int], object], count: int) -> float:
+    timer = timeit.Timer(lambda: [factory(i) for i in range(count)])
+    repeats, elapsed = timer.autorange()
+    return elapsed / repeats / count * 1e6
+
+
+def pickled_bytes(factory: Callable[[int], object], count: int) -> float:
+    return len(pickle.dumps([factory(i) for i in range(count)])) / count
+
+
+def run(count: int = 10000) -> dict:
+    cases = {
+        "character": (make_character(PydanticCharacter), make_character(Character)),
+        "location": (make_location(PydanticLocation), make_location(Location)),
+    }
+    results = {}
+    for name, (before, after) in cases.items():
+        results[name] = {
+            label: {
+                "bytes_per_entity": bytes_per_entity(factory, count),
+                "construction_us": construction_us(factory, count),
+                "pickled_bytes": pickled_bytes(factory, count),
+            }
+            for label, factory in (("before", before), ("after", after))
+        }
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    results = run(count)
+    print(f"{'entity':<10} {'version':<8} {'bytes/entity':>13} {'construct (us)':>15} {'pickled bytes':>14}")
+    for name, versions in results.items():
+        for label, stats in versions.items():
+            print(f"{name:<10} {label:<8} {stats['bytes_per_entity']:>13.1f} {stats['construction_us']:>15.3f} {stats['pickled_bytes']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
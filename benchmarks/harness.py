@@ -0,0 +1,155 @@
+"""
+Shared pieces for the benchmarks: a mocked LLM transport so everything runs offline, a fake curses window, world
+builders and a timer. Nothing here touches the network or the terminal.
+"""
+from typing import Callable, List, Optional
+import hashlib, json, statistics, threading, time, timeit
+
+from support.character import Character
+from support.gamestate import GameState
+from support.location import Location
+from support.region import Region
+from utils.llm_client import LLMClient
+from utils.llm_transport import TransportResponse
+
+SYLLABLES = ["ar", "bel", "cor", "dun", "el", "fen", "gar", "hol", "ir", "jas", "kel", "lor", "mar", "nor", "os",
+             "pel", "quin", "ros", "sar", "tor", "ul", "vel", "wen", "yr", "zan"]
+WORDS = ["quiet", "old", "windswept", "narrow", "busy", "ruined", "sunlit", "hidden", "stone", "river", "market",
+         "watchtower", "road", "valley", "outpost", "hall", "crossing", "harbour", "forge", "garden"]
+
+
+class MockTransport:
+    """
+    Answers LLM requests locally with replies that pass validation for their prompt type, derived from the prompt
+    so the same prompt always gets the same reply. Optionally waits a fixed time per request to stand in for the
+    network.
+    """
+    rate_limited = False
+
+    def __init__(self, latency: float = 0.0):
+        """
+        :param latency: Seconds to wait before each reply.
+        """
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def post(self, url: str, headers: dict, json: dict, timeout: float):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = json["messages"][-1]["content"]
+        return TransportResponse(status_code=200, text=reply_json(reply_for(prompt)))
+
+
+def reply_for(prompt: str) -> str:
+    digest = hashlib.sha256(prompt.encode()).digest()
+    def word(i: int) -> str:
+        return WORDS[digest[i] % len(WORDS)]
+    def name(i: int) -> str:
+        return "".join(SYLLABLES[b % len(SYLLABLES)] for b in digest[i:i + 2 + digest[i] % 2]).capitalize()
+    if "one-sentence description" in prompt:
+        return f"A {word(0)} {word(1)} near {name(2)}, known for its {word(3)} {word(4)}."
+    if "paragraph" in prompt or "Condense" in prompt:
+        return " ".join(f"The {word(i)} {word(i + 1)} of {name(i + 2)} was {word(i + 3)}." for i in range(0, 24, 4))
+    return f"{name(0)} {name(4)}"
+
+
+def reply_json(text: str) -> str:
+    return json.dumps({"choices": [{"message": {"content": text}}], "usage": {"prompt_tokens": 60, "completion_tokens": 12}})
+
+
+class FakeWindow:
+    """
+    An in-memory stand-in for a curses window, keeping a character grid the way curses' virtual screen does.
+    """
+
+    def __init__(self, width: int = 70, height: int = 24):
+        self.width = width
+        self.height = height
+        self.clear()
+
+    def keypad(self, flag: bool):
+        pass
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def getyx(self) -> tuple[int, int]:
+        return self.y, self.x
+
+    def clear(self):
+        self.rows: List[List[str]] = [[" "] * self.width for _ in range(self.height)]
+        self.y = self.x = 0
+
+    def addstr(self, y: int, x: int, text: str):
+        if y >= self.height:
+            self.rows.extend([" "] * self.width for _ in range(y - self.height + 1))
+            self.height = y + 1
+        row = self.rows[y]
+        end = min(self.width, x + len(text))
+        row[x:end] = text[:end - x]
+        self.y, self.x = y, end
+
+    def instr(self, y: int, x: int, n: Optional[int] = None) -> bytes:
+        return "".join(self.rows[y][x:None if n is None else x + n]).encode()
+
+    def refresh(self):
+        pass
+
+    def getch(self) -> int:
+        return ord('1')
+
+
+def make_client() -> LLMClient:
+    """
+    A client for the mocked transport, see set_transport. The URL and key are never used.
+    """
+    return LLMClient.create("http://mock.invalid/v1/chat/completions", "mock", None, "fantasy")
+
+
+def small_world(seed: int = 1) -> GameState:
+    """
+    A freshly created world with every region's locations generated, as after a short session.
+    """
+    game_state = GameState.create(make_client(), "fantasy", seed=seed)
+    for region in game_state.regions:
+        game_state.materialise_region(region, quiet=True)
+    return game_state
+
+
+def large_world(regions: int = 200, locations: int = 25, characters: int = 1000, seed: int = 1) -> GameState:
+    """
+    A small world padded out with extra regions, locations and characters, as after a very long campaign.
+    """
+    game_state = small_world(seed)
+    description = "A windswept valley of old stone walls and narrow roads, known for its market."
+    for i in range(regions):
+        region = Region.create(game_state.llm_client, f"Region {i}", description, materialised=False)
+        region.locations = [Location(f"Location {i}-{j}", region.name, float(j), description, j % 2 == 0) for j in range(locations)]
+        region.materialised = True
+        game_state.regions.append(region)
+    game_state.characters.extend(Character(name=f"Character {i}", description=description, specialization="Tracking",
+                                           level=1 + i % 10, xp=i, hp=1 + i % 5, gear=["rope", "lantern"])
+                                 for i in range(characters))
+    return game_state
+
+
+def measure(function: Callable[[], object], repeat: int = 5, min_time: float = 0.2) -> dict:
+    """
+    Times a function, calling it enough times per run to fill min_time, and summarises the runs per call.
+
+    :return: The median, fastest and mean seconds per call, the calls per run and the number of runs.
+    """
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / elapsed)) if elapsed < min_time else number
+    runs = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {
+        "median_s": statistics.median(runs),
+        "min_s": min(runs),
+        "mean_s": statistics.fmean(runs),
+        "number": number,
+        "repeat": repeat,
+    }
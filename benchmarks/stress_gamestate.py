@@ -0,0 +1,136 @@
+"""
+Stress test for GameState's concurrency model: recruiting, running expeditions, generating regions, ticking the
+economy and saving all at once, against a mocked LLM. Every save is loaded back and checked for consistency, e.g.
+that the recruitment cost matches the number of recruits, which would break if a save caught a recruit half-applied.
+
+Run from the repository root with: python -m benchmarks.stress_gamestate [seconds]
+Exits with status 1 if any save was inconsistent or any worker failed.
+"""
+from typing import Callable, Dict, List, Optional
+import logging, os, pickle, sys, tempfile, threading, time, traceback
+
+from benchmarks.harness import FakeWindow, MockTransport, make_client
+from support.character import Character
+from support.economy import TICK_SECONDS
+from support.expedition import plan_expeditions, run_expeditions
+from support.gamestate import GameState
+from support.region import Region
+from support.world_map import WorldMap
+from utils.llm_transport import set_transport
+from utils.screen import Screen
+
+# Stands in for the network, so generation overlaps with everything else the way it does in play
+LATENCY = 0.002
+STARTING_CHARACTERS = 3
+STARTING_COST = 10
+EXTRA_REGIONS = 20
+
+
+def check(data: bytes) -> List[str]:
+    """
+    Loads a save and lists everything inconsistent about it.
+    """
+    game_state: GameState = pickle.loads(data)
+    problems = []
+    recruits = len(game_state.characters) - STARTING_CHARACTERS
+    if game_state.recruitment_cost != STARTING_COST + 5 * recruits:
+        problems.append(f"recruitment cost {game_state.recruitment_cost} doesn't match {recruits} recruits")
+    if game_state.currency < 0:
+        problems.append(f"negative currency {game_state.currency}")
+    for region in game_state.regions:
+        if region.materialised and not region.locations:
+            problems.append(f"{region.name} is marked generated but has no locations")
+        if not region.materialised and region.locations:
+            problems.append(f"{region.name} has locations but isn't marked generated")
+    if len(game_state.similarity.texts) != len(game_state.similarity.signatures):
+        problems.append("similarity index texts and signatures are out of step")
+    for character in game_state.characters:
+        if not 0 <= character.hp <= max(character.level, 1):
+            problems.append(f"{character.name} has {character.hp} HP at level {character.level}")
+    return problems
+
+
+def stress(seconds: float) -> Dict[str, int]:
+    set_transport(MockTransport(LATENCY))
+    game_state = GameState.create(make_client(), "fantasy", seed=1)
+    # More stubs than the world starts with, so region generation keeps running throughout
+    game_state.regions.extend(Region.create(game_state.llm_client, f"Region {i}", "A quiet valley.", materialised=False)
+                              for i in range(EXTRA_REGIONS))
+    game_state.world_map = WorldMap.generate(game_state.home_base, game_state.regions, game_state.llm_client.rng.stream("map"))
+    screen = Screen.create_for_window(FakeWindow())
+    stop = threading.Event()
+    counts: Dict[str, int] = {}
+    failures: List[str] = []
+    clock = [time.time()]
+
+    def worker(name: str, step: Callable[[], Optional[bool]]) -> threading.Thread:
+        def run():
+            while not stop.is_set():
+                try:
+                    # Steps that can do nothing, e.g. recruiting without enough currency, return False
+                    if step() is not False:
+                        counts[name] = counts.get(name, 0) + 1
+                except Exception:
+                    failures.append(f"{name}: {traceback.format_exc()}")
+                    stop.set()
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def recruit() -> bool:
+        return game_state.recruit(Character(name=f"Recruit {counts.get('recruit', 0)}", description="A recruit.", specialization="Tracking"))
+
+    def expedition() -> bool:
+        return bool(run_expeditions(game_state, plan_expeditions(game_state)))
+
+    def materialise() -> bool:
+        stubs = [region for region in game_state.regions if not region.materialised]
+        if not stubs:
+            return False
+        game_state.materialise_region(stubs[0], quiet=True)
+        return True
+
+    def tick():
+        # Ten ticks at a time, so income, healing and expeditions returning all happen often
+        clock[0] += TICK_SECONDS * 10
+        game_state.economy.advance(game_state, now=clock[0])
+
+    def save():
+        path = os.path.join(scratch, "stress.dat")
+        game_state.save(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        problems = check(data)
+        if problems:
+            failures.extend(f"save: {problem}" for problem in problems)
+            stop.set()
+        GameState.load(screen, data)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        threads = [worker("recruit", recruit), worker("expedition", expedition), worker("materialise", materialise),
+                   worker("tick", tick), worker("save", save), worker("save_2", save)]
+        stop.wait(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    set_transport(None)
+
+    for failure in failures:
+        print(failure)
+    counts["failures"] = len(failures)
+    return counts
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    # The game logs every generation, which would swamp the output
+    logging.disable(logging.CRITICAL)
+    counts = stress(seconds)
+    for name, count in counts.items():
+        print(f"{name:<12} {count:>8}")
+    if counts["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
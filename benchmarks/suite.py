@@ -0,0 +1,216 @@
+"""
+Benchmarks for the game's hot paths, run offline against a mocked LLM transport: world creation, multi_generate
+fan-out, saving and loading small and very large worlds, text wrapping and option rendering on a fake window,
+weighted choice and prompt assembly.
+
+Run from the repository root:
+    python -m benchmarks.suite run [--out benchmarks/results.json] [--only NAME] [--quick]
+    python -m benchmarks.suite compare [--baseline benchmarks/baseline.json] [--results benchmarks/results.json]
+
+To store a baseline, run with --out benchmarks/baseline.json. compare exits with status 1 if any benchmark's
+fastest time per call is more than --threshold (25% by default) slower than the baseline.
+"""
+from datetime import datetime
+from typing import Callable, Dict
+import argparse, json, logging, os, platform, random, sys, tempfile
+
+from benchmarks.harness import FakeWindow, MockTransport, large_world, make_client, measure, small_world
+from support.gamestate import GameState
+from utils.base_utils import choice
+from utils.llm_transport import set_transport
+from utils.prompts import ContextSlot, Prompts
+from utils.screen import Screen
+
+DEFAULT_RESULTS = os.path.join("benchmarks", "results.json")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Compared rather than the median, since noise from the rest of the machine only ever makes a run slower
+COMPARED = "min_s"
+# Stands in for the network in the fan-out benchmarks, where the point is how requests overlap
+FAN_OUT_LATENCY = 0.01
+FAN_OUT_SIZES = [1, 8, 32, 128]
+
+PARAGRAPH = ("The caravan reached the edge of the salt flats as the light failed, and the scouts argued over whether "
+             "to make camp or press on to the old waystation. Nobody had heard from the waystation in a month.\n"
+             "Vessa Korrin said the wind was changing. ") * 3
+
+
+def bench_create() -> dict:
+    set_transport(MockTransport())
+    seeds = iter(range(1_000_000))
+    return measure(lambda: GameState.create(make_client(), "fantasy", seed=next(seeds)), repeat=3)
+
+
+def bench_fan_out(size: int) -> Callable[[], dict]:
+    def bench() -> dict:
+        set_transport(MockTransport(FAN_OUT_LATENCY))
+        client = make_client()
+        return measure(lambda: client.multi_generate(size, "name", "character", quiet=True), repeat=3)
+    return bench
+
+
+def bench_save(build: Callable[[], GameState]) -> Callable[[], dict]:
+    def bench() -> dict:
+        set_transport(MockTransport())
+        game_state = build()
+        return measure(lambda: game_state.save("bench.dat"))
+    return bench
+
+
+def bench_load(build: Callable[[], GameState]) -> Callable[[], dict]:
+    def bench() -> dict:
+        set_transport(MockTransport())
+        build().save("bench.dat")
+        with open("bench.dat", "rb") as f:
+            data = f.read()
+        screen = Screen.create_for_window(FakeWindow())
+        return measure(lambda: GameState.load(screen, data))
+    return bench
+
+
+def bench_wrap_text() -> dict:
+    screen = Screen.create_for_window(FakeWindow())
+    return measure(lambda: screen.wrap_text(PARAGRAPH))
+
+
+def bench_display_options() -> dict:
+    screen = Screen.create_for_window(FakeWindow())
+    options = [f"Travel to Location {i}, {i * 1.5:.1f} days away across the windswept valley" for i in range(9)]
+    return measure(lambda: screen.display_options(PARAGRAPH, options))
+
+
+def bench_choice(weighted: bool) -> Callable[[], dict]:
+    def bench() -> dict:
+        rng = random.Random(1)
+        choices = list(range(100))
+        weights = [float(i + 1) for i in choices] if weighted else None
+        return measure(lambda: choice(choices, weights, rng=rng))
+    return bench
+
+
+def bench_get_prompt(with_context: bool) -> Callable[[], dict]:
+    def bench() -> dict:
+        prompts = Prompts()
+        if with_context:
+            context = [ContextSlot(title="Recent events", items=[f"{PARAGRAPH[:120]} ({i})" for i in range(50)]),
+                       ContextSlot(title="Party", items=[f"Character {i}, a tracker" for i in range(10)], priority=1)]
+            return measure(lambda: prompts.get_prompt("event", context=context, seed=1, theme="fantasy", type="combat",
+                                                      region="the Ashen Reach", characters="Vessa and Tam",
+                                                      region_description=PARAGRAPH[:200]))
+        return measure(lambda: prompts.get_prompt("name", seed=1, theme="fantasy", type="character"))
+    return bench
+
+
+def benchmarks(quick: bool = False) -> Dict[str, Callable[[], dict]]:
+    """
+    Every benchmark by name. Quick runs use a smaller "large" world.
+    """
+    large = (lambda: large_world(20, 10, 100)) if quick else large_world
+    cases: Dict[str, Callable[[], dict]] = {"game_state.create": bench_create}
+    cases.update({f"multi_generate.fan_out_{size}": bench_fan_out(size) for size in FAN_OUT_SIZES})
+    cases.update({
+        "game_state.save.small": bench_save(small_world),
+        "game_state.save.large": bench_save(large),
+        "game_state.load.small": bench_load(small_world),
+        "game_state.load.large": bench_load(large),
+        "screen.wrap_text": bench_wrap_text,
+        "screen.display_options": bench_display_options,
+        "choice.uniform": bench_choice(False),
+        "choice.weighted": bench_choice(True),
+        "prompts.get_prompt": bench_get_prompt(False),
+        "prompts.get_prompt.context": bench_get_prompt(True),
+    })
+    return cases
+
+
+def run(out: str, only: str = "", quick: bool = False) -> dict:
+    """
+    Runs the benchmarks whose names contain only, in a scratch directory so saves and world packs don't leak in
+    either direction, and writes the results as JSON.
+    """
+    out = os.path.abspath(out)
+    cwd = os.getcwd()
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for name, bench in benchmarks(quick).items():
+                if only in name:
+                    results[name] = bench()
+                    print(f"{name:<32} {results[name]['median_s'] * 1000:>12.4f} ms")
+        finally:
+            set_transport(None)
+            os.chdir(cwd)
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def compare(baseline: dict, results: dict, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """
+    Compares the fastest time per call against a baseline and prints a line per benchmark.
+
+    :return: The names of the benchmarks that regressed by more than threshold.
+    """
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline ms':>12} {'now ms':>12} {'change':>8}")
+    for name, now in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>12} {now[COMPARED] * 1000:>12.4f} {'new':>8}")
+            continue
+        change = now[COMPARED] / before[COMPARED] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<32} {before[COMPARED] * 1000:>12.4f} {now[COMPARED] * 1000:>12.4f} {change:>+8.0%}{flag}")
+    if baseline.get("quick") != results.get("quick"):
+        print("Warning: the baseline and results were run with different --quick settings.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths against a mocked LLM.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the benchmarks and write the results as JSON.")
+    run_parser.add_argument("--out", default=DEFAULT_RESULTS)
+    run_parser.add_argument("--only", default="", help="Only run benchmarks whose names contain this.")
+    run_parser.add_argument("--quick", action="store_true", help="Use a smaller large world.")
+    compare_parser = commands.add_parser("compare", help="Flag regressions against a stored baseline.")
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    compare_parser.add_argument("--results", default=DEFAULT_RESULTS)
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="The fractional slowdown that counts as a regression.")
+    args = parser.parse_args()
+
+    # The game logs every generation, which would swamp the output
+    logging.disable(logging.CRITICAL)
+    if args.command == "run":
+        run(args.out, args.only, args.quick)
+    else:
+        for path, hint in ((args.baseline, f"--out {args.baseline}"), (args.results, f"--out {args.results}")):
+            if not os.path.exists(path):
+                sys.exit(f"No results at {path}; run `python -m benchmarks.suite run {hint}` first.")
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.results) as f:
+            results = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Terminal client for server.py. Draws the frames the server sends and forwards keypresses.
+
+The client identifies the player to the server with a random token kept in a file, so the same player gets the
+same saves back whenever they connect with it. Keep the file private: anyone with the token can open those saves.
+
+Usage: python client.py [--host 127.0.0.1] [--port 7070] [--token-file ~/.text_game_token]
+"""
+import argparse, curses, os, queue, secrets, socket, threading
+
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".text_game_token")
+
+
+def load_token(path: str) -> str:
+    """
+    Reads the player token from a file, creating the file with a new token if there isn't one.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            return f.read().strip()
+    token = secrets.token_hex(16)
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(token + "\n")
+    return token
+
+
+def receive_frames(rfile, frames: "queue.Queue[list[str] | None]"):
+    """
+    Reads frames from the server until the connection closes, then queues None.
+    """
+    while True:
+        line = rfile.readline()
+        if not line:
+            break
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "FRAME":
+            frames.put([rfile.readline().rstrip('\n') for _ in range(int(parts[1]))])
+    frames.put(None)
+
+
+def run(stdscr: "curses.window", host: str, port: int, token: str):
+    sock = socket.create_connection((host, port))
+    rfile = sock.makefile('r', encoding='utf-8')
+    wfile = sock.makefile('w', encoding='utf-8')
+    wfile.write(f"HELLO {token}\n")
+    wfile.flush()
+
+    frames: "queue.Queue[list[str] | None]" = queue.Queue()
+    receiver = threading.Thread(target=receive_frames, args=(rfile, frames))
+    receiver.daemon = True
+    receiver.start()
+
+    curses.curs_set(0)
+    stdscr.keypad(True)
+    stdscr.timeout(50)
+    while True:
+        # Only draw the latest frame, e.g. when the loading animation has sent several
+        frame = None
+        try:
+            while True:
+                frame = frames.get_nowait()
+                if frame is None:
+                    return
+        except queue.Empty:
+            pass
+        if frame is not None:
+            height, width = stdscr.getmaxyx()
+            stdscr.erase()
+            for i, row in enumerate(frame[:height]):
+                stdscr.addnstr(i, 0, row, width - 1)
+            stdscr.refresh()
+
+        c = stdscr.getch()
+        if c != -1:
+            try:
+                wfile.write(f"KEY {c}\n")
+                wfile.flush()
+            except OSError:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connect to a game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7070)
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_FILE, help="The file holding the token that identifies you.")
+    args = parser.parse_args()
+    curses.wrapper(run, args.host, args.port, load_token(args.token_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,27 @@
-import json
+import atexit, json
 import threading, time
 import os
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Callable, Optional
 
 from utils.llm_client import LLMClient
+from utils.metrics import metrics
 from utils.screen import Screen
+from utils.profiling import profiler
 from utils.base_utils import file_browser
 from support.gamestate import GameState
 from support.home_base import home_base_screen
+from support.economy import run_economy
 
 # Configure logging
 log_folder = 'logs'
 os.makedirs(log_folder, exist_ok=True)
 log_filename = os.path.join(log_folder, f"game_log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
+# The metrics as they stood when the process exited, written alongside the log
+metrics_filename = os.path.join(log_folder, f"metrics_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
 logging.basicConfig(
     filename=log_filename,
     level=logging.DEBUG,
@@ -30,7 +35,7 @@ class Game(BaseModel):
     filename: Optional[str] = Field(None)
 
     @classmethod
-    def create(cls, screen: Screen, game_state: Optional[GameState] = None, filename: Optional[str] = None):
+    def create(cls, screen: Screen, game_state: Optional[GameState] = None, filename: Optional[str] = None, session_id: Optional[str] = None):
         api_key = os.getenv("API_KEY")
         api_url = os.getenv("API_URL")
         if not api_key or not api_url:
@@ -38,7 +43,7 @@ class Game(BaseModel):
             logging.error("Error: API key or URL not found in environment variables.")
             time.sleep(2)
             return None
-        llm_client = LLMClient.create(api_url, api_key, screen, None)
+        llm_client = LLMClient.create(api_url, api_key, screen, None, session_id)
 
         if game_state is None:
             while True:
@@ -64,6 +69,7 @@ class Game(BaseModel):
 
         if game_state.llm_client:
             game_state.llm_client.set_theme(game_state.theme)
+            game_state.llm_client.session_id = session_id
 
         return cls(
             screen=screen,
@@ -72,12 +78,13 @@ class Game(BaseModel):
         )
 
     @classmethod
-    def load(cls, screen: Screen, filename):
+    def load(cls, screen: Screen, filename, session_id: Optional[str] = None):
         logging.info(f"Loading game from {filename}")
         try:
             with open(filename, 'rb') as f:
                 game_state = GameState.load(screen, f.read())
-                return cls.create(screen, game_state, filename)
+                game_state.save_filename = filename
+                return cls.create(screen, game_state, filename, session_id)
         except FileNotFoundError:
             screen.display("Error loading game: Save file not found.")
             logging.error(f"Error loading game: Save file not found.")
@@ -93,41 +100,58 @@ class Game(BaseModel):
         autosave_thread = threading.Thread(target=self.autosave)
         autosave_thread.daemon = True
         autosave_thread.start()
+        economy_thread = threading.Thread(target=run_economy, args=(self.game_state,))
+        economy_thread.daemon = True
+        economy_thread.start()
 
         while True:
-            home_base_screen(self.screen, self.game_state)
+            with profiler.span("game.loop"):
+                home_base_screen(self.screen, self.game_state)
 
     def autosave(self):
         while True:
             try:
                 self.save()
                 logging.info("Autosave completed successfully.")
+                metrics.log()
             except Exception as e:
                 logging.error(f"Error during autosave: {e}")
             time.sleep(60)
 
     def save(self, filename: Optional[str] = None):
-        self.game_state.save(filename)
+        self.game_state.save(filename or self.filename)
 
 
-def main_menu(screen: Screen):
+def main_menu(screen: Screen, session_id: Optional[str] = None, folder: str = ".", claim: Optional[Callable[[str], bool]] = None):
+    """
+    Lets the player start a new game or load a saved one.
+
+    :param folder: The folder to keep save files in.
+    :param claim: Called with the chosen save file before it's used, returning False if it's already in use elsewhere.
+    """
+    def usable(filename: Optional[str]) -> bool:
+        if filename and claim is not None and not claim(filename):
+            screen.temp_display(2, "That save is open in another session.")
+            return False
+        return bool(filename)
+
     while True:
         screen.display_options("Main Menu", ["New Game", "Load Game"])
         c = screen.handle_keypress(None)
         if c == ord('1'):
-            filename = file_browser(screen, mode="save")
-            if filename:
+            filename = file_browser(screen, mode="save", folder=folder)
+            if usable(filename):
                 screen.display("Creating new game...")
-                game = Game.create(screen, filename=filename)
+                game = Game.create(screen, filename=filename, session_id=session_id)
                 if game:
                     game.save(filename)
                     screen.temp_display(2, f"Game will be saved to {filename}")
                     break
         elif c == ord('2'):
-            filename = file_browser(screen, mode="open")
-            if filename:
+            filename = file_browser(screen, mode="open", folder=folder)
+            if usable(filename):
                 screen.display(f"Loading game from {filename}...")
-                game = Game.load(screen, filename)
+                game = Game.load(screen, filename, session_id)
                 if game:
                     break
     return game
@@ -135,6 +159,8 @@ def main_menu(screen: Screen):
 
 def main():
     load_dotenv("local.env")
+    profiler.configure_from_env()
+    atexit.register(metrics.write, metrics_filename)
     screen = Screen.create(width=70)
 
     game = main_menu(screen)
@@ -0,0 +1,85 @@
+"""
+Pre-generates themed world content into a world pack, so new games can be assembled without waiting on the LLM.
+Work is queued as jobs in the pack file itself: if a run is interrupted, running the same command again carries on
+with the jobs that hadn't finished.
+
+Usage: python pregenerate.py --theme fantasy --worlds 50
+       python pregenerate.py --theme "wild west" --characters 200 --regions 100 --locations 500
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, logging, os, sys, time
+from dotenv import load_dotenv
+
+from support.world_pack import DEFAULT_PACK_PATH, KINDS, PackJob, WorldPack, generate_item
+from utils.llm_client import LLMClient
+from utils.rate_limiter import get_rate_limiter
+
+# What one world takes from a pack. Locations are 2-5 per region, so allow for the maximum.
+PER_WORLD = {"currency": 1, "character": 3, "region": 5, "location": 25, "home_base": 1}
+
+
+def run_jobs(pack: WorldPack, llm_client: LLMClient, jobs: list[PackJob], workers: int):
+    """
+    Runs the given jobs concurrently, writing each item to the pack as soon as it is generated.
+    """
+    done = failed = 0
+    start = time.time()
+
+    def run(job: PackJob):
+        item = generate_item(llm_client, job.kind, seed=job.id)
+        pack.add(job.theme, job.kind, item, job.id)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                pack.record_failure(job.id)
+                failed += 1
+                logging.error(f"Pack job {job.id} ({job.kind}) failed: {e}")
+            elapsed = time.time() - start
+            print(f"\r{done + failed}/{len(jobs)} jobs, {failed} failed, {done / elapsed if elapsed else 0:.1f} items/s", end="", flush=True)
+    print()
+
+
+def main():
+    load_dotenv("local.env")
+    parser = argparse.ArgumentParser(description="Pre-generate themed content into a world pack.")
+    parser.add_argument("--theme", required=True, help="The game theme, e.g. 'fantasy' or 'sci-fi'.")
+    parser.add_argument("--pack", default=DEFAULT_PACK_PATH, help=f"The pack file (default: {DEFAULT_PACK_PATH}).")
+    parser.add_argument("--worlds", type=int, default=0, help="Make sure the pack has enough content for this many worlds.")
+    for kind, flag in (("currency", "--currencies"), ("character", "--characters"), ("region", "--regions"),
+                       ("location", "--locations"), ("home_base", "--home-bases")):
+        parser.add_argument(flag, dest=kind, type=int, default=0,
+                            help=f"Minimum number of unused {kind.replace('_', ' ')} items to have in the pack.")
+    parser.add_argument("--workers", type=int, default=int(get_rate_limiter().concurrency.max_limit),
+                        help="Maximum number of jobs to run at once.")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Give up on a job after this many failures.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    api_key = os.getenv("API_KEY")
+    api_url = os.getenv("API_URL")
+    if not api_key or not api_url:
+        sys.exit("Error: API key or URL not found in environment variables.")
+
+    pack = WorldPack(args.pack)
+    targets = {kind: max(getattr(args, kind), PER_WORLD[kind] * args.worlds) for kind in KINDS}
+    queued = pack.enqueue(args.theme, targets, args.max_attempts)
+    jobs = pack.pending_jobs(args.theme, args.max_attempts)
+    print(f"Queued {queued} new jobs, {len(jobs)} to run for theme '{args.theme}'.")
+
+    if jobs:
+        llm_client = LLMClient.create(api_url, api_key, None, args.theme)
+        run_jobs(pack, llm_client, jobs, args.workers)
+
+    available = pack.available(args.theme)
+    print("Available: " + ", ".join(f"{count} {kind}" for kind, count in available.items()))
+    pack.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Builds many worlds at once without the UI, e.g. for tournaments, demos or load tests, and writes each straight to a
+save file. Worlds are built in a pool of processes that share one rate limiter, served from this process, so the
+pool as a whole stays inside the provider limits set by LLM_REQUESTS_PER_SECOND, LLM_TOKENS_PER_MINUTE and
+LLM_MAX_CONCURRENCY. Worlds are taken from the world pack first if there is one.
+
+Progress is checkpointed to provision.json in the output folder after every world: running the same command again
+carries on with the worlds that hadn't been built, with the same seeds.
+
+Usage: python provision.py --theme fantasy --worlds 100 --out worlds
+       python provision.py --theme "wild west" --worlds 20 --out demo --processes 4 --lazy
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Optional
+import argparse, json, logging, multiprocessing, os, random, sys, time
+from dotenv import load_dotenv
+
+from support.gamestate import GameState
+from utils.llm_client import LLMClient
+from utils.metrics import metrics
+from utils.rate_limiter import RateLimiter, connect_rate_limiter, serve_rate_limiter, set_rate_limiter
+from utils.world_random import derive_seed
+
+MANIFEST = "provision.json"
+
+
+def init_worker(address: tuple[str, int], authkey: bytes, max_concurrency: float):
+    """
+    Sets up a worker process to send every LLM request through the coordinator's rate limiter.
+    """
+    load_dotenv("local.env")
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    set_rate_limiter(connect_rate_limiter(address, authkey, max_concurrency))
+
+
+def build_world(index: int, seed: int, theme: str, path: str, lazy: bool) -> dict:
+    """
+    Builds one world and saves it. Runs in a worker process, one world at a time, so the process's token counters
+    only count this world.
+
+    :param lazy: Leave regions as stubs to be generated on first visit, rather than generating them all now.
+    :return: The world's entry for the manifest.
+    """
+    api_key = os.getenv("API_KEY")
+    api_url = os.getenv("API_URL")
+    if not api_key or not api_url:
+        raise RuntimeError("API key or URL not found in environment variables.")
+    start = time.monotonic()
+    tokens = metrics.counter("llm.input_tokens") + metrics.counter("llm.output_tokens")
+
+    llm_client = LLMClient.create(api_url, api_key, None, theme, session_id=f"provision-{index}")
+    game_state = GameState.create(llm_client, theme, seed=seed)
+    if not lazy:
+        # Regions are independent, so generate them all at once and let the rate limiter pace them
+        with ThreadPoolExecutor(max_workers=len(game_state.regions)) as executor:
+            list(executor.map(lambda region: game_state.materialise_region(region, quiet=True), game_state.regions))
+    game_state.save(path)
+    if not os.path.exists(path):
+        raise RuntimeError(f"World {index} wasn't saved to {path}, see the log.")
+
+    return {
+        "status": "done",
+        "seed": seed,
+        "path": path,
+        "tokens": metrics.counter("llm.input_tokens") + metrics.counter("llm.output_tokens") - tokens,
+        "cost": llm_client.total_cost,
+        "seconds": time.monotonic() - start,
+    }
+
+
+def load_manifest(path: str, theme: str, seed: Optional[int]) -> dict:
+    """
+    Reads the checkpoint of an earlier run into the same folder, or starts a new one.
+    """
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest["theme"] != theme:
+            sys.exit(f"Error: {path} is for theme '{manifest['theme']}', not '{theme}'.")
+        return manifest
+    return {"theme": theme, "seed": seed if seed is not None else random.randrange(2 ** 63), "worlds": {}}
+
+
+def save_manifest(path: str, manifest: dict):
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    load_dotenv("local.env")
+    parser = argparse.ArgumentParser(description="Build many worlds in parallel, straight to save files.")
+    parser.add_argument("--theme", required=True, help="The game theme, e.g. 'fantasy' or 'sci-fi'.")
+    parser.add_argument("--worlds", type=int, required=True, help="How many worlds the folder should have.")
+    parser.add_argument("--out", default="worlds", help="The folder to write save files and the checkpoint to.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Worlds to build at once.")
+    parser.add_argument("--seed", type=int, default=None, help="The seed every world's seed is derived from. Random by default.")
+    parser.add_argument("--lazy", action="store_true", help="Leave regions to be generated on first visit.")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Give up on a world after this many failures.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    if not os.getenv("API_KEY") or not os.getenv("API_URL"):
+        sys.exit("Error: API key or URL not found in environment variables.")
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, MANIFEST)
+    manifest = load_manifest(manifest_path, args.theme, args.seed)
+    worlds: Dict[str, dict] = manifest["worlds"]
+    pending = [i for i in range(args.worlds)
+               if worlds.get(str(i), {}).get("status") != "done" and worlds.get(str(i), {}).get("attempts", 0) < args.max_attempts]
+    print(f"{args.worlds - len(pending)} of {args.worlds} worlds already built, {len(pending)} to build "
+          f"with {args.processes} processes.")
+    if not pending:
+        return
+
+    limiter = RateLimiter.from_env()
+    address, authkey = serve_rate_limiter(limiter)
+    built = failed = tokens = 0
+    start = time.monotonic()
+    # Spawned rather than forked, since this process already has the rate limiter's server thread running
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(address, authkey, limiter.concurrency.max_limit)) as executor:
+        futures = {}
+        for i in pending:
+            seed = derive_seed(manifest["seed"], "world", i)
+            path = os.path.join(args.out, f"world_{i:05d}.dat")
+            futures[executor.submit(build_world, i, seed, args.theme, path, args.lazy)] = i
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                attempts = worlds.get(str(i), {}).get("attempts", 0) + 1
+                try:
+                    worlds[str(i)] = {**future.result(), "attempts": attempts}
+                    built += 1
+                    tokens += worlds[str(i)]["tokens"]
+                except Exception as e:
+                    worlds[str(i)] = {"status": "failed", "error": str(e), "attempts": attempts}
+                    failed += 1
+                    logging.error(f"World {i} failed: {e}")
+                save_manifest(manifest_path, manifest)
+                minutes = (time.monotonic() - start) / 60
+                print(f"\r{built + failed}/{len(pending)} worlds, {failed} failed, {built / minutes:.1f} worlds/min, "
+                      f"{tokens / built if built else 0:.0f} tokens/world", end="", flush=True)
+        except KeyboardInterrupt:
+            print("\nInterrupted, run the same command again to carry on.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    print()
+
+    done = [world for world in worlds.values() if world.get("status") == "done"]
+    print(f"{len(done)} worlds built in total, {sum(world['tokens'] for world in done) / max(1, len(done)):.0f} tokens "
+          f"and ${sum(world['cost'] for world in done) / max(1, len(done)):.4f} per world.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Hosts many game sessions in one process over a simple line-based TCP protocol (see utils/remote_window.py).
+Every session shares one LLM request scheduler, so the process has a single connection pool and a global
+limit on concurrent requests, with requests from different sessions taken in turn.
+
+Each player's saves are kept in their own folder under SAVE_ROOT, picked by the token their client sends on
+connecting, and a save file can only be open in one session at a time.
+
+Usage: python server.py [--host 127.0.0.1] [--port 7070] [--workers 16]
+Connect with: python client.py [--host 127.0.0.1] [--port 7070]
+"""
+import argparse, atexit, hashlib, io, logging, os, socketserver, threading, time, uuid
+from typing import Dict
+from dotenv import load_dotenv
+
+from game import Game, main_menu, metrics_filename
+from support.economy import TICK_SECONDS
+from support.home_base import home_base_screen
+from utils.llm_scheduler import LLMScheduler, set_scheduler
+from utils.metrics import metrics
+from utils.profiling import profiler
+from utils.remote_window import RemoteWindow, read_hello
+from utils.screen import Screen
+
+SCREEN_WIDTH = 70
+SCREEN_HEIGHT = 24
+AUTOSAVE_INTERVAL = 60
+SAVE_ROOT = "saves"
+
+sessions: Dict[str, Game] = {}
+# The session each open save file belongs to, by absolute path. Also guarded by sessions_lock.
+open_saves: Dict[str, str] = {}
+sessions_lock = threading.Lock()
+
+
+def player_folder(token: str) -> str:
+    """
+    The folder a player's saves are kept in. Named by a hash of their token, so the folder names don't give it away.
+    """
+    folder = os.path.join(SAVE_ROOT, hashlib.sha256(token.encode()).hexdigest()[:16])
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def claim_save(session_id: str, filename: str) -> bool:
+    """
+    Marks a save file as open in a session, unless another session already has it open.
+
+    :return: Whether the session may use the file.
+    """
+    with sessions_lock:
+        return open_saves.setdefault(os.path.abspath(filename), session_id) == session_id
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    """
+    Runs one player's game for the lifetime of their connection.
+    """
+
+    def handle(self):
+        session_id = uuid.uuid4().hex[:8]
+        logging.info(f"Session {session_id} connected from {self.client_address}")
+        rfile = io.TextIOWrapper(self.rfile, encoding='utf-8')
+        wfile = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        token = read_hello(rfile)
+        if token is None:
+            logging.warning(f"Session {session_id} didn't identify itself, disconnecting.")
+            return
+        # The profiler covers the whole process, so it's only for whoever runs the server
+        screen = Screen.create_for_window(RemoteWindow(rfile, wfile, SCREEN_WIDTH, SCREEN_HEIGHT), SCREEN_WIDTH, SCREEN_HEIGHT,
+                                          profiling=False)
+
+        game = None
+        try:
+            game = main_menu(screen, session_id, player_folder(token), lambda filename: claim_save(session_id, filename))
+            with sessions_lock:
+                sessions[session_id] = game
+            while True:
+                with profiler.span("game.loop"):
+                    home_base_screen(screen, game.game_state)
+        except (ConnectionError, SystemExit):
+            # SystemExit is raised when the player quits with 'q', which has already saved
+            pass
+        finally:
+            with sessions_lock:
+                sessions.pop(session_id, None)
+            if game is not None:
+                game.game_state.llm_client.cancel_token.cancel()
+                game.save()
+            with sessions_lock:
+                for path in [path for path, owner in open_saves.items() if owner == session_id]:
+                    del open_saves[path]
+            logging.info(f"Session {session_id} ended")
+
+
+class GameServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def autosave_sessions():
+    """
+    Saves every active session periodically, in place of each game's own autosave thread.
+    """
+    while True:
+        time.sleep(AUTOSAVE_INTERVAL)
+        with sessions_lock:
+            games = list(sessions.items())
+        for session_id, game in games:
+            try:
+                game.save()
+            except Exception as e:
+                logging.error(f"Error during autosave of session {session_id}: {e}")
+        logging.info(f"Autosaved {len(games)} sessions.")
+        metrics.log()
+
+
+def tick_sessions():
+    """
+    Advances the economy of every active session once a tick, in place of each game's own economy thread.
+    """
+    while True:
+        time.sleep(TICK_SECONDS)
+        with sessions_lock:
+            games = list(sessions.items())
+        for session_id, game in games:
+            try:
+                game.game_state.economy.advance(game.game_state)
+            except Exception as e:
+                logging.error(f"Error advancing the economy of session {session_id}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many game sessions in one process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7070)
+    parser.add_argument("--workers", type=int, default=16, help="Maximum concurrent LLM requests across all sessions.")
+    args = parser.parse_args()
+
+    load_dotenv("local.env")
+    profiler.configure_from_env()
+    atexit.register(metrics.write, metrics_filename)
+    set_scheduler(LLMScheduler(args.workers))
+
+    autosave_thread = threading.Thread(target=autosave_sessions)
+    autosave_thread.daemon = True
+    autosave_thread.start()
+    economy_thread = threading.Thread(target=tick_sessions)
+    economy_thread.daemon = True
+    economy_thread.start()
+
+    with GameServer((args.host, args.port), SessionHandler) as server:
+        print(f"Serving on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with sessions_lock:
+                games = list(sessions.values())
+            for game in games:
+                game.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,37 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 import time
-from pydantic import BaseModel, Field
+from dataclasses import dataclass, field
 from typing import List, Optional
 
-from utils.base_utils import choice
+from utils.base_utils import choice, slots_getstate, slots_setstate
 from utils.llm_client import LLMClient
 from utils.screen import Screen
 
 if TYPE_CHECKING:
     from support.gamestate import GameState
 
-class Character(BaseModel):
-    name: str = Field(...)
-    description: str = Field(...)
-    specialization: str = Field(...)
-    talent: Optional[str] = Field(None)
-    level: int = Field(1)
-    xp: int = Field(0)
-    hp: int = Field(1)
-    gear: List[str] = Field(default_factory=list)
+# XP earned by each character on an event
+SUCCESS_XP = 5
+FAILURE_XP = 2
+
+@dataclass(slots=True)
+class Character:
+    """
+    A recruitable character. Kept as a slotted dataclass rather than a pydantic model since rosters can get large,
+    validation happens at the GameState boundary instead.
+    """
+    name: str
+    description: str
+    specialization: str
+    talent: Optional[str] = None
+    level: int = 1
+    xp: int = 0
+    hp: int = 1
+    gear: List[str] = field(default_factory=list)
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
 
     def gain_xp(self, amount: int):
         self.xp += amount
@@ -31,6 +43,23 @@ class Character(BaseModel):
         self.hp = self.level
         self.xp = 0
 
+    @property
+    def injured(self) -> bool:
+        return self.hp <= 0
+
+    def apply_outcome(self, outcome: str) -> bool:
+        """
+        Applies an event outcome to the character: XP for taking part, and an injury if the outcome had one.
+
+        :param outcome: The event outcome, e.g. "Success with injuries".
+        :return: Whether the character levelled up.
+        """
+        level = self.level
+        self.gain_xp(SUCCESS_XP if outcome.startswith("Success") else FAILURE_XP)
+        if "with injuries" in outcome:
+            self.hp = max(0, self.hp - 1)
+        return self.level > level
+
     @classmethod
     def create(cls, llm_client: LLMClient, name: Optional[str] = None, specialization: Optional[str] = None, description: Optional[str] = None):
         if name is None:
@@ -44,7 +73,7 @@ class Character(BaseModel):
             name=name,
             description=description,
             specialization=specialization,
-            talent=choice(["polymath", "capable", "good planner", None]),
+            talent=choice(["polymath", "capable", "good planner", None], rng=llm_client.rng.stream("characters")),
             level=1,
             xp=0,
             hp=1,
@@ -73,10 +102,11 @@ def recruit_screen(screen: Screen, game_state: GameState):
 
 def recruit_character(game_state: GameState):
     if game_state.currency >= game_state.recruitment_cost:
-        new_character = Character.create(game_state.llm_client)
-        game_state.characters.append(new_character)
-        game_state.currency -= game_state.recruitment_cost
-        game_state.recruitment_cost +=5
+        name = game_state.llm_client.multi_generate(1, "name", "character", "Generating characters", max_tokens=20,
+                                                    unique=game_state.similarity)[0]
+        new_character = Character.create(game_state.llm_client, name)
+        if not game_state.recruit(new_character):
+            return None
         return new_character
     else:
         return None
@@ -100,6 +130,7 @@ def view_characters_screen(screen: Screen, game_state: GameState):
 
 
 def full_character_screen(screen: Screen, game_state: GameState, character: Character):
+    recent_events = [f"- {record.outcome} in {record.region}" for record in game_state.event_log.recent(character=character.name, limit=3)]
     screen.display(f"Name: {character.name}",
                    f"Description: {character.description}",
                    f"Specialization: {character.specialization}",
@@ -108,6 +139,8 @@ def full_character_screen(screen: Screen, game_state: GameState, character: Char
                    f"XP: {character.xp}/{character.level * 10}",
                    f"HP: {character.hp}/{character.level}",
                    f"Gear: {', '.join(character.gear) if character.gear else 'None'}",
+                   "Recent events:" if recent_events else "Recent events: None",
+                   *recent_events,
                    "Press any key to return to character list.")
     
     screen.handle_keypress(game_state)
\ No newline at end of file
@@ -0,0 +1,153 @@
+from __future__ import annotations
+from bisect import insort
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Optional
+from pydantic import BaseModel, Field, PrivateAttr
+import math, threading, time, logging
+import numpy as np
+
+from utils.base_utils import private_getstate, private_setstate
+
+if TYPE_CHECKING:
+    from support.gamestate import GameState
+
+TICK_SECONDS = 60            # real seconds per game tick
+TICKS_PER_HOUR = 1           # game ticks per in-world hour of travel
+BASE_INCOME = 1.0            # currency per tick from the home base
+INCOME_PER_LOCATION = 0.1    # extra currency per tick for each discovered location
+HEAL_TICKS = 10              # characters heal 1 HP every this many ticks, up to their level
+MAX_CATCH_UP_TICKS = 7 * 24 * 60  # time away beyond a week doesn't count
+
+
+class ExpeditionTimer(BaseModel):
+    """
+    Characters away on an expedition, who are busy until the tick they return on.
+    """
+    due_tick: int = Field(...)
+    characters: List[str] = Field(default_factory=list)
+    location: str = Field("")
+
+
+class Economy(BaseModel):
+    """
+    Everything that happens over time: income, healing and expeditions returning. Time advances in whole ticks,
+    and any number of ticks is applied in one closed-form step, so a background thread ticking once a minute and a
+    save loaded after a month away both cost the same.
+    """
+    tick: int = Field(0)
+    last_update: float = Field(default_factory=time.time)
+    currency_remainder: float = Field(0.0)
+    timers: List[ExpeditionTimer] = Field(default_factory=list)
+    notices: List[str] = Field(default_factory=list)
+    # Guards the economy, and the currency and HP it changes. Re-entrant so a GameState mutation can hold it across
+    # several economy calls, see GameState.mutation.
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    __getstate__ = private_getstate
+    __setstate__ = private_setstate
+
+    @staticmethod
+    def income_per_tick(game_state: "GameState") -> float:
+        discovered = sum(1 for region in game_state.regions for location in region.locations if location.discovered)
+        return BASE_INCOME + INCOME_PER_LOCATION * discovered
+
+    def advance(self, game_state: "GameState", now: Optional[float] = None) -> List[str]:
+        """
+        Applies every whole tick that has passed since the last update.
+
+        :param game_state: The current GameState instance.
+        :param now: The current time, defaults to time.time().
+        :return: Messages about anything notable that happened, e.g. expeditions returning.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            elapsed = int((now - self.last_update) // TICK_SECONDS)
+            if elapsed <= 0:
+                return []
+            self.last_update += elapsed * TICK_SECONDS
+            ticks = min(elapsed, MAX_CATCH_UP_TICKS)
+            start, self.tick = self.tick, self.tick + ticks
+
+            income = self.income_per_tick(game_state) * ticks + self.currency_remainder
+            earned = math.floor(income)
+            self.currency_remainder = income - earned
+            game_state.currency += earned
+
+            # Healing happens on every HEAL_TICKS boundary, so count the boundaries crossed
+            heals = self.tick // HEAL_TICKS - start // HEAL_TICKS
+            characters = game_state.characters
+            if heals and characters:
+                hp = np.array([character.hp for character in characters])
+                level = np.array([character.level for character in characters])
+                for character, new_hp in zip(characters, np.maximum(hp, np.minimum(level, hp + heals)).tolist()):
+                    character.hp = new_hp
+
+            messages = []
+            while self.timers and self.timers[0].due_tick <= self.tick:
+                timer = self.timers.pop(0)
+                messages.append(f"{', '.join(timer.characters)} returned from {timer.location}.")
+            self.notices.extend(messages)
+
+        if ticks > 1:
+            logging.info(f"Caught up {ticks} ticks: earned {earned} {game_state.currency_name}, {heals} heals, "
+                         f"{len(messages)} expeditions returned.")
+        return messages
+
+    def start_expedition(self, characters: List[str], location: str, hours: float):
+        """
+        Marks characters as away for the round trip to a location.
+
+        :param characters: The names of the characters in the party.
+        :param location: The destination.
+        :param hours: The one-way travel time.
+        """
+        with self._lock:
+            timer = ExpeditionTimer(due_tick=self.tick + max(1, math.ceil(2 * hours * TICKS_PER_HOUR)), characters=characters, location=location)
+            insort(self.timers, timer, key=lambda t: t.due_tick)
+
+    def away(self) -> set[str]:
+        """
+        The names of every character currently away on an expedition.
+        """
+        with self._lock:
+            return {name for timer in self.timers for name in timer.characters}
+
+    def take_notices(self) -> List[str]:
+        """
+        Returns the messages from ticks since they were last taken, and clears them.
+        """
+        with self._lock:
+            notices, self.notices = self.notices, []
+        return notices
+
+    @contextmanager
+    def frozen(self):
+        """
+        Holds off every economy update, including income and healing, for as long as the block runs.
+        """
+        with self._lock:
+            yield
+
+    def spend(self, game_state: "GameState", amount: int) -> bool:
+        """
+        Takes currency if there is enough, atomically with respect to income being added.
+
+        :return: Whether the currency was spent.
+        """
+        with self._lock:
+            if game_state.currency < amount:
+                return False
+            game_state.currency -= amount
+            return True
+
+
+def run_economy(game_state: "GameState", stop: Optional[threading.Event] = None):
+    """
+    Advances a game's economy once a tick until stopped. Meant to run on a daemon thread alongside the game.
+    """
+    while not (stop and stop.is_set()):
+        try:
+            game_state.economy.advance(game_state)
+        except Exception as e:
+            logging.error(f"Error advancing the economy: {e}")
+        time.sleep(TICK_SECONDS)
@@ -8,29 +8,74 @@ if TYPE_CHECKING:
     from support.gamestate import GameState
     from support.region import Region
 from support.character import Character
+from support.resolution import OUTCOMES, resolve_outcomes
 from utils.base_utils import choice
+from utils.prompts import ContextSlot
 from utils.screen import Screen
 
+EVENT_TYPES = ["combat", "exploration", "interaction"]
+
 class Event(BaseModel):
     type: str = Field(...)
     prompt: str = Field(...)
     onset_description: str = Field(...)
     outcome: str = Field("No outcome yet")
     outcome_desc: str = Field("No outcome yet")
+    region: str = Field("")
+    characters: List[str] = Field(default_factory=list)
+    action: Optional[str] = Field(None)
+
+    @staticmethod
+    def history_context(game_state: "GameState", region: "Region", characters: List[Character]) -> List[ContextSlot]:
+        """
+        Builds a fixed-size prompt context from the rolling summaries of the region and characters.
+        """
+        return game_state.summaries.context(region.name, [char.name for char in characters])
+
+    @staticmethod
+    def roll_type(game_state: "GameState") -> str:
+        return choice(EVENT_TYPES, rng=game_state.llm_client.rng.stream("events"))
+
+    @staticmethod
+    def roll_outcome(game_state: "GameState", hazard_level: float, party: List[Character], action: str) -> str:
+        """
+        Rolls an outcome from the party's stats, the hazard level and their chosen action.
+        """
+        return resolve_outcomes(game_state, [party], [hazard_level], [action])[0]
 
     @classmethod
-    def create(cls, game_state: "GameState", region: "Region", characters: List[Character]):
-        event_type = choice(["combat", "exploration", "interaction"])
+    def create(cls, game_state: "GameState", region: "Region", characters: List[Character], event_type: Optional[str] = None,
+               seed: Optional[int] = None):
+        """
+        Generates a new event for a party in a region.
+
+        :param event_type: The kind of event. Rolled from the world's event stream if not given.
+        :param seed: The prompt seed. Drawn from the world's prompt stream if not given.
+        """
+        if event_type is None:
+            event_type = cls.roll_type(game_state)
         onset_description, prompt = game_state.llm_client.generate_with_prompt("event", subject_type=event_type,
-                                                  region=region.name, characters=', '.join([char.name for char in characters]), region_description=region.description, load_desc="Generating event", max_tokens=400)
-        return cls(type=event_type, prompt=prompt, onset_description=onset_description, outcome="No outcome yet", outcome_desc="No outcome yet")
+                                                  region=region.name, characters=', '.join([char.name for char in characters]), region_description=region.description, load_desc="Generating event", max_tokens=400,
+                                                  context=cls.history_context(game_state, region, characters), seed=seed)
+        return cls(type=event_type, prompt=prompt, onset_description=onset_description, outcome="No outcome yet", outcome_desc="No outcome yet",
+                   region=region.name, characters=[char.name for char in characters])
+
+    def resolve(self, game_state: "GameState", user_choice: str, outcome: Optional[str] = None, seed: Optional[int] = None):
+        """
+        Resolves the event with the party's choice.
 
-    def resolve(self, game_state: "GameState", user_choice: str):
-        outcome: str = choice(["Success with no injuries", "Failure with no injuries", "Success with injuries", "Failure with injuries"])
+        :param outcome: The outcome. Rolled from the world's event stream if not given.
+        :param seed: The prompt seed. Drawn from the world's prompt stream if not given.
+        """
+        if outcome is None:
+            region = next((r for r in game_state.regions if r.name == self.region), None)
+            party = [char for char in game_state.characters if char.name in self.characters]
+            outcome = self.roll_outcome(game_state, region.hazard_level if region else 0, party, user_choice)
         outcome_desc: str = game_state.llm_client.generate("outcome", prompt=self.prompt, description=self.onset_description,
-                                                 choice=user_choice, outcome=outcome, load_desc="Generating outcome") 
+                                                 choice=user_choice, outcome=outcome, load_desc="Generating outcome", seed=seed)
         self.outcome = outcome
         self.outcome_desc = outcome_desc
+        self.action = user_choice
         return self.outcome
 
 
@@ -43,6 +88,8 @@ def event_screen(screen: Screen, event: Event, game_state: "GameState"):
         idx = c - ord('1')
         if 0 <= idx < len(options):
             event.resolve(game_state, options[idx])
+            game_state.event_log.append(event)
+            game_state.summaries.record(game_state.llm_client, event)
             screen.display(event.outcome_desc)
             screen.add_new_line("Press any key to continue...")
             screen.handle_keypress(game_state)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Optional
+import sqlite3, threading, time, logging, os
+
+from utils.base_utils import slots_getstate, slots_setstate
+
+if TYPE_CHECKING:
+    from support.event import Event
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    region TEXT NOT NULL,
+    type TEXT NOT NULL,
+    action TEXT,
+    outcome TEXT NOT NULL,
+    onset_description TEXT NOT NULL,
+    outcome_desc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS event_characters (
+    character TEXT NOT NULL,
+    event_id INTEGER NOT NULL REFERENCES events(id),
+    PRIMARY KEY (character, event_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_events_region ON events(region, id);
+CREATE INDEX IF NOT EXISTS idx_events_outcome ON events(outcome, id);
+CREATE INDEX IF NOT EXISTS idx_events_created ON events(created_at);
+CREATE INDEX IF NOT EXISTS idx_event_characters_event ON event_characters(event_id);
+"""
+
+
+def event_log_path(save_filename: str) -> str:
+    """
+    Returns the event log path that sits alongside a save file, e.g. 'game.dat' -> 'game.events.db'.
+    """
+    base, _ = os.path.splitext(save_filename)
+    return base + '.events.db'
+
+
+@dataclass(slots=True)
+class EventRecord:
+    """
+    A resolved event as stored in the event log.
+    """
+    id: int
+    created_at: float
+    region: str
+    type: str
+    action: Optional[str]
+    outcome: str
+    onset_description: str
+    outcome_desc: str
+    characters: List[str] = field(default_factory=list)
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+class EventLog:
+    """
+    Append-only history of resolved events, stored in a local SQLite database next to the save file.
+    Events are indexed by region, character, outcome and time so recent history can be fetched without
+    loading the whole log into the GameState.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        :param path: The database file. If None, the log is kept in memory until it is attached to a save file.
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state.get('path')
+        self._conn = None
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path or ':memory:', check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def attach(self, path: str):
+        """
+        Moves the log to the given database file, copying across any events recorded so far.
+        Does nothing if the log is already stored there.
+
+        :param path: The database file to store the log in.
+        """
+        with self._lock:
+            if self.path == path and self._conn is not None:
+                return
+            source = self._connect()
+            if self.path == path:
+                return
+            dest = sqlite3.connect(path, check_same_thread=False)
+            source.backup(dest)
+            dest.row_factory = sqlite3.Row
+            source.close()
+            self._conn = dest
+            self.path = path
+            logging.info(f"Event log attached to {path}")
+
+    def append(self, event: "Event") -> int:
+        """
+        Records a resolved event.
+
+        :param event: The event to record.
+        :return: The id of the new record.
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO events (created_at, region, type, action, outcome, onset_description, outcome_desc) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), event.region, event.type, event.action, event.outcome,
+                     event.onset_description, event.outcome_desc))
+                event_id = cursor.lastrowid
+                conn.executemany("INSERT OR IGNORE INTO event_characters (character, event_id) VALUES (?, ?)",
+                                 [(name, event_id) for name in event.characters])
+            return event_id # type: ignore
+
+    @staticmethod
+    def _filtered(sql: str, region: Optional[str] = None, character: Optional[str] = None, outcome: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None, before_id: Optional[int] = None) -> tuple[str, list]:
+        """
+        Adds the WHERE clause for the given filters to a query over the events table. Internal function.
+        """
+        conditions, params = [], []
+        if character is not None:
+            sql += " JOIN event_characters c ON c.event_id = e.id"
+            conditions.append("c.character = ?")
+            params.append(character)
+        for column, op, value in (("region", "=", region), ("outcome", "=", outcome), ("created_at", ">=", since),
+                                  ("created_at", "<", until), ("id", "<", before_id)):
+            if value is not None:
+                conditions.append(f"e.{column} {op} ?")
+                params.append(value)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql, params
+
+    def query(self, region: Optional[str] = None, character: Optional[str] = None, outcome: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, limit: int = 20,
+              before_id: Optional[int] = None) -> List[EventRecord]:
+        """
+        Fetches events matching all of the given filters, newest first.
+        Pages are keyed on the event id: pass the id of the last record of a page as before_id to get the next one.
+
+        :param region: Only events in this region.
+        :param character: Only events involving this character.
+        :param outcome: Only events with this outcome.
+        :param since: Only events recorded at or after this timestamp.
+        :param until: Only events recorded before this timestamp.
+        :param limit: The maximum number of events to return.
+        :param before_id: Only events older than this id.
+        :return: The matching events, newest first.
+        """
+        sql, params = self._filtered("SELECT e.* FROM events e", region, character, outcome, since, until, before_id)
+        sql += " ORDER BY e.id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(sql, params).fetchall()
+            if not rows:
+                return []
+            ids = [row["id"] for row in rows]
+            names: dict[int, List[str]] = {event_id: [] for event_id in ids}
+            for event_id, name in conn.execute(
+                    f"SELECT event_id, character FROM event_characters WHERE event_id IN ({','.join('?' * len(ids))})", ids):
+                names[event_id].append(name)
+
+        return [EventRecord(id=row["id"], created_at=row["created_at"], region=row["region"], type=row["type"],
+                            action=row["action"], outcome=row["outcome"], onset_description=row["onset_description"],
+                            outcome_desc=row["outcome_desc"], characters=names[row["id"]]) for row in rows]
+
+    def recent(self, character: Optional[str] = None, region: Optional[str] = None, limit: int = 5) -> List[EventRecord]:
+        """
+        Fetches the last few events involving a character and/or region.
+
+        :param character: Only events involving this character.
+        :param region: Only events in this region.
+        :param limit: The number of events to return.
+        :return: The most recent matching events, newest first.
+        """
+        return self.query(region=region, character=character, limit=limit)
+
+    def count(self, region: Optional[str] = None, character: Optional[str] = None, outcome: Optional[str] = None) -> int:
+        """
+        Counts the events matching the given filters.
+        """
+        sql, params = self._filtered("SELECT COUNT(*) FROM events e", region, character, outcome)
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
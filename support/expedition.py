@@ -0,0 +1,162 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+import logging
+
+from support.character import Character
+from support.event import Event
+from support.gamestate import GameState
+from support.location import Location
+from support.region import Region
+from support.resolution import apply_outcomes, resolve_outcomes
+from utils.base_utils import slots_getstate, slots_setstate
+from utils.rate_limiter import get_rate_limiter
+from utils.screen import Screen
+
+PARTY_SIZE = 3
+
+# What an auto-expedition party does when it runs into each kind of event
+AUTO_ACTIONS = {"combat": "Engage", "exploration": "Engage", "interaction": "Talk"}
+
+
+@dataclass(slots=True)
+class Expedition:
+    """
+    A party sent to a location without the player stepping through the event by hand.
+    The event type, outcome and prompt seeds are rolled up front on the game thread, so running expeditions
+    concurrently doesn't change what happens in a seeded world.
+    """
+    region: Region
+    location: Location
+    party: List[Character]
+    hours: float = 0.0
+    event_type: str = ""
+    outcome: str = ""
+    seeds: List[int] = field(default_factory=list)
+    event: Optional[Event] = None
+    levelled_up: List[str] = field(default_factory=list)
+    injured: List[str] = field(default_factory=list)
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+def plan_expeditions(game_state: GameState, party_size: int = PARTY_SIZE) -> List[Expedition]:
+    """
+    Splits the healthy characters into parties and sends each to a discovered location, safest trips first.
+
+    :param game_state: The current GameState instance.
+    :param party_size: The most characters in one party.
+    :return: The planned expeditions, empty if nobody is fit and at home, or nowhere has been discovered.
+    """
+    available = game_state.available_characters()
+    destinations = []
+    for i, region in enumerate(game_state.regions):
+        if not region.materialised:
+            continue
+        for j, location in enumerate(region.locations):
+            if location.discovered:
+                plan = game_state.world_map.travel(i, j)
+                destinations.append((plan.hazard_exposure, plan.hours, i, j))
+    if not available or not destinations:
+        return []
+    destinations.sort()
+
+    expeditions = []
+    for n, start in enumerate(range(0, len(available), party_size)):
+        _, hours, i, j = destinations[n % len(destinations)]
+        region = game_state.regions[i]
+        expeditions.append(Expedition(region=region, location=region.locations[j], party=available[start:start + party_size], hours=hours))
+    return expeditions
+
+
+def run_expeditions(game_state: GameState, expeditions: List[Expedition]) -> List[Expedition]:
+    """
+    Generates and resolves every expedition's event concurrently, then applies the results on the calling thread:
+    XP and injuries for each character, the event log, the campaign summaries and any locations found on the way.
+    Each party is then away for the round trip before it can be sent out again.
+
+    :param game_state: The current GameState instance.
+    :param expeditions: The expeditions to run.
+    :return: The expeditions that completed. Any that failed are logged and left out.
+    """
+    llm_client = game_state.llm_client
+    for expedition in expeditions:
+        expedition.event_type = Event.roll_type(game_state)
+        expedition.seeds = [llm_client.rng.prompt_seed(), llm_client.rng.prompt_seed()]
+    outcomes = resolve_outcomes(game_state, [expedition.party for expedition in expeditions],
+                                [expedition.region.hazard_level for expedition in expeditions],
+                                [AUTO_ACTIONS.get(expedition.event_type, "Engage") for expedition in expeditions])
+    for expedition, outcome in zip(expeditions, outcomes):
+        expedition.outcome = outcome
+
+    def run(expedition: Expedition) -> Optional[Event]:
+        try:
+            event = Event.create(game_state, expedition.region, expedition.party, expedition.event_type, seed=expedition.seeds[0])
+            event.resolve(game_state, AUTO_ACTIONS.get(event.type, "Engage"), expedition.outcome, seed=expedition.seeds[1])
+            return event
+        except Exception as e:
+            logging.error(f"Auto-expedition to {expedition.location.name} failed: {e}")
+            return None
+
+    if not expeditions:
+        return []
+    workers = min(len(expeditions), int(get_rate_limiter().concurrency.max_limit))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        events = list(executor.map(run, expeditions))
+
+    completed = [expedition for expedition, event in zip(expeditions, events) if event is not None]
+    for expedition, event in zip(expeditions, events):
+        expedition.event = event
+    with game_state.mutation():
+        levelled = apply_outcomes([expedition.party for expedition in completed], [expedition.outcome for expedition in completed])
+        for expedition, flags in zip(completed, levelled):
+            event = expedition.event
+            expedition.levelled_up = [character.name for character, flag in zip(expedition.party, flags) if flag]
+            expedition.injured = [character.name for character in expedition.party if character.injured]
+            game_state.event_log.append(event)
+            game_state.summaries.record(llm_client, event)
+            game_state.world_map.discover_around(game_state.regions, expedition.location.x, expedition.location.y)
+            game_state.economy.start_expedition([character.name for character in expedition.party], expedition.location.name, expedition.hours)
+    return completed
+
+
+def auto_expedition_screen(screen: Screen, game_state: GameState):
+    """
+    Plans expeditions for the whole roster, asks for confirmation, runs them all at once and shows a summary.
+    :param screen: The Screen instance for display.
+    :param game_state: The current GameState instance.
+    """
+    expeditions = plan_expeditions(game_state)
+    if not expeditions:
+        screen.display("No expeditions possible.", "Every character is injured or away, or no locations have been discovered yet.")
+        screen.add_new_line("Press any key to continue...")
+        screen.handle_keypress(game_state)
+        return
+
+    plans = [f"{', '.join(char.name for char in expedition.party)} -> {expedition.location.name} ({expedition.region.name})"
+             for expedition in expeditions]
+    screen.display_options(f"Send {len(expeditions)} parties out?", plans)
+    screen.add_new_line("Press 'y' to send them, or 'b' to go back.")
+    while True:
+        c = screen.handle_keypress(game_state)
+        if c == ord('y'):
+            break
+        if c == ord('b'):
+            return
+
+    completed = run_expeditions(game_state, expeditions)
+    lines = []
+    for expedition in completed:
+        line = f"{expedition.location.name}: {expedition.event.outcome}"
+        if expedition.levelled_up:
+            line += f". Levelled up: {', '.join(expedition.levelled_up)}"
+        if expedition.injured:
+            line += f". Injured: {', '.join(expedition.injured)}"
+        lines.append(line)
+    if len(completed) < len(expeditions):
+        lines.append(f"{len(expeditions) - len(completed)} parties failed to report back.")
+    screen.display_options("Expedition results:", lines)
+    screen.add_new_line("Press any key to continue...")
+    screen.handle_keypress(game_state)
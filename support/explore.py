@@ -1,16 +1,30 @@
 from support.event import Event, event_screen
 from support.gamestate import GameState
+from utils.cancellation import CancelToken
 from utils.screen import Screen
 
 def explore_screen(screen: Screen, game_state: GameState):
+    # Prefetches started here are abandoned once the player leaves the explore screen
+    prefetch = game_state.llm_client.cancel_scope()
+    try:
+        _explore_screen(screen, game_state, prefetch)
+    finally:
+        prefetch.cancel()
+        prefetch.close()
+
+
+def _explore_screen(screen: Screen, game_state: GameState, prefetch: CancelToken):
     while True:
-        screen.display_options("Available Regions:", [region.name for region in game_state.regions])
+        screen.display_options("Available Regions:", [f"{region.name} (Distance: {game_state.world_map.region_distance(i):.1f})"
+                                                      for i, region in enumerate(game_state.regions)])
         screen.add_new_line(f"Select a region to explore (1-{len(game_state.regions)}) or 'b' to return:")
 
         c = screen.handle_keypress(game_state)
         if c >= ord('1') and c <= ord(str(len(game_state.regions))):
             region_index = c - ord('1')
             selected_region = game_state.regions[region_index]
+            # Start generating the region's locations while the player reads about it and picks a party
+            game_state.prefetch_region(selected_region, prefetch)
             # Show region description and hazard level, ask for confirmation
             while True:
                 screen.display(f"Exploring {selected_region.name}", f"{selected_region.description}", f"Hazard Level: {selected_region.hazard_level}")
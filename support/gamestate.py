@@ -1,6 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, TYPE_CHECKING
-import pickle, random, logging, os, time
+from pydantic import BaseModel, Field, PrivateAttr
+from contextlib import contextmanager
+from typing import Dict, List, Optional, TYPE_CHECKING
+import pickle, logging, os, threading, time
 
 if TYPE_CHECKING:
     from utils.screen import Screen
@@ -8,7 +9,33 @@ if TYPE_CHECKING:
 from support.region import Region
 from support.location import Location
 from support.character import Character
+from support.event_log import EventLog, event_log_path
+from support.summary import CampaignSummaries
+from support.world_pack import PackItem, WorldPack
+from support.world_map import WorldMap
+from support.economy import Economy
+from utils.similarity import SimilarityIndex
+from utils.cancellation import CancelToken, GenerationCancelled
+from utils.base_utils import private_getstate, private_setstate
 from utils.llm_client import LLMClient
+from utils.llm_scheduler import INTERACTIVE
+from utils.profiling import profiled, profiler
+from utils.prompts import Prompts
+from utils.spend import get_ledger
+from utils.world_random import WorldRandom
+
+# Serialise writing each save file, e.g. an autosave and a save on quit, keyed by absolute path. Guarded by _save_locks_lock.
+_save_locks: Dict[str, threading.Lock] = {}
+_save_locks_lock = threading.Lock()
+
+
+def save_lock(filename: str) -> threading.Lock:
+    """
+    Returns the lock held while writing the given save file.
+    """
+    with _save_locks_lock:
+        return _save_locks.setdefault(os.path.abspath(filename), threading.Lock())
+
 
 class GameState(BaseModel):
     llm_client: LLMClient = Field(...)
@@ -20,74 +47,123 @@ class GameState(BaseModel):
     regions: List[Region] = Field(default_factory=list)
     home_base: Region = Field(...)
     current_region: Region = Field(...)
+    event_log: EventLog = Field(default_factory=EventLog, exclude=True)
+    summaries: CampaignSummaries = Field(default_factory=CampaignSummaries)
+    save_filename: Optional[str] = Field(None)
+    world_map: Optional[WorldMap] = Field(None)
+    economy: Economy = Field(default_factory=Economy)
+    similarity: SimilarityIndex = Field(default_factory=SimilarityIndex)
+    # Guards the characters, regions, world map and recruitment cost. Work that changes them (recruiting, applying
+    # expedition results, adding generated locations) holds it only while applying its results, never while
+    # generating, and saving holds it while taking a snapshot. Always taken before the economy and summary locks.
+    _lock: threading.RLock = PrivateAttr(default_factory=threading.RLock)
+
+    __getstate__ = private_getstate
+    __setstate__ = private_setstate
+
+    class Config:
+        arbitrary_types_allowed = True
 
     @classmethod
-    def create(cls, llm_client: LLMClient, theme: str):
+    @profiled("world.create")
+    def create(cls, llm_client: LLMClient, theme: str, pack: Optional[WorldPack] = None, seed: Optional[int] = None):
         """
         Creates a new game state with the given LLM client and theme.
-        Generates characters, regions, and locations using the LLM client.
+        Takes characters and regions from the world pack where it has them, and generates the rest using the
+        LLM client. Generated names and descriptions that near-duplicate earlier ones are regenerated.
+        Regions start as stubs, and their locations are generated when they're first visited.
 
         :param llm_client: The LLM client to use for generating game content.
         :param theme: The theme for the game.
+        :param pack: The world pack to draw pre-generated content from. Defaults to the pack file if there is one, which is
+                     closed once the world is built.
+        :param seed: The world seed that every random decision is drawn from. Defaults to WORLD_SEED or a random seed.
         :return: A new GameState instance.
         """
         llm_client.set_theme(theme)
-        currency_name = llm_client.custom_generate(f"Create a unique name for a currency in a {theme} setting.\
-                                                   Reply with just the name and no additional formatting.",
-                                                   max_tokens=5, load_desc="Generating currency name")
-        
-        character_names = llm_client.multi_generate(3, "name", "character", "Generating character names", max_tokens=20)
-        character_specializations = llm_client.multi_generate(3, "specialization", "character", "Generating character specializations")
-        character_descriptions = llm_client.multi_generate(3, "specialized_description", "character", "Generating character descriptions",
-                                                           name=character_names, specialization=character_specializations, max_tokens=100)
-        
-        region_names = llm_client.multi_generate(5, "name", "region", "Generating region names", max_tokens=20)
-        region_descriptions = llm_client.multi_generate(5, "description", "region", "Generating region descriptions",
-                                                       name=region_names, max_tokens=100)
-
-        characters = [Character.create(llm_client, character_names[i], character_specializations[i], character_descriptions[i]) for i in range(3)]
-        regions = [Region.create(llm_client, region_names[i], region_descriptions[i]) for i in range(5)]
-
-        num_locations = [random.randint(2, 5) for _ in range(len(regions))]
-        total_locations = sum(num_locations)
-
-        location_names = llm_client.multi_generate(total_locations, "name", "location", "Generating location names", max_tokens=20)
-        location_descriptions = llm_client.multi_generate(total_locations, "description", "location", "Generating location descriptions",
-                                                           name=location_names, max_tokens=100)
-        
-        home_base: str = llm_client.generate("name", "home base", "Generating home base name", max_tokens=10)
-        home_base_description: str = llm_client.generate("description", "home base", "Generating home base description", name=home_base, max_tokens=100)
-        home_base_region = Region.create(llm_client, home_base, home_base_description)
-
-        # Split the location names and descriptions into batches for each region
-        location_index = 0
-        location_names_batches = []
-        location_descriptions_batches = []
-        for num in num_locations:
-            location_names_batches.append(location_names[location_index:location_index + num])
-            location_descriptions_batches.append(location_descriptions[location_index:location_index + num])
-            location_index += num
-
-        for i, region in enumerate(regions):
-            region.create_locations(llm_client, [Location.create(llm_client, region.name, i+1, location_names_batches[i][j],
-                                                 location_descriptions_batches[i][j]) for j in range(num_locations[i])])
-
-        return cls(
-            llm_client=llm_client,
-            characters=characters,
-            regions=regions,
-            current_region=home_base_region,
-            theme=theme,
-            currency_name=currency_name,
-            currency=10,
-            recruitment_cost=10,
-            home_base=home_base_region
-        )
+        llm_client.rng = WorldRandom(seed)
+        owned = pack is None
+        if pack is None:
+            pack = WorldPack.open_existing()
+        try:
+            similarity = SimilarityIndex()
+
+            def from_pack(kind: str, count: int) -> list[PackItem]:
+                items = pack.take(theme, kind, count) if pack is not None else []
+                for item in items:
+                    similarity.add("name", item.name)
+                    if item.description:
+                        similarity.add("specialized_description" if kind == "character" else "description", item.description)
+                return items
+
+            packed_currency = from_pack("currency", 1)
+            if packed_currency:
+                currency_name = packed_currency[0].name
+            else:
+                currency_name = llm_client.generate("currency", "currency", "Generating currency name", max_tokens=5)
+
+            packed_characters = from_pack("character", 3)
+            missing = 3 - len(packed_characters)
+            character_names = [item.name for item in packed_characters] + \
+                llm_client.multi_generate(missing, "name", "character", "Generating character names", max_tokens=20, unique=similarity)
+            character_specializations = [item.specialization for item in packed_characters] + \
+                llm_client.multi_generate(missing, "specialization", "character", "Generating character specializations")
+            character_descriptions = [item.description for item in packed_characters] + \
+                llm_client.multi_generate(missing, "specialized_description", "character", "Generating character descriptions",
+                                          name=character_names[-missing:], specialization=character_specializations[-missing:], max_tokens=100,
+                                          unique=similarity)
+
+            packed_regions = from_pack("region", 5)
+            missing = 5 - len(packed_regions)
+            region_names = [item.name for item in packed_regions] + \
+                llm_client.multi_generate(missing, "name", "region", "Generating region names", max_tokens=20, unique=similarity)
+            region_descriptions = [item.description for item in packed_regions] + \
+                llm_client.multi_generate(missing, "description", "region", "Generating region descriptions",
+                                          name=region_names[-missing:], max_tokens=100, unique=similarity)
+
+            characters = [Character.create(llm_client, character_names[i], character_specializations[i], character_descriptions[i]) for i in range(3)]
+            regions = [Region.create(llm_client, region_names[i], region_descriptions[i], materialised=False) for i in range(5)]
+
+            packed_home_base = from_pack("home_base", 1)
+            if packed_home_base:
+                home_base, home_base_description = packed_home_base[0].name, packed_home_base[0].description
+            else:
+                home_base = llm_client.generate("name", "home base", "Generating home base name", max_tokens=10)
+                home_base_description = llm_client.generate("description", "home base", "Generating home base description", name=home_base, max_tokens=100)
+                similarity.add("name", home_base)
+                similarity.add("description", home_base_description)
+            home_base_region = Region.create(llm_client, home_base, home_base_description)
+
+            world_map = WorldMap.generate(home_base_region, regions, llm_client.rng.stream("map"))
+
+            return cls(
+                llm_client=llm_client,
+                characters=characters,
+                regions=regions,
+                current_region=home_base_region,
+                theme=theme,
+                currency_name=currency_name,
+                currency=10,
+                recruitment_cost=10,
+                home_base=home_base_region,
+                world_map=world_map,
+                similarity=similarity
+            )
+        finally:
+            if owned and pack is not None:
+                pack.close()
 
     @classmethod
+    @profiled("load")
     def load(cls, screen: "Screen", data: bytes):
         try:
-            game_state: GameState = pickle.loads(data)
+            with profiler.span("load.unpickle"):
+                game_state: GameState = pickle.loads(data)
+
+            # Fill in any fields added since the save was written
+            for name, field in cls.model_fields.items():
+                if name not in game_state.__dict__ and not field.is_required():
+                    game_state.__dict__[name] = field.get_default(call_default_factory=True)
 
             if not game_state.llm_client:
                 api_key = os.getenv("API_KEY")
@@ -100,6 +176,26 @@ class GameState(BaseModel):
                 game_state.llm_client = LLMClient.create(api_url, api_key, screen, game_state.theme)
 
             game_state.llm_client.screen = screen
+            # Prompt templates are code rather than state, so don't keep the copy pickled with the save
+            game_state.llm_client.prompts = Prompts()
+            # Saves from before seeded worlds carry on with a fresh seed
+            if 'rng' not in game_state.llm_client.__dict__:
+                game_state.llm_client.__dict__['rng'] = WorldRandom()
+            if 'cancel_token' not in game_state.llm_client.__dict__:
+                game_state.llm_client.__dict__['cancel_token'] = CancelToken()
+            # The world's budget covers what it cost in earlier sessions too
+            get_ledger().restore_world(game_state.llm_client.rng.seed, game_state.llm_client.total_cost)
+            # Saves from before lazy regions already have all their locations
+            for region in [game_state.home_base] + game_state.regions:
+                region.__dict__.setdefault('materialised', True)
+            # Saves from before the world map get one laid out around their existing regions
+            if game_state.world_map is None:
+                game_state.world_map = WorldMap.generate(game_state.home_base, game_state.regions, game_state.llm_client.rng.stream("map"))
+            # Saves from before the similarity index get one built from their existing content
+            if not game_state.similarity.texts:
+                game_state.index_content()
+            # Apply everything that happened while the game was closed
+            game_state.economy.advance(game_state)
             logging.info("Game state loaded successfully.")
         except EOFError:
             logging.error("Error loading game state: File is empty or corrupted.")
@@ -107,13 +203,155 @@ class GameState(BaseModel):
             logging.error(f"Error loading game state: {e}")
         return game_state
     
-    def save(self, filename: Optional[str] = 'save.dat'):
+    def index_content(self):
+        """
+        Adds every name and description in the world to the similarity index.
+        """
+        for character in self.characters:
+            self.similarity.add("name", character.name)
+            self.similarity.add("specialized_description", character.description)
+        for region in [self.home_base] + self.regions:
+            self.similarity.add("name", region.name)
+            self.similarity.add("description", region.description)
+            for location in region.locations:
+                self.similarity.add("name", location.name)
+                self.similarity.add("description", location.description)
+
+    @profiled("world.materialise_region")
+    def materialise_region(self, region: Region, quiet: bool = False, cancel: Optional[CancelToken] = None):
+        """
+        Generates a stub region's locations, taking them from the world pack first, and places them on the map.
+        Draws from generators keyed on the region rather than the shared streams, so a region comes out the same
+        whenever it's generated. Safe to call from several threads; only the first does any work.
+
+        :param region: The region to generate.
+        :param quiet: Don't show a loading animation, and generate at prefetch rather than interactive priority,
+                      for prefetching in the background. Raised to interactive if the player starts waiting on it.
+        :param cancel: Abandons the generation when cancelled, raising GenerationCancelled. The region stays a stub.
+        """
+        if not quiet:
+            # A prefetch of this region may hold the lock. Raise it to interactive, since the player is now waiting on it
+            region._prefetch_priority.raise_to(INTERACTIVE)
+        with region._materialise_lock:
+            if region.materialised:
+                return
+            region_index = self.region_index(region)
+            llm_client = self.llm_client
+            rng = llm_client.rng.derive("region", region_index)
+            num_locations = rng.randint(2, 5)
+
+            pack = WorldPack.open_existing()
+            packed = pack.take(self.theme, "location", num_locations) if pack is not None else []
+            if pack is not None:
+                pack.close()
+            for item in packed:
+                self.similarity.add("name", item.name)
+                self.similarity.add("description", item.description)
+            missing = num_locations - len(packed)
+            subject = f"location in {region.name} region"
+            priority = region._prefetch_priority if quiet else INTERACTIVE
+            names = [item.name for item in packed] + \
+                llm_client.multi_generate(missing, "name", subject, "Generating location names", max_tokens=20,
+                                          unique=self.similarity, quiet=quiet, rng=rng, priority=priority, cancel=cancel)
+            descriptions = [item.description for item in packed] + \
+                llm_client.multi_generate(missing, "description", subject, "Generating location descriptions",
+                                          name=names[-missing:], max_tokens=100, unique=self.similarity, quiet=quiet, rng=rng,
+                                          priority=priority, cancel=cancel)
+            locations = [Location.create(llm_client, region.name, 0.0, names[j], descriptions[j], rng=rng) for j in range(num_locations)]
+            with self.mutation():
+                region.create_locations(llm_client, locations)
+                self.world_map.place_locations(region_index, region, rng)
+                region.materialised = True
+        logging.info(f"Generated {num_locations} locations in {region.name}.")
+
+    def prefetch_region(self, region: Region, cancel: Optional[CancelToken] = None):
+        """
+        Starts generating a stub region's locations on a background thread, so they're likely ready by the time
+        the player enters it.
+
+        :param region: The region to generate.
+        :param cancel: Abandons the prefetch when cancelled, e.g. when the player leaves the screen that started it.
+        """
+        if region.materialised:
+            return
+        def materialise():
+            try:
+                self.materialise_region(region, quiet=True, cancel=cancel)
+            except GenerationCancelled:
+                logging.info(f"Prefetch of {region.name} cancelled.")
+            except Exception as e:
+                logging.error(f"Error prefetching {region.name}: {e}")
+        thread = threading.Thread(target=materialise)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def seed(self) -> int:
+        """
+        The seed the world was generated from.
+        """
+        return self.llm_client.rng.seed
+
+    def available_characters(self) -> List[Character]:
+        """
+        The characters who can take part in an event now, i.e. who aren't injured or away on an expedition.
+        """
+        away = self.economy.away()
+        return [character for character in self.characters if not character.injured and character.name not in away]
+
+    def region_index(self, region: Region) -> int:
+        """
+        The position of a region in the regions list, which is how the world map refers to it.
+        """
+        return next(i for i, r in enumerate(self.regions) if r is region)
+
+    @contextmanager
+    def mutation(self):
+        """
+        Holds off saving and every other mutation, including the economy, for as long as the block runs, so a
+        change that touches several fields is never saved half-applied. Re-entrant.
+        """
+        with self._lock, self.economy.frozen():
+            yield
+
+    def recruit(self, character: Character) -> bool:
+        """
+        Adds a character to the party if there is enough currency, paying the recruitment cost and raising it.
+
+        :return: Whether the character was recruited.
+        """
+        with self.mutation():
+            if not self.economy.spend(self, self.recruitment_cost):
+                return False
+            self.characters.append(character)
+            self.recruitment_cost += 5
+            return True
+
+    def snapshot(self) -> bytes:
+        """
+        Pickles the game state as it is at one instant, holding off mutations only while pickling.
+        """
+        with self.mutation(), self.summaries.frozen(), profiler.span("save.pickle"):
+            return pickle.dumps(self)
+
+    @profiled("save")
+    def save(self, filename: Optional[str] = None):
+        """
+        Saves a snapshot of the game state. Without a filename it saves to the file it was last saved to, or save.dat.
+        Safe to call from any thread while the game is being played. The file is replaced in one step, so a save
+        that fails part way leaves the last one intact.
+        """
         if not filename:
-            filename = 'save.dat'
+            filename = self.save_filename or 'save.dat'
         filename = filename if filename.endswith('.dat') else filename + '.dat'
+        self.save_filename = filename
         try:
-            with open(filename, 'wb') as f:
-                f.write(pickle.dumps(self))
+            self.event_log.attach(event_log_path(filename))
+            data = self.snapshot()
+            with save_lock(filename):
+                with open(filename + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(filename + '.tmp', filename)
             logging.info("Game state saved successfully.")
         except Exception as e:
             logging.error(f"Error saving game state: {e}")
@@ -1,11 +1,25 @@
 from utils.screen import Screen
+from utils.spend import get_ledger
 from support.gamestate import GameState
 from support.character import recruit_screen, view_characters_screen
 from support.explore import explore_screen
+from support.expedition import auto_expedition_screen
 
 def home_base_screen(screen: Screen, game_state: GameState):
-    screen.display_options(f"Home Base (Currency: {game_state.currency} {game_state.currency_name})",
-                           ["Explore", "Recruit", "View Characters"])
+    for notice in game_state.economy.take_notices():
+        screen.temp_display(2, notice)
+    away = len(game_state.economy.away())
+    spend = ""
+    if game_state.llm_client:
+        ledger = get_ledger()
+        session_id, world = game_state.llm_client.session_id, game_state.llm_client.rng.seed
+        spend = (f"\nLLM spend: ${ledger.spent('session', session_id or 'local'):.4f} this session, "
+                 f"${ledger.spent('world', world):.4f} this world")
+        # The percentage only means something when generation degrades as a budget runs down
+        if ledger.budgeted:
+            spend += f" ({ledger.usage(session_id, world, None):.0%} of budget)"
+    screen.display_options(f"Home Base (Currency: {game_state.currency} {game_state.currency_name}, Away: {away}){spend}",
+                           ["Explore", "Recruit", "View Characters", "Auto-Expedition"])
 
     c = screen.handle_keypress(game_state)
     if c == ord('1'):
@@ -13,4 +27,6 @@ def home_base_screen(screen: Screen, game_state: GameState):
     elif c == ord('2'):
         recruit_screen(screen, game_state)
     elif c == ord('3'):
-        view_characters_screen(screen, game_state)
\ No newline at end of file
+        view_characters_screen(screen, game_state)
+    elif c == ord('4'):
+        auto_expedition_screen(screen, game_state)
\ No newline at end of file
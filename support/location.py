@@ -1,24 +1,36 @@
-from pydantic import BaseModel, Field
+from dataclasses import dataclass
 from typing import Optional
+import random
 
-from utils.base_utils import choice
+from utils.base_utils import choice, slots_getstate, slots_setstate
 from utils.llm_client import LLMClient
 
 
-class Location(BaseModel):
-    name: str = Field(...)
-    region_name: str = Field(...)
-    distance: float = Field(...)
-    description: str = Field(...)
-    discovered: bool = Field(...)
+@dataclass(slots=True)
+class Location:
+    """
+    A location within a region. Slotted dataclass to keep large worlds compact in memory and in save files.
+    Coordinates and distance are filled in when the location is placed on the world map.
+    """
+    name: str
+    region_name: str
+    distance: float
+    description: str
+    discovered: bool
+    x: float = 0.0
+    y: float = 0.0
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
 
     @classmethod
-    def create(cls, llm_client: LLMClient, region_name: str, distance: float, name: Optional[str] = None, description: Optional[str] = None):
+    def create(cls, llm_client: LLMClient, region_name: str, distance: float, name: Optional[str] = None, description: Optional[str] = None,
+               rng: Optional[random.Random] = None):
         if name is None:
             name = llm_client.generate("name", f"location in {region_name}", "Generating locations", max_tokens=20)
         if description is None:
             description = llm_client.generate("description", f"location in {region_name}", "Generating locations", name=name, max_tokens=100)
         
-        discovered = choice([True, False], weights=[0.67, 0.33])
+        discovered = choice([True, False], weights=[0.67, 0.33], rng=rng or llm_client.rng.stream("world"))
 
         return cls(name=name, region_name=region_name, distance=distance, description=description, discovered=discovered)
\ No newline at end of file
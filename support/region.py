@@ -1,16 +1,29 @@
-import random
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from typing import List, Optional
+import threading
 
 from support.location import Location
 from utils.llm_client import LLMClient
 from support.event import Event, event_screen
+from utils.base_utils import private_getstate, private_setstate
+from utils.llm_scheduler import PREFETCH, PriorityHandle
 
 class Region(BaseModel):
     name: str = Field(...)
     description: str = Field(...)
     hazard_level: int = Field(...)
     locations: List[Location] = Field(default_factory=list)
+    x: float = Field(0.0)
+    y: float = Field(0.0)
+    # False until the region's locations have been generated, which waits until it's first visited
+    materialised: bool = Field(True)
+    # Held while the region's locations are generated, so a prefetch and the player entering it never generate it twice
+    _materialise_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    # The priority of a prefetch of the region's locations, raised when the player starts waiting on it
+    _prefetch_priority: PriorityHandle = PrivateAttr(default_factory=lambda: PriorityHandle(PREFETCH))
+
+    __getstate__ = private_getstate
+    __setstate__ = private_setstate
 
     def create_locations(self, llm_client: LLMClient, locations: Optional[List[Location]] = None):
         """
@@ -21,26 +34,21 @@ class Region(BaseModel):
         :param locations: Optional list of locations to use instead of generating new ones.
         """
         if locations is None:
-            num_locations = random.randint(2, 5)
+            num_locations = llm_client.rng.stream("world").randint(2, 5)
 
             location_names = llm_client.multi_generate(num_locations, "name", f"location in {self.name} region",
                                                     "Generating location names", max_tokens=20)
             location_descriptions = llm_client.multi_generate(num_locations, "description", f"location in {self.name} region",
                                                             "Generating location descriptions",
                                                             name=location_names, max_tokens=100)
-            try:
-                self.locations = [Location.create(llm_client, self.name, i+1, location_names[i],
-                                            location_descriptions[i]) for i in range(num_locations)]
-            except IndexError:
-                print("Error: Not enough location names or descriptions generated.")
-                print(f"Generated names: {location_names}")
-                print(f"Generated descriptions: {location_descriptions}")
-        
+            self.locations = [Location.create(llm_client, self.name, i+1, location_names[i],
+                                              location_descriptions[i]) for i in range(num_locations)]
+
         else:
             self.locations = locations
 
     @classmethod
-    def create(cls, llm_client: LLMClient, name: Optional[str] = None, description: Optional[str] = None):
+    def create(cls, llm_client: LLMClient, name: Optional[str] = None, description: Optional[str] = None, materialised: bool = True):
         """
         Creates a new region using the LLM client.
         If name and description are provided, they will be used instead of generating new ones.
@@ -48,6 +56,7 @@ class Region(BaseModel):
         :param llm_client: The LLM client to use for generating the region.
         :param name: Optional name for the region.
         :param description: Optional description for the region.
+        :param materialised: False to create a stub whose locations are generated later, see GameState.materialise_region.
         :return: A new Region instance.
         """
         if name is None:
@@ -57,46 +66,91 @@ class Region(BaseModel):
         return cls(
             name=name,
             description=description,
-            hazard_level=random.randint(0, 4),
+            hazard_level=llm_client.rng.stream("world").randint(0, 4),
             locations=[],
+            materialised=materialised,
         )
 
+    def scout(self, game_state) -> Optional[Location]:
+        """
+        Finds the nearest undiscovered location to the region's entry point and marks it as discovered.
+
+        :param game_state: The current GameState instance.
+        :return: The discovered location, or None if every location in the region is already known.
+        """
+        region_index = game_state.region_index(self)
+        found = game_state.world_map.nearest_undiscovered(game_state.regions, self.x, self.y, region_index)
+        if found is None:
+            return None
+        location = self.locations[found[1]]
+        location.discovered = True
+        return location
+
     def region_screen(self, screen, game_state):
         """
         Displays the region screen, listing visible locations and allowing the user to select a location to visit.
+        Travelling to a location discovers any others nearby. The region's locations are generated on first entry.
         :param screen: The Screen instance for display.
         :param game_state: The current GameState instance.
         """
+        if not self.materialised:
+            screen.display(f"Entering {self.name}...")
+            game_state.materialise_region(self)
+        region_index = game_state.region_index(self)
+        world_map = game_state.world_map
         while True:
-            visible_locations = [loc for loc in self.locations if loc.discovered]
+            visible_indexes = [j for j, loc in enumerate(self.locations) if loc.discovered]
+            visible_locations = [self.locations[j] for j in visible_indexes]
             if not visible_locations:
                 screen.display(f"No locations discovered yet in {self.name}.", f"Hazard Level: {self.hazard_level}")
-                screen.add_new_line("Press 'b' to go back.")
+                screen.add_new_line("Press 's' to scout the region, or 'b' to go back.")
                 c = screen.handle_keypress(game_state)
-                if c == ord('b'):
+                if c == ord('s'):
+                    self._scout_screen(screen, game_state)
+                elif c == ord('b'):
                     break
                 continue
 
-            options = [f"{loc.name} (Distance: {loc.distance})" for loc in visible_locations]
+            plans = [world_map.travel(region_index, j) for j in visible_indexes]
+            options = [f"{loc.name} (Distance: {plan.distance}, {plan.hours} hours)" for loc, plan in zip(visible_locations, plans)]
             screen.display_options(f"{self.name} (Hazard Level: {self.hazard_level})\nSelect a location to visit:", options)
-            screen.add_new_line(f"Enter 1-{len(visible_locations)} to visit, or 'b' to go back.")
+            screen.add_new_line(f"Enter 1-{len(visible_locations)} to visit, 's' to scout, or 'b' to go back.")
             c = screen.handle_keypress(game_state)
             if c >= ord('1') and c < ord('1') + len(visible_locations):
                 location_index = c - ord('1')
                 selected_location = visible_locations[location_index]
+                plan = plans[location_index]
                 # Show location description and ask for confirmation
                 while True:
-                    screen.display(f"{selected_location.name}", f"{selected_location.description}", f"Distance: {selected_location.distance}")
+                    screen.display(f"{selected_location.name}", f"{selected_location.description}",
+                                   f"Distance: {plan.distance}", f"Travel time: {plan.hours} hours",
+                                   f"Hazard exposure: {plan.hazard_exposure}")
                     screen.add_new_line("Press 'y' to confirm, or 'b' to return to location selection.")
                     confirm = screen.handle_keypress(game_state)
                     if confirm == ord('y'):
+                        # Characters out on an expedition or injured can't take part
+                        characters = game_state.available_characters()
+                        if not characters:
+                            screen.temp_display(2, "Everyone is away or injured. Wait for the party to return or recover.")
+                            break
                         screen.temp_display(2, f"Traveling to {selected_location.name}...")
-                        characters = getattr(game_state, 'characters', [])
+                        found = world_map.discover_around(game_state.regions, selected_location.x, selected_location.y)
+                        if found:
+                            names = ", ".join(game_state.regions[i].locations[j].name for i, j in found)
+                            screen.temp_display(2, f"On the way, the party spots: {names}")
                         event = Event.create(game_state, self, characters)
                         event_screen(screen, event, game_state)
                         break
                     elif confirm == ord('b'):
                         break
+            elif c == ord('s'):
+                self._scout_screen(screen, game_state)
             elif c == ord('b'):
                 break
 
+    def _scout_screen(self, screen, game_state):
+        location = self.scout(game_state)
+        if location is None:
+            screen.temp_display(2, f"There is nothing left to find in {self.name}.")
+        else:
+            screen.temp_display(2, f"Scouts report a new location: {location.name}")
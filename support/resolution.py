@@ -0,0 +1,170 @@
+"""
+The numeric model behind event outcomes. A party's level, talents and gear, the region's hazard level and the
+action chosen feed a logistic model giving the chance of success and of injury. Everything is evaluated with NumPy
+over whole batches of parties at once, so the same code resolves one manual event, a round of auto-expeditions or
+millions of simulated events when tuning the balance.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import time
+import numpy as np
+
+if TYPE_CHECKING:
+    from support.character import Character
+    from support.gamestate import GameState
+
+OUTCOMES = ["Success with no injuries", "Failure with no injuries", "Success with injuries", "Failure with injuries"]
+
+# Logistic model coefficients. Tune with balance.py.
+SUCCESS_BASE = 0.4
+SUCCESS_PER_LEVEL = 0.35
+SUCCESS_PER_GEAR = 0.1
+SUCCESS_PER_HAZARD = -0.35
+INJURY_BASE = -1.2
+INJURY_PER_LEVEL = -0.2
+INJURY_PER_HAZARD = 0.45
+
+# Talent bonuses to the success and injury log-odds. Success bonuses are averaged over the party;
+# the best injury bonus applies to everyone, since one good planner keeps the whole party safer.
+TALENTS: Dict[Optional[str], Tuple[float, float]] = {
+    None: (0.0, 0.0),
+    "polymath": (0.3, 0.0),
+    "capable": (0.4, 0.0),
+    "good planner": (0.1, -0.6),
+}
+
+# How each event choice shifts the success and injury log-odds
+ACTIONS: Dict[str, Tuple[float, float]] = {
+    "Engage": (0.0, 0.0),
+    "Talk": (-0.1, -0.4),
+    "Flee": (-0.8, -0.8),
+}
+
+
+def sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def party_arrays(parties: Sequence[Sequence["Character"]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flattens parties of characters into per-party stat arrays.
+
+    :param parties: The parties, each a list of characters.
+    :return: Each party's mean level, mean talent success bonus, best talent injury bonus and mean gear count.
+    """
+    sizes = np.array([len(party) for party in parties])
+    members = [character for party in parties for character in party]
+    owner = np.repeat(np.arange(len(parties)), sizes)
+    levels = np.array([character.level for character in members], dtype=float)
+    gear = np.array([len(character.gear) for character in members], dtype=float)
+    talent_success = np.array([TALENTS.get(character.talent, (0.0, 0.0))[0] for character in members])
+    talent_injury = np.array([TALENTS.get(character.talent, (0.0, 0.0))[1] for character in members])
+
+    counts = np.maximum(sizes, 1)
+    mean_level = np.bincount(owner, levels, minlength=len(parties)) / counts
+    mean_talent = np.bincount(owner, talent_success, minlength=len(parties)) / counts
+    mean_gear = np.bincount(owner, gear, minlength=len(parties)) / counts
+    best_injury = np.zeros(len(parties))
+    np.minimum.at(best_injury, owner, talent_injury)
+    return mean_level, mean_talent, best_injury, mean_gear
+
+
+def outcome_probabilities(level: np.ndarray, talent_success: np.ndarray, talent_injury: np.ndarray, gear: np.ndarray,
+                          hazard: np.ndarray, action_success: np.ndarray | float = 0.0,
+                          action_injury: np.ndarray | float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates the outcome model for a batch of parties. All arguments broadcast against each other.
+
+    :return: The chance of success and the chance of injury for each party.
+    """
+    success = SUCCESS_BASE + SUCCESS_PER_LEVEL * (level - 1) + talent_success + SUCCESS_PER_GEAR * gear \
+        + SUCCESS_PER_HAZARD * hazard + action_success
+    injury = INJURY_BASE + INJURY_PER_LEVEL * (level - 1) + talent_injury + INJURY_PER_HAZARD * hazard + action_injury
+    return sigmoid(success), sigmoid(injury)
+
+
+def roll(p_success: np.ndarray, p_injury: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Draws success and injury for each party.
+    """
+    return rng.random(p_success.shape) < p_success, rng.random(p_injury.shape) < p_injury
+
+
+def outcome_codes(success: np.ndarray, injured: np.ndarray) -> np.ndarray:
+    """
+    Maps success and injury flags to indexes into OUTCOMES.
+    """
+    return np.where(success, 0, 1) + 2 * injured.astype(int)
+
+
+def world_generator(game_state: "GameState") -> np.random.Generator:
+    """
+    A NumPy generator seeded from the world's event stream, so resolutions in a seeded world are reproducible.
+    """
+    return np.random.default_rng(game_state.llm_client.rng.stream("events").getrandbits(64))
+
+
+def resolve_outcomes(game_state: "GameState", parties: Sequence[Sequence["Character"]], hazards: Sequence[float],
+                     actions: Sequence[str]) -> List[str]:
+    """
+    Rolls the outcome of an event for each of a batch of parties.
+
+    :param game_state: The current GameState instance.
+    :param parties: The parties, each a list of characters.
+    :param hazards: The hazard level where each party is.
+    :param actions: The action each party takes, one of ACTIONS.
+    :return: The outcome for each party, one of OUTCOMES.
+    """
+    if not parties:
+        return []
+    level, talent_success, talent_injury, gear = party_arrays(parties)
+    action_success = np.array([ACTIONS.get(action, (0.0, 0.0))[0] for action in actions])
+    action_injury = np.array([ACTIONS.get(action, (0.0, 0.0))[1] for action in actions])
+    p_success, p_injury = outcome_probabilities(level, talent_success, talent_injury, gear, np.asarray(hazards, dtype=float),
+                                                action_success, action_injury)
+    codes = outcome_codes(*roll(p_success, p_injury, world_generator(game_state)))
+    return [OUTCOMES[code] for code in codes]
+
+
+def apply_outcomes(parties: Sequence[Sequence["Character"]], outcomes: Sequence[str]) -> List[List[bool]]:
+    """
+    Applies XP and injuries for a batch of resolved events to every character involved, through
+    Character.apply_outcome so the batch and single-character rules can't drift apart.
+
+    :param parties: The parties, each a list of characters.
+    :param outcomes: The outcome for each party.
+    :return: For each party, whether each of its characters levelled up.
+    """
+    return [[character.apply_outcome(outcome) for character in party] for party, outcome in zip(parties, outcomes)]
+
+def simulate(resolutions: int, levels: Sequence[float] = (1, 2, 3, 5, 8), hazards: Sequence[float] = (0, 1, 2, 3, 4),
+             action: str = "Engage", seed: Optional[int] = None) -> Dict[str, np.ndarray | float]:
+    """
+    Monte Carlo estimate of the success and injury rates over a grid of party levels and hazard levels, with random
+    talents and gear. Used to tune the model coefficients.
+
+    :param resolutions: The number of events to resolve for each cell of the grid.
+    :param levels: The party levels to simulate.
+    :param hazards: The hazard levels to simulate.
+    :param action: The action every party takes.
+    :param seed: The NumPy seed, for repeatable runs.
+    :return: "success" and "injury" rates, each a levels x hazards array, and "rate", the resolutions per second.
+    """
+    rng = np.random.default_rng(seed)
+    level = np.asarray(levels, dtype=float)[:, None, None]
+    hazard = np.asarray(hazards, dtype=float)[None, :, None]
+    talent_table = np.array(list(TALENTS.values()))
+    action_success, action_injury = ACTIONS[action]
+
+    start = time.perf_counter()
+    shape = (len(levels), len(hazards), resolutions)
+    talents = talent_table[rng.integers(0, len(talent_table), shape)]
+    gear = rng.integers(0, 4, shape)
+    p_success, p_injury = outcome_probabilities(level, talents[..., 0], talents[..., 1], gear, hazard, action_success, action_injury)
+    success, injured = roll(p_success, p_injury, rng)
+    elapsed = time.perf_counter() - start
+    return {
+        "success": success.mean(axis=-1),
+        "injury": injured.mean(axis=-1),
+        "rate": success.size / elapsed if elapsed else float("inf"),
+    }
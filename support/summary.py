@@ -0,0 +1,159 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel, Field, PrivateAttr
+from contextlib import contextmanager
+import threading, logging
+
+from utils.base_utils import private_getstate, private_setstate
+from utils.prompts import ContextSlot, estimate_tokens, truncate_to_tokens
+
+if TYPE_CHECKING:
+    from support.event import Event
+    from utils.llm_client import LLMClient
+
+
+class SubjectSummary(BaseModel):
+    """
+    The condensed history of a single region or character.
+    Recent events wait in `pending` until there are enough to summarise, are then folded into `summary`,
+    and once that grows too long it is folded again into the more compressed `archive`.
+    """
+    summary: str = Field("")
+    archive: str = Field("")
+    pending: List[str] = Field(default_factory=list)
+    events_summarised: int = Field(0)
+
+
+class CampaignSummaries(BaseModel):
+    """
+    Rolling summaries of resolved events per region and per character, stored with the GameState.
+    Summarisation runs on background threads so it never blocks the player.
+    """
+    regions: Dict[str, SubjectSummary] = Field(default_factory=dict)
+    characters: Dict[str, SubjectSummary] = Field(default_factory=dict)
+    pending_threshold: int = Field(4)
+    summary_token_limit: int = Field(120)
+    item_token_limit: int = Field(60)
+    # Guards the summaries. Summaries are small, so one lock per campaign is plenty.
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    # Subjects with a summarisation running, so each has at most one at a time
+    _summarising: Set[Tuple[str, str]] = PrivateAttr(default_factory=set)
+
+    # The lock and summarisations in flight belong to this process, not to the save
+    __getstate__ = private_getstate
+    __setstate__ = private_setstate
+
+    @contextmanager
+    def frozen(self):
+        """
+        Holds off every change to the summaries for as long as the block runs, e.g. while they're pickled.
+        """
+        with self._lock:
+            yield
+
+    def _subjects(self, kind: str) -> Dict[str, SubjectSummary]:
+        return self.regions if kind == "region" else self.characters
+
+    def record(self, llm_client: "LLMClient", event: "Event"):
+        """
+        Adds a resolved event to the pending history of its region and characters,
+        starting a background summarisation for any subject that has reached the threshold and isn't already being
+        summarised. Subjects whose last summarisation failed are retried here too.
+
+        :param llm_client: The LLM client to summarise with.
+        :param event: The resolved event.
+        """
+        item = truncate_to_tokens(f"{event.outcome}: {event.outcome_desc}", self.item_token_limit)
+        subjects = [("region", event.region)] + [("character", name) for name in event.characters]
+        due = []
+        with self._lock:
+            for kind, name in subjects:
+                entry = self._subjects(kind).setdefault(name, SubjectSummary())
+                entry.pending.append(item)
+                if len(entry.pending) >= self.pending_threshold and (kind, name) not in self._summarising:
+                    self._summarising.add((kind, name))
+                    due.append((kind, name))
+
+        for kind, name in due:
+            thread = threading.Thread(target=self.summarise, args=(llm_client, kind, name))
+            thread.daemon = True
+            thread.start()
+
+    def summarise(self, llm_client: "LLMClient", kind: str, name: str):
+        """
+        Summarises a subject until fewer than pending_threshold events are left pending, then marks it as no longer
+        being summarised. If a summarisation fails the events stay pending for the next record to retry.
+
+        :param llm_client: The LLM client to summarise with.
+        :param kind: Either "region" or "character".
+        :param name: The name of the region or character.
+        """
+        try:
+            while self._summarise_once(llm_client, kind, name):
+                pass
+        finally:
+            with self._lock:
+                self._summarising.discard((kind, name))
+
+    def _summarise_once(self, llm_client: "LLMClient", kind: str, name: str) -> bool:
+        """
+        Folds the oldest pending events of a subject into its summary, and the summary into the archive if it has grown
+        too long.
+
+        :return: Whether enough events are still pending to summarise again.
+        """
+        with self._lock:
+            entry = self._subjects(kind)[name]
+            # At most pending_threshold events per pass, so the prompt stays the same size however many have built
+            # up, e.g. during an outage. The rest are left for the next pass.
+            events = entry.pending[:self.pending_threshold]
+            summary = entry.summary
+        if not events:
+            return False
+
+        try:
+            new_summary = llm_client.background_generate("summary", kind, max_tokens=self.summary_token_limit,
+                                                         name=name, summary=summary or "None", events="\n".join(events))
+            archive = None
+            if estimate_tokens(new_summary) > self.summary_token_limit * 0.75:
+                with self._lock:
+                    old_archive = entry.archive
+                archive = llm_client.background_generate("summary", kind, max_tokens=self.summary_token_limit,
+                                                         name=name, summary=old_archive or "None", events=new_summary)
+        except Exception as e:
+            logging.error(f"Error summarising history for {kind} {name}: {e}")
+            return False
+
+        with self._lock:
+            entry.pending = entry.pending[len(events):]
+            entry.events_summarised += len(events)
+            if archive is not None:
+                entry.archive = archive
+                entry.summary = ""
+            else:
+                entry.summary = new_summary
+            still_due = len(entry.pending) >= self.pending_threshold
+        logging.info(f"Summarised {len(events)} events for {kind} {name}.")
+        return still_due
+
+    def context(self, region: Optional[str] = None, characters: Optional[List[str]] = None, recent_items: int = 2) -> List[ContextSlot]:
+        """
+        Builds a fixed-size prompt context for a region and characters from their summaries and latest pending events.
+        The size doesn't grow with campaign length since each part is bounded.
+
+        :param region: The region name.
+        :param characters: The character names.
+        :param recent_items: How many unsummarised events to include per subject.
+        :return: Context slots for the prompt builder, the region first.
+        """
+        subjects = ([("region", region)] if region else []) + [("character", name) for name in characters or []]
+        context = []
+        with self._lock:
+            for priority, (kind, name) in enumerate(subjects):
+                entry = self._subjects(kind).get(name)
+                if entry is None:
+                    continue
+                items = [text for text in (entry.archive, entry.summary) if text] + entry.pending[-recent_items:]
+                if items:
+                    context.append(ContextSlot(title=f"History of {name}", items=items, priority=priority))
+        return context
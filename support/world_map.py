@@ -0,0 +1,290 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+import math, random
+import numpy as np
+
+from utils.base_utils import slots_getstate, slots_setstate
+
+if TYPE_CHECKING:
+    from support.region import Region
+
+# Node 0 of the region graph is the home base, node i+1 is GameState.regions[i]
+HOME_NODE = 0
+# Node 0 of each region's local graph is the region's entry point, node j+1 is Region.locations[j]
+ENTRY_NODE = 0
+
+TRAVEL_SPEED = 4.0       # distance units per hour
+REGION_RADIUS = 8.0      # how far locations are placed from their region's entry point
+NEIGHBOURS = 2           # extra nearest-neighbour edges added to each node on top of the spanning tree
+DISCOVERY_RADIUS = 5.0   # locations within this distance of where the party arrives are discovered
+
+
+@dataclass(slots=True)
+class TravelPlan:
+    """
+    The cost of travelling from the home base to a location.
+    """
+    distance: float
+    hours: float
+    hazard_exposure: float
+    route: List[int]
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+def all_pairs_shortest_paths(weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Floyd-Warshall over a dense weight matrix, vectorised over rows and columns with NumPy.
+
+    :param weights: An n x n matrix of edge weights, with inf where there is no edge and 0 on the diagonal.
+    :return: The shortest distances between every pair of nodes, and the next hop on the shortest route from i to j.
+    """
+    n = len(weights)
+    distances = weights.copy()
+    next_hop = np.where(np.isfinite(distances), np.arange(n)[None, :], -1)
+    for k in range(n):
+        via = distances[:, k:k + 1] + distances[k:k + 1, :]
+        better = via < distances
+        distances = np.where(better, via, distances)
+        next_hop = np.where(better, next_hop[:, k:k + 1], next_hop)
+    return distances, next_hop
+
+
+def connect(points: np.ndarray, neighbours: int = NEIGHBOURS) -> np.ndarray:
+    """
+    Builds a sparse, connected road network over a set of points: a minimum spanning tree plus edges to each
+    point's nearest neighbours.
+
+    :param points: An n x 2 array of coordinates.
+    :param neighbours: How many nearest neighbours each point is also joined to.
+    :return: An n x n weight matrix, with the Euclidean length of each road and inf where there is none.
+    """
+    n = len(points)
+    lengths = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+    weights = np.full((n, n), np.inf)
+    np.fill_diagonal(weights, 0.0)
+    if n < 2:
+        return weights
+
+    # Prim's algorithm for the spanning tree
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best = lengths[0].copy()
+    parent = np.zeros(n, dtype=int)
+    for _ in range(n - 1):
+        candidates = np.where(in_tree, np.inf, best)
+        node = int(np.argmin(candidates))
+        weights[node, parent[node]] = weights[parent[node], node] = lengths[node, parent[node]]
+        in_tree[node] = True
+        closer = lengths[node] < best
+        best = np.where(closer, lengths[node], best)
+        parent = np.where(closer, node, parent)
+
+    order = np.argsort(lengths, axis=1)[:, 1:neighbours + 1]
+    for i, nearest in enumerate(order):
+        weights[i, nearest] = weights[nearest, i] = lengths[i, nearest]
+    return weights
+
+
+class SpatialGrid:
+    """
+    A uniform grid over location coordinates for nearest-neighbour and radius queries without scanning every location.
+    """
+
+    def __init__(self, cell_size: float = REGION_RADIUS):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, int, float, float]]] = {}
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, region_index: int, location_index: int, x: float, y: float):
+        self.cells.setdefault(self._cell(x, y), []).append((region_index, location_index, x, y))
+
+    def remove_region(self, region_index: int):
+        for key in list(self.cells):
+            self.cells[key] = [entry for entry in self.cells[key] if entry[0] != region_index]
+            if not self.cells[key]:
+                del self.cells[key]
+
+    def within(self, x: float, y: float, radius: float) -> List[Tuple[int, int]]:
+        """
+        Finds every location within a radius of a point.
+
+        :return: (region index, location index) pairs.
+        """
+        cx0, cy0 = self._cell(x - radius, y - radius)
+        cx1, cy1 = self._cell(x + radius, y + radius)
+        found = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for region_index, location_index, lx, ly in self.cells.get((cx, cy), []):
+                    if (lx - x) ** 2 + (ly - y) ** 2 <= radius ** 2:
+                        found.append((region_index, location_index))
+        return found
+
+    def nearest(self, x: float, y: float, accept: Callable[[int, int], bool], max_rings: int = 64) -> Optional[Tuple[int, int]]:
+        """
+        Finds the nearest location to a point that passes a filter, searching outwards ring by ring of cells.
+
+        :param accept: Called with (region index, location index), returns whether the location qualifies.
+        :param max_rings: How many rings of cells to search before giving up.
+        :return: (region index, location index) of the nearest accepted location, or None.
+        """
+        cx, cy = self._cell(x, y)
+        best, best_distance = None, math.inf
+        for ring in range(max_rings + 1):
+            # Anything in this ring or further out is at least (ring - 1) cells away
+            if best is not None and (ring - 1) * self.cell_size > best_distance:
+                break
+            for gx in range(cx - ring, cx + ring + 1):
+                for gy in range(cy - ring, cy + ring + 1):
+                    if max(abs(gx - cx), abs(gy - cy)) != ring:
+                        continue
+                    for region_index, location_index, lx, ly in self.cells.get((gx, gy), []):
+                        distance = math.hypot(lx - x, ly - y)
+                        if distance < best_distance and accept(region_index, location_index):
+                            best, best_distance = (region_index, location_index), distance
+        return best
+
+
+class WorldMap:
+    """
+    The spatial layout of the world. Regions and their locations have coordinates and are joined by roads.
+    Shortest distances are precomputed per level: between every pair of regions (with the home base), and between
+    every pair of nodes inside each region. Routes between any two places combine the two, so nothing is searched
+    at travel time and the tables stay small however many regions there are.
+    """
+
+    def __init__(self):
+        self.region_coords = np.zeros((1, 2))
+        self.region_distances = np.zeros((1, 1))
+        self.region_next = np.zeros((1, 1), dtype=int)
+        self.hazards = np.zeros(1)
+        self.local_distances: List[np.ndarray] = []
+        self.grid = SpatialGrid()
+
+    @classmethod
+    def generate(cls, home_base: "Region", regions: List["Region"], rng: Optional[random.Random] = None) -> "WorldMap":
+        """
+        Places the home base, regions and locations on the map and precomputes their distances.
+        The home base sits at the origin with regions scattered around it.
+
+        :param home_base: The home base region.
+        :param regions: The explorable regions.
+        :param rng: The random number generator for the layout, normally the world's "map" stream.
+        :return: The new map.
+        """
+        rng = rng or random.Random()
+        home_base.x, home_base.y = 0.0, 0.0
+        for i, region in enumerate(regions):
+            angle = 2 * math.pi * (i + rng.uniform(-0.3, 0.3)) / max(1, len(regions))
+            radius = rng.uniform(3, 6) * REGION_RADIUS
+            region.x, region.y = radius * math.cos(angle), radius * math.sin(angle)
+        world_map = cls()
+        world_map._build_regions(home_base, regions)
+        for i, region in enumerate(regions):
+            world_map.place_locations(i, region, rng)
+        return world_map
+
+    def _build_regions(self, home_base: "Region", regions: List["Region"]):
+        self.region_coords = np.array([[home_base.x, home_base.y]] + [[region.x, region.y] for region in regions])
+        self.hazards = np.array([home_base.hazard_level] + [region.hazard_level for region in regions], dtype=float)
+        self.region_distances, self.region_next = all_pairs_shortest_paths(connect(self.region_coords))
+        self.local_distances = [np.zeros((1, 1)) for _ in regions]
+
+    def place_locations(self, region_index: int, region: "Region", rng: Optional[random.Random] = None):
+        """
+        Places a region's locations around its entry point and precomputes the distances between them.
+        Also used when a region's locations are generated after the map.
+
+        :param region_index: The index of the region in GameState.regions.
+        :param region: The region.
+        :param rng: The random number generator for the layout.
+        """
+        rng = rng or random.Random()
+        for location in region.locations:
+            angle = rng.uniform(0, 2 * math.pi)
+            radius = REGION_RADIUS * math.sqrt(rng.uniform(0.05, 1))
+            location.x, location.y = region.x + radius * math.cos(angle), region.y + radius * math.sin(angle)
+        self.index_locations(region_index, region)
+
+    def index_locations(self, region_index: int, region: "Region"):
+        """
+        Builds the road network, distance table and spatial index entries for a region's already placed locations.
+        """
+        points = np.array([[region.x, region.y]] + [[location.x, location.y] for location in region.locations])
+        distances, _ = all_pairs_shortest_paths(connect(points))
+        self.local_distances[region_index] = distances
+        self.grid.remove_region(region_index)
+        for j, location in enumerate(region.locations):
+            location.distance = round(float(distances[ENTRY_NODE, j + 1]), 1)
+            self.grid.insert(region_index, j, location.x, location.y)
+
+    def region_distance(self, region_index: int) -> float:
+        """
+        The road distance from the home base to a region's entry point.
+        """
+        return float(self.region_distances[HOME_NODE, region_index + 1])
+
+    def region_route(self, from_node: int, to_node: int) -> List[int]:
+        """
+        The region graph nodes on the shortest route between two nodes, inclusive. Node 0 is the home base.
+        """
+        route = [from_node]
+        while route[-1] != to_node:
+            hop = int(self.region_next[route[-1], to_node])
+            if hop < 0:
+                return []
+            route.append(hop)
+        return route
+
+    def travel(self, region_index: int, location_index: int) -> TravelPlan:
+        """
+        Works out the trip from the home base to a location: its length, how long it takes and how much hazard
+        the party is exposed to along the way, weighted by the hazard level of each stretch.
+
+        :param region_index: The index of the region in GameState.regions.
+        :param location_index: The index of the location in the region.
+        :return: The travel plan.
+        """
+        route = self.region_route(HOME_NODE, region_index + 1)
+        exposure = 0.0
+        for a, b in zip(route, route[1:]):
+            leg_hours = float(self.region_distances[a, b]) / TRAVEL_SPEED
+            exposure += leg_hours * (self.hazards[a] + self.hazards[b]) / 2
+        local = float(self.local_distances[region_index][ENTRY_NODE, location_index + 1])
+        exposure += local / TRAVEL_SPEED * self.hazards[region_index + 1]
+        distance = self.region_distance(region_index) + local
+        return TravelPlan(distance=round(distance, 1), hours=round(distance / TRAVEL_SPEED, 1),
+                          hazard_exposure=round(float(exposure), 1), route=route)
+
+    def nearest_undiscovered(self, regions: List["Region"], x: float, y: float, region_index: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """
+        Finds the closest location that hasn't been discovered yet.
+
+        :param regions: GameState.regions, to check discovery against.
+        :param x: The x coordinate to search from.
+        :param y: The y coordinate to search from.
+        :param region_index: If given, only search this region.
+        :return: (region index, location index), or None if everything nearby is discovered.
+        """
+        def undiscovered(i: int, j: int) -> bool:
+            return (region_index is None or i == region_index) and not regions[i].locations[j].discovered
+        return self.grid.nearest(x, y, undiscovered)
+
+    def discover_around(self, regions: List["Region"], x: float, y: float, radius: float = DISCOVERY_RADIUS) -> List[Tuple[int, int]]:
+        """
+        Marks every location within a radius of a point as discovered.
+
+        :return: The (region index, location index) pairs that were newly discovered.
+        """
+        found = []
+        for i, j in self.grid.within(x, y, radius):
+            location = regions[i].locations[j]
+            if not location.discovered:
+                location.discovered = True
+                found.append((i, j))
+        return found
@@ -0,0 +1,214 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional
+import sqlite3, threading, logging, os
+
+from utils.base_utils import slots_getstate, slots_setstate
+
+if TYPE_CHECKING:
+    from utils.llm_client import LLMClient
+
+DEFAULT_PACK_PATH = os.path.join('packs', 'world_pack.db')
+
+# The kinds of content a pack holds, in the order a new world uses them
+KINDS = ["currency", "character", "region", "location", "home_base"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    theme TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    specialization TEXT NOT NULL DEFAULT '',
+    used INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_content_available ON content(theme, kind, used, id);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    theme TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, theme, kind);
+"""
+
+
+@dataclass(slots=True)
+class PackItem:
+    """
+    A single piece of pre-generated content. Fields that don't apply to its kind are empty.
+    """
+    name: str
+    description: str = ""
+    specialization: str = ""
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+@dataclass(slots=True)
+class PackJob:
+    """
+    A queued request to generate one pack item.
+    """
+    id: int
+    theme: str
+    kind: str
+    attempts: int = 0
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+class WorldPack:
+    """
+    A file of pre-generated world content, stored in SQLite and indexed by theme and kind so a new world can be
+    assembled from it in milliseconds. Items are used at most once, so worlds built from the same pack don't repeat.
+    Also holds the job queue used to fill the pack, so an interrupted pre-generation run can pick up where it stopped.
+    """
+
+    def __init__(self, path: str = DEFAULT_PACK_PATH):
+        """
+        :param path: The pack file. Created if it doesn't exist.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open_existing(cls, path: str = DEFAULT_PACK_PATH) -> Optional["WorldPack"]:
+        """
+        Opens a pack if the file exists.
+
+        :return: The pack, or None if there is no pack file.
+        """
+        return cls(path) if os.path.exists(path) else None
+
+    def take(self, theme: str, kind: str, count: int) -> List[PackItem]:
+        """
+        Takes up to `count` unused items of a kind and marks them as used.
+
+        :param theme: The game theme.
+        :param kind: The kind of content, one of KINDS.
+        :param count: How many items are wanted.
+        :return: The items, which may be fewer than requested if the pack is running out.
+        """
+        if count <= 0:
+            return []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "UPDATE content SET used = 1 WHERE id IN "
+                    "(SELECT id FROM content WHERE theme = ? AND kind = ? AND used = 0 ORDER BY id LIMIT ?) "
+                    "RETURNING name, description, specialization",
+                    (theme, kind, count)).fetchall()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [PackItem(name=name, description=description, specialization=specialization) for name, description, specialization in rows]
+
+    def available(self, theme: str) -> Dict[str, int]:
+        """
+        Counts the unused items of each kind for a theme.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, COUNT(*) FROM content WHERE theme = ? AND used = 0 GROUP BY kind", (theme,)).fetchall()
+        counts = {kind: 0 for kind in KINDS}
+        counts.update(dict(rows))
+        return counts
+
+    def add(self, theme: str, kind: str, item: PackItem, job_id: Optional[int] = None):
+        """
+        Adds an item to the pack, marking the job that produced it as done in the same transaction.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT INTO content (theme, kind, name, description, specialization) VALUES (?, ?, ?, ?, ?)",
+                                   (theme, kind, item.name, item.description, item.specialization))
+                if job_id is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'done' WHERE id = ?", (job_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, theme: str, targets: Dict[str, int], max_attempts: int = 3) -> int:
+        """
+        Queues jobs so that, once they run, the pack holds at least the target number of unused items of each kind.
+        Jobs already pending count towards the target, so re-running with the same targets doesn't queue duplicates.
+        Jobs that have failed max_attempts times are marked failed first, so they're replaced rather than counted.
+
+        :param theme: The game theme.
+        :param targets: The number of unused items wanted for each kind.
+        :param max_attempts: How many failures a job gets before it's given up on.
+        :return: The number of new jobs queued.
+        """
+        available = self.available(theme)
+        queued = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("UPDATE jobs SET status = 'failed' WHERE theme = ? AND status = 'pending' AND attempts >= ?",
+                               (theme, max_attempts))
+            pending = dict(self._conn.execute("SELECT kind, COUNT(*) FROM jobs WHERE theme = ? AND status = 'pending' GROUP BY kind",
+                                              (theme,)).fetchall())
+            for kind, target in targets.items():
+                missing = target - available.get(kind, 0) - pending.get(kind, 0)
+                if missing > 0:
+                    self._conn.executemany("INSERT INTO jobs (theme, kind) VALUES (?, ?)", [(theme, kind)] * missing)
+                    queued += missing
+            self._conn.execute("COMMIT")
+        return queued
+
+    def pending_jobs(self, theme: Optional[str] = None, max_attempts: int = 3) -> List[PackJob]:
+        """
+        Lists the jobs still to run, skipping any that have already failed too often.
+        """
+        sql = "SELECT id, theme, kind, attempts FROM jobs WHERE status = 'pending' AND attempts < ?"
+        params: list = [max_attempts]
+        if theme is not None:
+            sql += " AND theme = ?"
+            params.append(theme)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY id", params).fetchall()
+        return [PackJob(id=job_id, theme=job_theme, kind=kind, attempts=attempts) for job_id, job_theme, kind, attempts in rows]
+
+    def record_failure(self, job_id: int):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET attempts = attempts + 1 WHERE id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def generate_item(llm_client: "LLMClient", kind: str, seed: Optional[int] = None) -> PackItem:
+    """
+    Generates one pack item with the LLM. Uses the same prompts as live world generation, but without falling back
+    to template content on failure, so a pack only ever holds real generations.
+
+    :param llm_client: The LLM client, with its theme set.
+    :param kind: The kind of content, one of KINDS.
+    :param seed: The prompt seed, e.g. the job id, so items generated from identical prompts still differ.
+    :return: The generated item.
+    """
+    if kind == "currency":
+        return PackItem(name=llm_client.background_generate("currency", max_tokens=5, seed=seed))
+    if kind == "character":
+        name = llm_client.background_generate("name", "character", max_tokens=20, seed=seed)
+        specialization = llm_client.background_generate("specialization", "character", max_tokens=200, seed=seed)
+        description = llm_client.background_generate("specialized_description", "character", max_tokens=100,
+                                                      name=name, specialization=specialization)
+        return PackItem(name=name, description=description, specialization=specialization)
+    subject_type = {"region": "region", "location": "location", "home_base": "home base"}[kind]
+    name = llm_client.background_generate("name", subject_type, max_tokens=20, seed=seed)
+    description = llm_client.background_generate("description", subject_type, max_tokens=100, name=name)
+    return PackItem(name=name, description=description)
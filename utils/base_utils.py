@@ -1,6 +1,7 @@
-from numpy.random import choice as np_choice
-from typing import TYPE_CHECKING, Sequence, TypeVar, Optional
-import os, re
+from dataclasses import fields, MISSING
+from typing import TYPE_CHECKING, Any, Sequence, TypeVar, Optional
+from pydantic import BaseModel
+import os, re, random
 
 if TYPE_CHECKING:
     from utils.screen import Screen
@@ -8,32 +9,82 @@ if TYPE_CHECKING:
 T = TypeVar('T')
 
 
-def choice(choices: Sequence[T], weights:Optional[list[float]] = None) -> T:
+def choice(choices: Sequence[T], weights:Optional[list[float]] = None, rng: Optional[random.Random] = None) -> T:
     """
     Selects a random choice from a list of choices based on given weights.
     
     :param choices: List of choices to select from.
     :param weights: List of weights corresponding to each choice. If None, all choices are equally likely.
+    :param rng: The random number generator to draw from, e.g. a WorldRandom stream. Defaults to the global one.
     :return: A randomly selected choice from the list, based on weighting if provided.
     """
-    if weights is None:
-        weights = [1/len(choices)] * len(choices)
+    return (rng or random).choices(choices, weights=weights)[0]
 
-    rand_index = np_choice(list(range(len(choices))), p=weights)
 
-    return choices[rand_index]
+def slots_getstate(self: Any) -> list:
+    """
+    Returns the pickled state of a slotted dataclass as a plain list of field values.
+    """
+    return [getattr(self, f.name) for f in fields(self)]
+
+
+def slots_setstate(self: Any, state: Any):
+    """
+    Restores a slotted dataclass from pickled state. Accepts both the dataclass field list and the dict state
+    written by the older pydantic versions of the model, so existing save files still load. Fields missing from the
+    saved state (e.g. added since the save was written) fall back to their defaults.
+
+    :param state: The pickled state.
+    """
+    if isinstance(state, dict):
+        values = state.get('__dict__', state)
+    else:
+        values = {f.name: value for f, value in zip(fields(self), state)}
+
+    for f in fields(self):
+        if f.name in values:
+            value = values[f.name]
+        elif f.default is not MISSING:
+            value = f.default
+        elif f.default_factory is not MISSING:
+            value = f.default_factory()
+        else:
+            raise ValueError(f"Missing field '{f.name}' in saved {type(self).__name__}.")
+        object.__setattr__(self, f.name, value)
+
+
+def private_getstate(self: Any) -> dict:
+    """
+    Returns the pickled state of a pydantic model without its private attributes, which hold things that belong to
+    the running process rather than the save, e.g. locks. See private_setstate.
+    """
+    state = BaseModel.__getstate__(self)
+    state['__pydantic_private__'] = None
+    return state
+
+
+def private_setstate(self: Any, state: dict):
+    """
+    Restores a pydantic model pickled with private_getstate, giving it fresh private attributes from their defaults.
+    Also restores saves written before the model had private attributes.
+
+    :param state: The pickled state.
+    """
+    private = {name: attribute.get_default(call_default_factory=True) for name, attribute in type(self).__private_attributes__.items()}
+    BaseModel.__setstate__(self, {**state, '__pydantic_private__': private})
 
 
-def file_browser(screen: "Screen", mode: str = "open"):
+def file_browser(screen: "Screen", mode: str = "open", folder: str = "."):
     """
     Opens a file browser to select or save .dat files.
 
     :param screen: The screen object to display the file browser.
     :param mode: The mode of operation, either "open" or "save".
-    :return: The selected filename or None if cancelled.
+    :param folder: The folder to list and save in.
+    :return: The selected file's path or None if cancelled.
     """
 
-    files = [f for f in os.listdir('.') if f.endswith('.dat')]
+    files = [f for f in os.listdir(folder) if f.endswith('.dat')]
     # Only allow alphanumerics, dash, underscore, and space (no tabs or other whitespace)
     valid_filename_re = re.compile(r'^[A-Za-z0-9\-_ ]+$')
 
@@ -49,7 +100,7 @@ def file_browser(screen: "Screen", mode: str = "open"):
                 return None
             idx = c - ord('1')
             if 0 <= idx < len(files):
-                return files[idx]
+                return os.path.normpath(os.path.join(folder, files[idx]))
 
     elif mode == "save":
         while True:
@@ -62,6 +113,7 @@ def file_browser(screen: "Screen", mode: str = "open"):
                 continue
             if not filename.lower().endswith('.dat'):
                 filename += '.dat'
+            filename = os.path.normpath(os.path.join(folder, filename))
             if os.path.exists(filename):
                 while True:
                     screen.display("File already exists. Overwrite? Press 'y' to confirm, 'b' to cancel.")
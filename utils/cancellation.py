@@ -0,0 +1,88 @@
+from typing import Callable, List, Optional
+import threading
+
+
+class GenerationCancelled(Exception):
+    """
+    Raised when a generation is abandoned because whoever asked for it no longer needs it.
+    """
+    pass
+
+
+class CancelToken:
+    """
+    Marks a piece of work as no longer wanted. Tokens form a tree: cancelling a token cancels every token made from
+    it with child(), so cancelling an LLMClient's root token abandons everything that client has in flight.
+    Pickles as a fresh token, since cancellation belongs to the running process rather than the save.
+    """
+
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        """
+        :param parent: A token whose cancellation also cancels this one.
+        """
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._unlink = parent.on_cancel(self.cancel) if parent is not None else None
+
+    def __reduce__(self):
+        return CancelToken, ()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def child(self) -> "CancelToken":
+        """
+        Makes a token for a smaller piece of work, e.g. one screen, that is also cancelled along with this one.
+        """
+        return CancelToken(self)
+
+    def cancel(self):
+        """
+        Cancels the token and every token made from it, running their callbacks. Cancelling twice does nothing.
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def close(self):
+        """
+        Detaches the token from its parent once the work is finished, so long-lived parents don't collect children.
+        """
+        if self._unlink is not None:
+            self._unlink()
+            self._unlink = None
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Registers a callback to run when the token is cancelled, or runs it now if it already has been.
+
+        :return: A function that unregisters the callback.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return unregister
+        callback()
+        return lambda: None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Sleeps for up to timeout seconds, waking early if the token is cancelled.
+
+        :return: Whether the token was cancelled.
+        """
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled("Generation cancelled.")
@@ -0,0 +1,88 @@
+from typing import Dict
+import threading, time, logging
+
+from utils.metrics import metrics
+
+
+class LLMUnavailableError(Exception):
+    """
+    Raised when the LLM can't be reached, either because its circuit breakers are open or every attempt failed.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to something that keeps failing.
+    After `failure_threshold` consecutive failures the breaker opens and requests fail fast. Once `reset_timeout`
+    seconds have passed a single trial request is let through (half-open): success closes the breaker again,
+    failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.state = "closed"
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Whether a request may be sent now. In the half-open state only one trial request is allowed at a time.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_progress = False
+            if self.state == "half_open" and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """
+        Whether requests should be kept away. Once reset_timeout has passed the breaker goes half-open, so the next
+        result decides whether it closes or opens again.
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            return self.state == "open"
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logging.info(f"Circuit breaker {self.name} closed.")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                metrics.incr(f"circuit_breaker.opened.{self.name}")
+                logging.warning(f"Circuit breaker {self.name} opened after {self.failures} failures.")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """
+    Returns the process-wide circuit breaker with the given name, e.g. "endpoint:<url>" or "model:<name>".
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
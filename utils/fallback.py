@@ -0,0 +1,152 @@
+"""
+Local fallback content for when the LLM is unavailable. Each generator fills a simple template from per-theme word lists,
+so the game can keep going (with plainer text) instead of blocking on an outage.
+"""
+from typing import Callable, Dict, List, Optional
+import random
+
+from utils.metrics import metrics
+
+THEME_WORDS: Dict[str, Dict[str, List[str]]] = {
+    "sci-fi": {
+        "first": ["Ama", "Dex", "Ilya", "Juno", "Kade", "Mira", "Orin", "Sable", "Tomas", "Vesna"],
+        "last": ["Achebe", "Halloran", "Ibarra", "Kovac", "Lindqvist", "Mbeki", "Okafor", "Reyes", "Tanaka", "Volkov"],
+        "place_adj": ["Derelict", "Frozen", "Outer", "Silent", "Drifting", "Shattered", "Ionised", "Far"],
+        "place_noun": ["Relay", "Belt", "Station", "Nebula", "Colony", "Moon", "Hangar", "Shipyard"],
+        "skills": ["Orbital mechanics", "Hull repair", "Xenobotany", "Signal analysis", "Zero-g salvage", "Reactor tuning"],
+        "currency": ["Credits", "Units", "Scrip", "Quanta"],
+        "detail": ["hums with failing machinery", "is lit by a distant red star", "smells of ozone and old coolant",
+                   "is scattered with the wreckage of older ships"],
+    },
+    "dungeon crawl": {
+        "first": ["Bram", "Cress", "Dorn", "Hild", "Isolde", "Mott", "Rook", "Sefa", "Tamsin", "Wick"],
+        "last": ["Ashdown", "Blackmere", "Cobb", "Grime", "Holloway", "Marrow", "Pike", "Stone", "Tallow", "Vane"],
+        "place_adj": ["Sunken", "Flooded", "Collapsed", "Forgotten", "Echoing", "Bone-strewn", "Lower", "Sealed"],
+        "place_noun": ["Crypt", "Vault", "Warren", "Cistern", "Ossuary", "Gallery", "Pit", "Undercroft"],
+        "skills": ["Lockpicking", "Trap sense", "Torchcraft", "Rope work", "Old tongues", "Shield wall"],
+        "currency": ["Crowns", "Marks", "Shards", "Bits"],
+        "detail": ["drips with cold water", "is choked with old cobwebs", "echoes with distant scratching",
+                   "is carved with warnings no one can read"],
+    },
+    "fantasy": {
+        "first": ["Aldric", "Brenna", "Caius", "Elowen", "Fenn", "Iona", "Leofric", "Maren", "Rowan", "Thea"],
+        "last": ["Ashford", "Brightwater", "Crane", "Fairholt", "Greaves", "Hartwell", "Larkin", "Moorcroft", "Reed", "Wren"],
+        "place_adj": ["Misty", "Golden", "Thornwood", "Silver", "Old", "High", "Whispering", "Sunlit"],
+        "place_noun": ["Vale", "Marsh", "Keep", "Hollow", "Fen", "Downs", "Crossing", "Grove"],
+        "skills": ["Herb lore", "Falconry", "Runecraft", "Swordplay", "Beast taming", "Cartography"],
+        "currency": ["Gold", "Silver", "Florins", "Sovereigns"],
+        "detail": ["is wrapped in morning mist", "is dotted with standing stones", "is watched over by an old tower",
+                   "is cut through by a slow, wide river"],
+    },
+    "wild west": {
+        "first": ["Abel", "Clara", "Eli", "Hattie", "Jesse", "Lottie", "Ned", "Rosa", "Silas", "Wyatt"],
+        "last": ["Barlow", "Calhoun", "Dalton", "Garrett", "Hollis", "McCrae", "Prewitt", "Santos", "Tolliver", "Vance"],
+        "place_adj": ["Dry", "Dusty", "Red", "Lonesome", "Broken", "Dead Man's", "Copper", "Rattlesnake"],
+        "place_noun": ["Gulch", "Creek", "Mesa", "Flats", "Canyon", "Junction", "Ridge", "Springs"],
+        "skills": ["Trick shooting", "Horse breaking", "Tracking", "Card sharping", "Blasting", "Trail cooking"],
+        "currency": ["Dollars", "Bits", "Greenbacks", "Pesos"],
+        "detail": ["bakes under a merciless sun", "is crossed by an abandoned rail line", "is haunted by tumbleweeds and silence",
+                   "shelters a handful of weathered shacks"],
+    },
+    "generic": {
+        "first": ["Alex", "Bea", "Cal", "Dana", "Eden", "Frey", "Gale", "Hale", "Ira", "Jules"],
+        "last": ["Adler", "Brook", "Carver", "Dale", "Ellis", "Ford", "Grey", "Hart", "Ives", "Lane"],
+        "place_adj": ["Quiet", "Northern", "Hidden", "Old", "Far", "Broken", "Lost", "Bright"],
+        "place_noun": ["Reach", "Hollow", "Point", "Fields", "Ridge", "Quarter", "Crossing", "Heights"],
+        "skills": ["Scouting", "First aid", "Negotiation", "Survival", "Engineering", "Stealth"],
+        "currency": ["Coins", "Tokens", "Chits", "Marks"],
+        "detail": ["has seen better days", "is quieter than it should be", "is full of places to hide",
+                   "rewards the careful and punishes the rash"],
+    },
+}
+
+
+def theme_words(theme: Optional[str]) -> Dict[str, List[str]]:
+    """
+    Returns the word lists for the closest matching built-in theme.
+    """
+    theme = (theme or "").lower()
+    for key, words in THEME_WORDS.items():
+        if key in theme:
+            return words
+    return THEME_WORDS["generic"]
+
+
+def _is_person(subject_type: str) -> bool:
+    return "character" in subject_type
+
+
+def fallback_name(words: Dict[str, List[str]], rng: random.Random, type: str = "", **kwargs) -> str:
+    if "currency" in type:
+        return rng.choice(words["currency"])
+    if _is_person(type):
+        return f"{rng.choice(words['first'])} {rng.choice(words['last'])}"
+    return f"{rng.choice(words['place_adj'])} {rng.choice(words['place_noun'])}"
+
+
+def fallback_currency(words: Dict[str, List[str]], rng: random.Random, **kwargs) -> str:
+    return rng.choice(words["currency"])
+
+
+def fallback_specialization(words: Dict[str, List[str]], rng: random.Random, **kwargs) -> str:
+    return rng.choice(words["skills"])
+
+
+def fallback_description(words: Dict[str, List[str]], rng: random.Random, type: str = "", name: str = "", specialization: str = "", **kwargs) -> str:
+    if _is_person(type):
+        skill = specialization or rng.choice(words["skills"])
+        return f"{name} is a quiet, capable sort, known mostly for {skill.lower()}."
+    return f"{name} {rng.choice(words['detail'])}."
+
+
+def fallback_event(words: Dict[str, List[str]], rng: random.Random, type: str = "", region: str = "", characters: str = "", **kwargs) -> str:
+    openings = {
+        "combat": "Without warning, hostile figures close in on {characters} from the edges of {region}.",
+        "exploration": "{characters} come across a path through {region} that doesn't appear on any map.",
+        "interaction": "A stranger in {region} hails {characters}, clearly wanting something from them.",
+    }
+    opening = openings.get(type, "Something stirs in {region} as {characters} press on.")
+    return opening.format(characters=characters or "The party", region=region or "the region") + \
+        f" The area {rng.choice(words['detail'])}."
+
+
+def fallback_outcome(words: Dict[str, List[str]], rng: random.Random, choice: str = "", outcome: str = "", **kwargs) -> str:
+    success = outcome.lower().startswith("success")
+    injured = "with injuries" in outcome.lower()
+    result = "It works, more or less." if success else "It doesn't go to plan."
+    injury = " Not everyone walks away unhurt." if injured else " Everyone makes it back in one piece."
+    return f"The party chooses to {choice.lower() or 'act'}. {result}{injury}"
+
+
+def fallback_summary(words: Dict[str, List[str]], rng: random.Random, summary: str = "", events: str = "", **kwargs) -> str:
+    recent = [line for line in events.splitlines() if line.strip()][-2:]
+    parts = ([summary] if summary and summary != "None" else []) + recent
+    return " ".join(parts)[-600:]
+
+
+GENERATORS: Dict[str, Callable[..., str]] = {
+    "name": fallback_name,
+    "currency": fallback_currency,
+    "specialization": fallback_specialization,
+    "description": fallback_description,
+    "specialized_description": fallback_description,
+    "event": fallback_event,
+    "outcome": fallback_outcome,
+    "summary": fallback_summary,
+}
+
+
+def generate_fallback(gen_type: str, theme: Optional[str] = None, rng: Optional[random.Random] = None, **kwargs) -> str:
+    """
+    Generates plain content for a prompt type without the LLM.
+
+    :param gen_type: The prompt type (e.g., "name", "description", "event").
+    :param theme: The game theme, used to pick the word lists.
+    :param rng: The random number generator to pick words with. Defaults to the global one.
+    :param kwargs: The values that would have been substituted into the prompt.
+    :return: The generated text.
+    """
+    generator = GENERATORS.get(gen_type, fallback_description)
+    metrics.incr(f"fallback.{gen_type}")
+    kwargs = {key: value for key, value in kwargs.items() if isinstance(value, str)}
+    return generator(theme_words(theme), rng or random.Random(), **kwargs)
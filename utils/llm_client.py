@@ -1,12 +1,45 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import requests, threading
-import time
+import time, random
 import logging
 
 from utils.screen import Screen
-from utils.prompts import Prompts
+from utils.prompts import Prompts, ContextSlot, estimate_tokens
 from utils.base_utils import choice
+from utils.metrics import metrics
+from utils.profiling import profiled, profiler
+from utils.llm_scheduler import BULK, INTERACTIVE, Priority, get_scheduler, priority_class
+from utils.rate_limiter import get_rate_limiter
+from utils.cancellation import CancelToken, GenerationCancelled
+from utils.circuit_breaker import LLMUnavailableError, get_breaker
+from utils.fallback import generate_fallback
+from utils.llm_transport import get_transport
+from utils.similarity import SimilarityIndex
+from utils.single_flight import SingleFlight
+from utils.validation import InvalidOutputError, clean, retry_prompt
+from utils.spend import CACHE_ONLY, CHEAP, SHORT, STAGES, BudgetExceededError, ResponseCache, cheapest, get_ledger, short_tokens
+from utils.world_random import PROMPT_SEED_RANGE, WorldRandom
+
+# Seconds to wait for the API before treating a request as failed
+REQUEST_TIMEOUT = 60
+
+# How many times multi_generate regenerates near-duplicate results before accepting them
+UNIQUE_RETRIES = 2
+
+# How many times a reply that fails validation, even after repair, is regenerated before giving up on it
+VALIDATION_RETRIES = 1
+
+# Identical requests in flight at the same time, from any client in the process, share one upstream call
+_single_flight = SingleFlight()
+
+# Earlier replies, reused once a budget is nearly spent
+_response_cache = ResponseCache()
+
+# Guards total_cost on every client, which is added to from many request threads at once
+_cost_lock = threading.Lock()
 
 class LLM(BaseModel):
     """
@@ -70,11 +103,25 @@ class LLMClient(BaseModel):
     prompts: Prompts = Field(...)
     model_list: list[LLM] = Field(LLMs)
     total_cost: float = Field(0.0)
+    session_id: Optional[str] = Field(None, exclude=True)
+    rng: WorldRandom = Field(default_factory=WorldRandom)
+    # Cancelled when the session ends. Generations that aren't given a narrower token use this one.
+    cancel_token: CancelToken = Field(default_factory=CancelToken, exclude=True)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def __getstate__(self):
+        # The screen belongs to whoever loads the save, not to the save itself
+        state = super().__getstate__()
+        state['__dict__'] = {**state['__dict__'], 'screen': None, 'session_id': None}
+        return state
 
     @classmethod
-    def create(cls, api_url: str, api_key: str, screen: Optional[Screen] = None, theme: Optional[str] = None):
+    def create(cls, api_url: str, api_key: str, screen: Optional[Screen] = None, theme: Optional[str] = None, session_id: Optional[str] = None):
         prompts = Prompts()
-        return cls(screen=screen, prompts=prompts, api_url=api_url, api_key=api_key, theme=theme, model_list=LLMs, total_cost=0.0)
+        return cls(screen=screen, prompts=prompts, api_url=api_url, api_key=api_key, theme=theme, model_list=LLMs, total_cost=0.0,
+                   session_id=session_id)
     
     def set_screen(self, screen: Screen):
         """
@@ -82,32 +129,144 @@ class LLMClient(BaseModel):
         """
         self.screen = screen
 
-    def _generate_text(self, prompt: str, max_tokens: int,  loading_text: str) -> str:
+    def cancel_scope(self) -> CancelToken:
+        """
+        Makes a token for generations that belong to one part of the UI, to cancel when the player leaves it.
+        Also cancelled when the session ends. Close it once it's no longer needed.
+        """
+        return self.cancel_token.child()
+
+    def _estimate_tokens(self, prompt: str, max_tokens: int) -> int:
+        return estimate_tokens(self.prompts.system_prompt + prompt) + max_tokens
+
+    def _record_cancelled(self, prompt: str, max_tokens: int):
+        """
+        Counts a request that was cancelled before it was sent, and the tokens that saved.
+        """
+        metrics.incr("llm.cancelled_requests")
+        metrics.incr("llm.cancelled_tokens_saved", self._estimate_tokens(prompt, max_tokens))
+
+    def _flight_key(self, prompt: str, max_tokens: int) -> tuple:
+        """
+        Identifies requests that would get the same answer, ignoring differences in whitespace. Keyed on the full
+        prompt, seed included, and on the world, so a seeded world never takes a result from another world's traffic.
+        """
+        return self.api_url, self.rng.seed, max_tokens, " ".join(self.prompts.system_prompt.split()), " ".join(prompt.split())
+
+    def _budget(self, site: str, prompt: str, max_tokens: int) -> tuple[Optional[str], int, bool]:
+        """
+        Works out how far a call should degrade to stay inside its budgets. Internal function.
+
+        :param site: The call site, i.e. the prompt type.
+        :return: An earlier reply to reuse instead of calling the LLM, or None, then the max_tokens to use and
+                 whether to restrict the call to the cheapest models.
+        :raises BudgetExceededError: If the call can't be made at all and there's nothing to reuse.
+        """
+        stage = get_ledger().stage(self.session_id, self.rng.seed, site)
+        if stage >= CACHE_ONLY:
+            cached = _response_cache.get(site, prompt) if stage == CACHE_ONLY else None
+            if cached is None:
+                raise BudgetExceededError(f"LLM budget exhausted for {site} ({STAGES[stage]}).")
+            metrics.incr("spend.cache_hits")
+            return cached, max_tokens, True
+        return None, short_tokens(max_tokens) if stage >= SHORT else max_tokens, stage >= CHEAP
+
+    def _add_cost(self, site: str, cost: float):
+        with _cost_lock:
+            self.total_cost += cost
+        get_ledger().record(self.session_id, self.rng.seed, site, cost)
+
+    def _generate_text(self, prompt: str, max_tokens: int,  loading_text: str, quiet: bool = False, priority: Priority = INTERACTIVE,
+                       cancel: Optional[CancelToken] = None, coalesce: bool = True, site: str = "custom", cheap: bool = False) -> str:
         """
-        Generate text using the LLM API with a loading animation. Internal function.
+        Generate text using the LLM API with a loading animation, unless quiet. Internal function.
+        Stops waiting as soon as the cancel token is cancelled, raising GenerationCancelled.
+        Unless coalesce is False, waits on an identical request that's already in flight rather than sending another.
         """
-        # Create a thread to generate the text
-        text = []
-        def generate_text_thread():
-            text.append(self._run_generation(prompt, max_tokens))
-        thread = threading.Thread(target=generate_text_thread)
-        thread.start()
-
-        # Display a spinning wheel loading animation while the text is being generated
-        if self.screen:
-            loading_chars = ['/', '-', '\\', '|']
-            i = 0
-            start_time = time.time()
-            while thread.is_alive():
-                if time.time() - start_time > 0:
+        token = cancel if cancel is not None else self.cancel_token
+        token.raise_if_cancelled()
+        # Every request runs on the shared scheduler, which decides what runs first
+        scheduler = get_scheduler()
+        start = lambda run_token: scheduler.submit(self.session_id, self._run_generation, prompt, max_tokens, run_token, priority=priority,
+                                                   site=site, cheap=cheap)
+        if coalesce:
+            flight, joined = _single_flight.join(self._flight_key(prompt, max_tokens), start)
+            future = flight.future
+            if joined:
+                metrics.incr("llm.coalesced_requests")
+                metrics.incr("llm.coalesced_tokens_saved", self._estimate_tokens(prompt, max_tokens))
+                # The first caller may have asked at a lower priority than this one
+                if flight.call is not None:
+                    scheduler.promote(flight.call, priority_class(priority))
+        else:
+            flight, future = None, start(token)
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+
+        def abandon():
+            # Requests still queued are dropped; ones already sent have their results discarded when they arrive.
+            # A shared request carries on until everyone waiting on it has given up.
+            cancelled = future.cancel() if flight is None else _single_flight.leave(flight)
+            if cancelled:
+                self._record_cancelled(prompt, max_tokens)
+            done.set()
+        unregister = token.on_cancel(abandon)
+
+        try:
+            # Display a spinning wheel loading animation while the text is being generated
+            if self.screen and not quiet:
+                loading_chars = ['/', '-', '\\', '|']
+                i = 0
+                while not done.is_set():
                     self.screen.display(f"{loading_text}... " + loading_chars[i])
                     i = (i + 1) % len(loading_chars)
-                    time.sleep(0.2)
+                    done.wait(0.2)
+            done.wait()
+        finally:
+            unregister()
+
+        # Return the generated text, unless it was abandoned first
+        if future.done() and not future.cancelled():
+            return future.result()
+        raise GenerationCancelled("Generation cancelled.")
+
+    def _generate_valid(self, gen_type: str, prompt: str, max_tokens: int, loading_text: str, quiet: bool = False,
+                        priority: Priority = INTERACTIVE, cancel: Optional[CancelToken] = None, coalesce: bool = True) -> str:
+        """
+        Generates text and checks it against the rules for its prompt type, repairing it locally where possible.
+        Replies that can't be repaired are regenerated with the reason added to the prompt. Internal function.
+        Degrades as budgets run down, see utils.spend.
+
+        :raises InvalidOutputError: If the reply is still invalid after VALIDATION_RETRIES regenerations.
+        :raises BudgetExceededError: If the budget doesn't allow the call.
+        """
+        cached, max_tokens, cheap = self._budget(gen_type, prompt, max_tokens)
+        if cached is not None:
+            return cached
+        text = self._generate_text(prompt, max_tokens, loading_text, quiet=quiet, priority=priority, cancel=cancel, coalesce=coalesce,
+                                   site=gen_type, cheap=cheap)
+        for attempt in range(VALIDATION_RETRIES + 1):
+            text, problem = clean(gen_type, text)
+            if problem is None:
+                _response_cache.add(gen_type, prompt, text)
+                return text
+            logging.warning(f"LLM reply for {gen_type} rejected because {problem}: {text}")
+            if attempt == VALIDATION_RETRIES:
+                break
+            metrics.incr(f"validation.retries.{gen_type}")
+            text = self._generate_text(retry_prompt(prompt, problem), max_tokens, loading_text, quiet=quiet, priority=priority,
+                                       cancel=cancel, coalesce=False, site=gen_type, cheap=cheap)
+        metrics.incr(f"validation.failed.{gen_type}")
+        raise InvalidOutputError(f"LLM reply for {gen_type} is invalid because {problem}.")
 
-        # Return the generated text
-        return text[0] if text else ""
+    def _backoff(self, delay: float, cancel: Optional[CancelToken]):
+        if cancel is not None:
+            cancel.wait(delay)
+        else:
+            time.sleep(delay)
 
-    def _run_generation(self, prompt: str, max_tokens: int) -> str:
+    def _run_generation(self, prompt: str, max_tokens: int, cancel: Optional[CancelToken] = None, site: str = "custom",
+                        cheap: bool = False) -> str:
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         data = {
             "model": "No model specified",
@@ -117,37 +276,91 @@ class LLMClient(BaseModel):
             "frequency_penalty": 0,
             "presence_penalty": 0,
             "messages": [
-                {"role": "system", "content": f"You produce unique but relevant outputs each time you receive a prompt.\
-                    Use the seed to generate a unique response, but don't include the seed in your response. Always reply with plaintext and no formatting or headings."},
+                {"role": "system", "content": self.prompts.system_prompt},
                 {"role": "user", "content": prompt}
             ]
         }
 
         retries = 5
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(self.prompts.system_prompt + prompt) + max_tokens
+        endpoint = get_breaker(f"endpoint:{self.api_url}")
+        # Instant replays skip rate limiting and backoff waits, since nothing is sent to the provider
+        transport = get_transport()
         for attempt in range(retries):
-            model: LLM = choice(self.model_list)
+            # Don't send anything, or retry, once nobody is waiting for the result
+            if cancel is not None and cancel.cancelled:
+                self._record_cancelled(prompt, max_tokens)
+                raise GenerationCancelled("Generation cancelled.")
+            # Fail fast while every model or the endpoint is known to be down. Models are checked first, so a
+            # half-open endpoint's trial request isn't used up when nothing would be sent
+            models = [model for model in (cheapest(self.model_list) if cheap else self.model_list)
+                      if not get_breaker(f"model:{model.name}").is_open()]
+            if not models:
+                raise LLMUnavailableError("Every LLM model is unavailable (circuits open).")
+            if not endpoint.allow():
+                raise LLMUnavailableError(f"LLM API at {self.api_url} is unavailable (circuit open).")
+            # Keyed on the prompt rather than drawn in order, since requests finish in any order across threads
+            model: LLM = choice(models, rng=self.rng.derive("model", prompt, attempt))
+            model_breaker = get_breaker(f"model:{model.name}")
             data["model"] = model.name
 
-            response = requests.post(self.api_url, headers=headers, json=data)
+            try:
+                with limiter.slot(estimated_tokens) if transport.rate_limited else nullcontext():
+                    with profiler.span("llm.network"):
+                        response = transport.post(self.api_url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                endpoint.record_failure()
+                model_breaker.record_failure()
+                logging.warning(f"LLM API request failed with model {data['model']}: {e}. Retrying... (Attempt {attempt + 1}/{retries})")
+                if attempt < retries - 1 and transport.rate_limited:
+                    self._backoff(2 ** attempt * random.uniform(0.5, 1.5), cancel)
+                continue
+            retry_after = limiter.report(response.status_code, response.headers.get("Retry-After")) if transport.rate_limited else None
+
+            if response.status_code >= 500:
+                endpoint.record_failure()
+                model_breaker.record_failure()
+            else:
+                endpoint.record_success()
+                if response.status_code == 400:
+                    model_breaker.record_failure()
+                elif response.status_code == 200:
+                    model_breaker.record_success()
+
             if response.status_code == 200:
                 try:
                     text = response.json()["choices"][0]["message"]["content"].strip()
                     input_tokens = response.json()["usage"]["prompt_tokens"]
                     output_tokens = response.json()["usage"]["completion_tokens"]
+                    if transport.rate_limited:
+                        limiter.settle(estimated_tokens, input_tokens + output_tokens)
                     cost = ((input_tokens * model.token_input_cost) + (output_tokens * model.token_output_cost))/1000000
-                    self.total_cost += cost
+                    self._add_cost(site, cost)
+                    metrics.incr("llm.input_tokens", input_tokens)
+                    metrics.incr("llm.output_tokens", output_tokens)
                     logging.info(f"Prompt sent to LLM with model {model} ({input_tokens} tokens): {prompt}")
                     logging.info(f"LLM response with model {model} ({output_tokens} tokens): {text}")
                     logging.info(f"LLM API cost with model {model} (total: {self.total_cost:.6} USD): {cost:.6} USD")
+                    if cancel is not None and cancel.cancelled:
+                        metrics.incr("llm.cancelled_tokens_wasted", input_tokens + output_tokens)
+                        raise GenerationCancelled("Generation cancelled.")
                     if text:
                         return text
                     else:
                         continue
                 except requests.exceptions.JSONDecodeError:
                     raise Exception(f"LLM Response Error with model {data['model']}: {response.status_code} - {response.text}")
+            elif (response.status_code == 429 or response.status_code >= 500) and attempt < retries - 1:
+                # The rate limiter pauses every caller for any Retry-After, so only back off here if there wasn't one
+                logging.warning(f"LLM API returned {response.status_code} with model {data['model']}. Retrying... (Attempt {attempt + 1}/{retries})")
+                if not retry_after and transport.rate_limited:
+                    self._backoff(2 ** attempt * random.uniform(0.5, 1.5), cancel)  # Exponential backoff with jitter
+                continue
             elif response.status_code == 400 and attempt < retries - 1:
                 logging.warning(f"LLM API returned 400 error with model {data['model']}. Retrying... (Attempt {attempt + 1}/{retries})")
-                time.sleep(2 ** attempt)  # Exponential backoff
+                if transport.rate_limited:
+                    self._backoff(2 ** attempt, cancel)  # Exponential backoff
                 continue
             elif not response.json():
                 logging.warning(f"LLM API returned empty result with model {data['model']}. Retrying... (Attempt {attempt + 1}/{retries})")
@@ -157,7 +370,7 @@ class LLMClient(BaseModel):
                 logging.error(f"LLM API returned error with model {data['model']}: {response.status_code} - {response.text}")
                 raise Exception(f"LLM Response Error with model {data['model']}: {response.status_code} - {response.text}")
         logging.error(f"LLM API failed after {retries} attempts with model {data['model']}.")
-        raise Exception(f"LLM API failed after {retries} attempts with model {data['model']}.")
+        raise LLMUnavailableError(f"LLM API failed after {retries} attempts with model {data['model']}.")
             
     def set_theme(self, theme: str):
         """
@@ -165,18 +378,32 @@ class LLMClient(BaseModel):
         """
         self.theme = theme
 
-    def generate_int(self, gen_type:str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200, return_prompt: bool = False, **kwargs: Optional[str|list[str]]) -> str|tuple[str, str]:
+    @profiled("llm.generate")
+    def generate_int(self, gen_type:str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200, return_prompt: bool = False,
+                     context: Optional[list[ContextSlot]] = None, seed: Optional[int] = None, quiet: bool = False, priority: Priority = INTERACTIVE,
+                     cancel: Optional[CancelToken] = None, coalesce: bool = True, **kwargs: Optional[str|list[str]]) -> str|tuple[str, str]:
         kwargs["theme"] = self.theme
         kwargs["type"] = subject_type
-        prompt = self.prompts.get_prompt(gen_type, **kwargs)
+        if seed is None:
+            seed = self.rng.prompt_seed()
+        prompt = self.prompts.get_prompt(gen_type, context=context, seed=seed, **kwargs)
 
-        gen_text = self._generate_text(prompt, max_tokens=max_tokens, loading_text=load_desc if load_desc else "Generating")
+        try:
+            gen_text = self._generate_valid(gen_type, prompt, max_tokens, load_desc if load_desc else "Generating", quiet=quiet,
+                                            priority=priority, cancel=cancel, coalesce=coalesce)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logging.error(f"LLM generation failed, using fallback {gen_type}: {e}")
+            gen_text = generate_fallback(gen_type, rng=self.rng.derive("fallback", prompt), **kwargs)
         if return_prompt:
             return gen_text, prompt
         else:
             return gen_text
         
-    def generate(self, gen_type:str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200, **kwargs: Optional[str|list[str]]) -> str:
+    def generate(self, gen_type:str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200,
+                 context: Optional[list[ContextSlot]] = None, priority: Priority = INTERACTIVE, cancel: Optional[CancelToken] = None,
+                 **kwargs: Optional[str|list[str]]) -> str:
         """
         Generate content with the LLM based on the type and subject.
 
@@ -184,12 +411,18 @@ class LLMClient(BaseModel):
         :param subject_type: The type of subject (e.g., "character", "region").
         :param load_desc: The loading description to display while generating.
         :param max_tokens: The maximum number of tokens to generate.
+        :param context: Optional context slots to add to the prompt, trimmed to the prompt's token budget.
+        :param priority: The scheduler priority class or a PriorityHandle, see utils.llm_scheduler.
+        :param cancel: Abandons the generation when cancelled, raising GenerationCancelled. Defaults to the client's token.
         :param kwargs: Additional keyword arguments for the prompt.
         :return: The generated text or a tuple of the generated text and the prompt.
         """
-        return self.generate_int(gen_type, subject_type, load_desc, max_tokens, return_prompt=False, **kwargs) # type: ignore
+        return self.generate_int(gen_type, subject_type, load_desc, max_tokens, return_prompt=False, context=context, priority=priority,
+                                 cancel=cancel, **kwargs) # type: ignore
     
-    def generate_with_prompt(self, gen_type: str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200, **kwargs: Optional[str|list[str]]) -> tuple[str, str]:
+    def generate_with_prompt(self, gen_type: str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200,
+                             context: Optional[list[ContextSlot]] = None, priority: Priority = INTERACTIVE, cancel: Optional[CancelToken] = None,
+                             **kwargs: Optional[str|list[str]]) -> tuple[str, str]:
         """
         Generate content with the LLM based on the type and subject, returning the prompt used.
 
@@ -197,68 +430,128 @@ class LLMClient(BaseModel):
         :param subject_type: The type of subject (e.g., "character", "region").
         :param load_desc: The loading description to display while generating.
         :param max_tokens: The maximum number of tokens to generate.
+        :param context: Optional context slots to add to the prompt, trimmed to the prompt's token budget.
+        :param priority: The scheduler priority class or a PriorityHandle, see utils.llm_scheduler.
+        :param cancel: Abandons the generation when cancelled, raising GenerationCancelled. Defaults to the client's token.
         :param kwargs: Additional keyword arguments for the prompt.
         :return: The generated text or a tuple of the generated text and the prompt.
         """
-        return self.generate_int(gen_type, subject_type, load_desc, max_tokens, return_prompt=True, **kwargs) # type: ignore
+        return self.generate_int(gen_type, subject_type, load_desc, max_tokens, return_prompt=True, context=context, priority=priority,
+                                 cancel=cancel, **kwargs) # type: ignore
         
-    def multi_generate(self, gen_count: int, gen_type: str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200, **kwargs: Optional[str|list[str]]) -> list[str]:
+    @profiled("llm.multi_generate")
+    def multi_generate(self, gen_count: int, gen_type: str, subject_type: str = "", load_desc: str = "", max_tokens: int = 200,
+                       unique: Optional[SimilarityIndex] = None, quiet: bool = False, rng: Optional[random.Random] = None,
+                       priority: Priority = INTERACTIVE, cancel: Optional[CancelToken] = None, **kwargs: Optional[str|list[str]]) -> list[str]:
         """
         Use multi-threading to generate multiple pieces of content with  the LLM using the same attributes.
-        """
-        results = []
-
-        def generate_text(i):
-            new_kwargs: dict[str,Optional[str|list[str]]] = {key: value[i] if isinstance(value, list) and len(value) == gen_count else value for key, value in kwargs.items()}
-            text = self.generate(gen_type, subject_type, load_desc, max_tokens, **new_kwargs)
-            if text:
-                results.append(text)
-            else:
-                generate_text(i)
-
-        # Split the total gen_count into groups with a maximum of 16 each.
-        group_counts = []
-        remaining = gen_count
-        while remaining > 0:
-            group_size = min(16, remaining)
-            group_counts.append(group_size)
-            remaining -= group_size
+        How many requests actually run at once, and in what order, is left to the shared scheduler and rate limiter.
+        Results are in the same order as the inputs, with template fallback content for any generation that failed,
+        so there is always one result per input.
 
+        If a similarity index is given, results that near-duplicate something already in it (or each other) are
+        regenerated, up to UNIQUE_RETRIES times, and the final results are added to the index.
+        Quiet generations don't show a loading animation, for prefetching in the background. Prompt seeds are drawn
+        from rng if given, so work that runs in no fixed order can still be reproducible.
+        If the cancel token is cancelled, every outstanding generation is abandoned and GenerationCancelled is raised.
+        Generations that must be unique never share a result with an identical request in flight elsewhere.
+        """
         def kwargs_dict(idx: int) -> dict[str, Optional[str|list[str]]]:
             """
             Create a dictionary of keyword arguments for the generate function.
             """
             return {key: value[idx] if isinstance(value, list) and len(value) == gen_count else value for key, value in kwargs.items()}
 
-        # Generate the text in groups of up to 8 to prevent overwhelming the API.
-        for gen_group in group_counts:
-            batch_results = [None] * gen_group
-            batch_threads = []
-            for i in range(gen_group):
-                thread = threading.Thread(
-                    target=lambda idx=i: batch_results.__setitem__(
-                        idx,
-                        self.generate(
-                            gen_type,
-                            subject_type,
-                            load_desc,
-                            max_tokens,
-                            **kwargs_dict(idx)
-                        )
-                    )
-                )
-                batch_threads.append(thread)
-                thread.start()
-
-            for thread in batch_threads:
-                thread.join()
-
-            results.extend(batch_results)
+        def generate_text(idx: int, seed: int) -> Optional[str]:
+            try:
+                return self.generate_int(gen_type, subject_type, load_desc, max_tokens, seed=seed, quiet=quiet, priority=priority,
+                                         cancel=token, coalesce=unique is None, **kwargs_dict(idx)) # type: ignore
+            except GenerationCancelled:
+                return None
+            except Exception as e:
+                logging.error(f"Error generating {gen_type} {idx + 1}/{gen_count}, using fallback: {e}")
+                return generate_fallback(gen_type, self.theme, rng=self.rng.derive("fallback", gen_type, seed), type=subject_type,
+                                         **kwargs_dict(idx))
 
+        if gen_count <= 0:
+            return []
+        token = cancel if cancel is not None else self.cancel_token
+        # Draw the prompt seeds up front, so they don't depend on the order the threads run in
+        next_seed = (lambda: rng.randrange(PROMPT_SEED_RANGE)) if rng is not None else self.rng.prompt_seed
+        seeds = [next_seed() for _ in range(gen_count)]
+        workers = min(gen_count, int(get_rate_limiter().concurrency.max_limit))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(generate_text, range(gen_count), seeds))
+            token.raise_if_cancelled()
+            if unique is None:
+                return results
+
+            pending = list(range(gen_count))
+            for _ in range(UNIQUE_RETRIES):
+                pending = [pending[i] for i in unique.add_unique(gen_type, [results[idx] for idx in pending])]
+                if not pending:
+                    break
+                metrics.incr(f"similarity.regenerated.{gen_type}", len(pending))
+                seeds = [next_seed() for _ in pending]
+                for idx, text in zip(pending, executor.map(generate_text, pending, seeds)):
+                    results[idx] = text
+                token.raise_if_cancelled()
+            else:
+                # Out of retries, so keep whatever came back last
+                for idx in pending:
+                    if results[idx] is not None:
+                        unique.add(gen_type, results[idx])
         return results
     
-    def custom_generate(self, prompt: str, max_tokens: int = 200, load_desc: str = "") -> str:
+    @profiled("llm.background_generate")
+    def background_generate(self, gen_type: str, subject_type: str = "", max_tokens: int = 200, seed: Optional[int] = None,
+                            cancel: Optional[CancelToken] = None, **kwargs: Optional[str|list[str]]) -> str:
+        """
+        Generate content at bulk priority without showing a loading animation, for work the player isn't waiting on.
+
+        :param gen_type: The type of generation (e.g., "name", "summary").
+        :param subject_type: The type of subject (e.g., "character", "region").
+        :param max_tokens: The maximum number of tokens to generate.
+        :param seed: The prompt seed. Defaults to one derived from the prompt, since background threads run in no fixed order.
+        :param cancel: Abandons the generation when cancelled, raising GenerationCancelled. Defaults to the client's token.
+        :param kwargs: Additional keyword arguments for the prompt.
+        :return: The generated text.
+        """
+        kwargs["theme"] = self.theme
+        kwargs["type"] = subject_type
+        if seed is None:
+            seed = self.rng.derive("background", gen_type, *sorted(kwargs.items())).randrange(PROMPT_SEED_RANGE)
+        prompt = self.prompts.get_prompt(gen_type, seed=seed, **kwargs)
+        return self._generate_valid(gen_type, prompt, max_tokens, "", quiet=True, priority=BULK, cancel=cancel)
+
+    @profiled("llm.custom_generate")
+    def custom_generate(self, prompt: str, max_tokens: int = 200, load_desc: str = "", fallback_type: str = "name", subject_type: str = "",
+                        priority: Priority = INTERACTIVE, cancel: Optional[CancelToken] = None, coalesce: bool = True) -> str:
         """
         Generate custom content with the LLM based on the provided prompt.
+
+        :param prompt: The prompt to send.
+        :param max_tokens: The maximum number of tokens to generate.
+        :param load_desc: The loading description to display while generating.
+        :param fallback_type: The kind of local fallback content to use if the LLM is unavailable.
+        :param subject_type: The type of subject, for the fallback content.
+        :param priority: The scheduler priority class or a PriorityHandle, see utils.llm_scheduler.
+        :param cancel: Abandons the generation when cancelled, raising GenerationCancelled. Defaults to the client's token.
+        :param coalesce: Whether to share the result of an identical request already in flight. Turn off for prompts
+                         whose answers must differ each time they're asked.
+        :return: The generated text.
         """
-        return self._generate_text(prompt, max_tokens=max_tokens, loading_text=load_desc if load_desc else "Generating...")
\ No newline at end of file
+        metrics.observe("prompt_tokens.custom", estimate_tokens(prompt))
+        try:
+            cached, max_tokens, cheap = self._budget("custom", prompt, max_tokens)
+            if cached is not None:
+                return cached
+            text = self._generate_text(prompt, max_tokens=max_tokens, loading_text=load_desc if load_desc else "Generating...", priority=priority,
+                                       cancel=cancel, coalesce=coalesce, site="custom", cheap=cheap)
+            _response_cache.add("custom", prompt, text)
+            return text
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logging.error(f"LLM generation failed, using fallback {fallback_type}: {e}")
+            return generate_fallback(fallback_type, self.theme, rng=self.rng.derive("fallback", prompt), type=subject_type)
\ No newline at end of file
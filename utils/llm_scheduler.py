@@ -0,0 +1,244 @@
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+import os, threading, logging
+
+from utils.metrics import metrics
+
+DEFAULT_SESSION = "default"
+
+# Priority classes, highest first. Interactive requests are the ones the player is waiting on, prefetch requests
+# are speculative work for what the player is likely to do next, and bulk requests are everything else in the
+# background, e.g. summaries and world pack generation.
+INTERACTIVE = "interactive"
+PREFETCH = "prefetch"
+BULK = "bulk"
+PRIORITIES = [INTERACTIVE, PREFETCH, BULK]
+
+# Sets the number of scheduler workers outside server mode
+WORKERS_ENV = "LLM_WORKERS"
+
+
+class PriorityHandle:
+    """
+    A priority shared by a group of requests that can be raised while they're queued, e.g. when the player starts
+    waiting on a prefetch. Pass it as the priority of each request in the group. Requests submitted after it has
+    been raised go straight in at the new priority.
+    """
+
+    def __init__(self, priority: str = PREFETCH):
+        self.priority = priority
+        self._queued: Set[Future] = set()
+        # Held while submitting with the handle, so a request can't be queued at the old priority after a raise
+        self._lock = threading.Lock()
+
+    def raise_to(self, priority: str, scheduler: Optional["LLMScheduler"] = None):
+        """
+        Raises the group to a higher priority class, moving its queued requests up.
+
+        :param scheduler: The scheduler the requests were submitted to. Defaults to the shared one.
+        """
+        scheduler = scheduler or get_scheduler()
+        with self._lock:
+            if PRIORITIES.index(priority) >= PRIORITIES.index(self.priority):
+                return
+            self.priority = priority
+            queued = list(self._queued)
+            for future in queued:
+                scheduler.promote(future, priority)
+
+    def _track(self, future: Future):
+        self._queued.add(future)
+        future.add_done_callback(self._queued.discard)
+
+
+Priority = Union[str, PriorityHandle]
+
+
+def priority_class(priority: Priority) -> str:
+    """
+    The priority class a request would be queued at now.
+    """
+    return priority.priority if isinstance(priority, PriorityHandle) else priority
+
+
+class LLMScheduler:
+    """
+    A shared pool of worker threads that runs every LLM request in the process.
+    Requests are queued by priority class, then by session. Workers always take the highest priority request
+    waiting, and within a class take from each session's queue in turn, so one session generating a whole world
+    can't starve the others. Some workers are held back for interactive requests, so background work can never
+    occupy every worker while the player waits. The number of workers is the global limit on concurrent requests.
+    """
+
+    def __init__(self, workers: int = 16, reserved: Optional[int] = None):
+        """
+        :param workers: The maximum number of requests in flight at once across all sessions.
+        :param reserved: How many workers only run interactive requests. Defaults to a quarter of the workers.
+        """
+        self.workers = workers
+        self.reserved = min(workers - 1, max(1, workers // 4)) if reserved is None else reserved
+        self._queues: Dict[str, Dict[str, Deque[Tuple[Future, Callable[..., Any], tuple, dict]]]] = {priority: {} for priority in PRIORITIES}
+        self._rotation: Dict[str, Deque[str]] = {priority: deque() for priority in PRIORITIES}
+        self._condition = threading.Condition()
+        self._in_flight: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._shutdown = False
+        self._threads: List[threading.Thread] = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"llm-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, session_id: Optional[str], fn: Callable[..., Any], *args: Any, priority: Priority = INTERACTIVE, **kwargs: Any) -> Future:
+        """
+        Queues a call to run on a worker thread on behalf of a session.
+
+        :param session_id: The session making the request. None uses a shared default queue.
+        :param fn: The function to call.
+        :param priority: The request's priority class, one of PRIORITIES, or a handle whose priority can be raised later.
+        :return: A future for the result of the call.
+        """
+        if isinstance(priority, PriorityHandle):
+            with priority._lock:
+                future = self.submit(session_id, fn, *args, priority=priority.priority, **kwargs)
+                priority._track(future)
+            return future
+        if priority not in self._queues:
+            raise ValueError(f"Unknown LLM request priority: {priority}")
+        future: Future = Future()
+        session_id = session_id or DEFAULT_SESSION
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("LLM scheduler has been shut down.")
+            queues = self._queues[priority]
+            queue = queues.get(session_id)
+            if queue is None:
+                queue = queues[session_id] = deque()
+            if not queue:
+                self._rotation[priority].append(session_id)
+            queue.append((future, fn, args, kwargs))
+            self._update_gauges()
+            # Wake every worker, since the one woken might not be allowed to take this class of request
+            self._condition.notify_all()
+        return future
+
+    def promote(self, future: Future, priority: str) -> bool:
+        """
+        Moves a queued request up to a higher priority class, e.g. when the player starts waiting on a prefetch.
+
+        :return: Whether the request was found still queued at a lower priority and moved.
+        """
+        with self._condition:
+            for lower in PRIORITIES[PRIORITIES.index(priority) + 1:]:
+                for session_id, queue in self._queues[lower].items():
+                    item = next((item for item in queue if item[0] is future), None)
+                    if item is None:
+                        continue
+                    # An emptied queue is left for _next to drop when the session's turn comes round
+                    queue.remove(item)
+                    queues = self._queues[priority]
+                    if not queues.get(session_id):
+                        queues[session_id] = deque()
+                        self._rotation[priority].append(session_id)
+                    queues[session_id].append(item)
+                    self._update_gauges()
+                    self._condition.notify_all()
+                    return True
+        return False
+
+    def _next(self) -> Optional[Tuple[str, Tuple[Future, Callable[..., Any], tuple, dict]]]:
+        """
+        Takes the next request from the highest priority class with work waiting, from the session whose turn it is.
+        Background classes are skipped once they fill every worker that isn't reserved for interactive requests.
+        Must be called with the condition held.
+
+        :return: The request's priority class and the request, or None if there's nothing this worker may run.
+        """
+        background = sum(count for priority, count in self._in_flight.items() if priority != INTERACTIVE)
+        for priority in PRIORITIES:
+            if priority != INTERACTIVE and background >= self.workers - self.reserved:
+                break
+            rotation = self._rotation[priority]
+            queues = self._queues[priority]
+            while rotation:
+                session_id = rotation.popleft()
+                queue = queues.get(session_id)
+                if not queue:
+                    queues.pop(session_id, None)
+                    continue
+                item = queue.popleft()
+                if queue:
+                    rotation.append(session_id)
+                else:
+                    del queues[session_id]
+                return priority, item
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                next_item = self._next()
+                while next_item is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    next_item = self._next()
+                priority, item = next_item
+                self._in_flight[priority] += 1
+                self._update_gauges()
+
+            future, fn, args, kwargs = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    logging.error(f"LLM request failed in scheduler: {e}")
+                    future.set_exception(e)
+
+            with self._condition:
+                self._in_flight[priority] -= 1
+                self._update_gauges()
+                # A background slot may have freed up for a request that was held back
+                self._condition.notify_all()
+
+    def _update_gauges(self):
+        for priority in PRIORITIES:
+            metrics.set_gauge(f"scheduler.queue_depth.{priority}", sum(len(queue) for queue in self._queues[priority].values()))
+            metrics.set_gauge(f"scheduler.in_flight.{priority}", self._in_flight[priority])
+        metrics.set_gauge("scheduler.queue_depth", sum(len(queue) for queues in self._queues.values() for queue in queues.values()))
+        metrics.set_gauge("scheduler.in_flight", sum(self._in_flight.values()))
+        metrics.set_gauge("scheduler.sessions_waiting", len({session_id for rotation in self._rotation.values() for session_id in rotation}))
+
+    def shutdown(self):
+        """
+        Stops the workers once the queued requests have run.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Returns the scheduler shared by every LLMClient in the process, creating it on first use with LLM_WORKERS workers.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(int(os.getenv(WORKERS_ENV, "16")))
+        return _scheduler
+
+
+def set_scheduler(scheduler: Optional[LLMScheduler]):
+    """
+    Installs a process-wide scheduler shared by every LLMClient, e.g. with more workers when hosting many sessions
+    in one process. Passing None creates a new one on next use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = scheduler
@@ -0,0 +1,241 @@
+"""
+The layer that actually sends LLM requests. Live play goes straight to the API, but every request and response
+can also be recorded to an archive and replayed later without touching the network, either instantly or at the
+recorded speed scaled by a latency multiplier. Replayed runs make the game's end-to-end timing reproducible offline.
+
+Configured from the environment:
+    LLM_TRANSPORT           live (default), record or replay
+    LLM_ARCHIVE             the archive file (default: recordings/llm_archive.db)
+    LLM_REPLAY_SPEED        instant (default) or recorded
+    LLM_LATENCY_MULTIPLIER  scales recorded latencies when replaying at recorded speed (default: 1.0)
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Protocol
+import hashlib, json, logging, os, sqlite3, threading, time, zlib
+import requests
+
+from utils.base_utils import slots_getstate, slots_setstate
+from utils.metrics import metrics
+
+DEFAULT_ARCHIVE_PATH = os.path.join('recordings', 'llm_archive.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exchanges (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request_key TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    retry_after TEXT,
+    request BLOB NOT NULL,
+    response BLOB NOT NULL,
+    elapsed REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_exchanges_key ON exchanges(request_key, occurrence);
+"""
+
+# Recorded in place of a status code when the request never got a response
+TRANSPORT_ERROR = 0
+
+
+@dataclass(slots=True)
+class TransportResponse:
+    """
+    The parts of an HTTP response the LLM client uses. Live responses are requests.Response objects instead,
+    which have the same attributes.
+    """
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class Transport(Protocol):
+    # Whether requests count against the provider's rate limits
+    rate_limited: bool
+
+    def post(self, url: str, headers: dict, json: dict, timeout: float): ...
+
+
+def request_key(payload: dict) -> str:
+    """
+    Identifies a request by what was asked rather than which model was picked to answer it.
+    The API key and headers are never part of the key or the archive.
+    """
+    keyed = {"messages": payload.get("messages"), "max_tokens": payload.get("max_tokens")}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True).encode()).hexdigest()
+
+
+class HTTPTransport:
+    """
+    Sends requests to the API over a pooled session shared by every client in the process.
+    """
+    rate_limited = True
+
+    def __init__(self):
+        self.session = requests.Session()
+        # Enough pooled connections for every request the rate limiter lets run at once
+        pool_size = int(float(os.getenv("LLM_MAX_CONCURRENCY", 64)))
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+
+    def post(self, url: str, headers: dict, json: dict, timeout: float):
+        return self.session.post(url, headers=headers, json=json, timeout=timeout)
+
+
+class LLMArchive:
+    """
+    An SQLite file of recorded request/response pairs, compressed and indexed by request.
+    Repeats of the same request are numbered, so a run that retried a request replays its retries in order.
+    """
+
+    def __init__(self, path: str = DEFAULT_ARCHIVE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._occurrences: Dict[str, int] = {}
+
+    def _next_occurrence(self, key: str) -> int:
+        occurrence = self._occurrences.get(key, 0)
+        self._occurrences[key] = occurrence + 1
+        return occurrence
+
+    def record(self, payload: dict, response: TransportResponse, elapsed: float):
+        key = request_key(payload)
+        with self._lock:
+            occurrence = self._next_occurrence(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exchanges (request_key, occurrence, model, status, retry_after, request, response, elapsed, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, occurrence, payload.get("model", ""), response.status_code, response.headers.get("Retry-After"),
+                 zlib.compress(json.dumps(payload).encode()), zlib.compress(response.text.encode()), elapsed, time.time()))
+            self._conn.commit()
+
+    def lookup(self, payload: dict) -> Optional[tuple[TransportResponse, float]]:
+        """
+        Finds the recorded response for the next repeat of a request. Once a request has been repeated more often
+        than it was recorded, the last recorded response is used again.
+
+        :return: The response and how long it took, or None if the request was never recorded.
+        """
+        key = request_key(payload)
+        with self._lock:
+            occurrence = self._next_occurrence(key)
+            row = self._conn.execute(
+                "SELECT status, retry_after, response, elapsed FROM exchanges WHERE request_key = ? AND occurrence <= ? "
+                "ORDER BY occurrence DESC LIMIT 1", (key, occurrence)).fetchone()
+        if row is None:
+            return None
+        status, retry_after, body, elapsed = row
+        headers = {"Retry-After": retry_after} if retry_after is not None else {}
+        return TransportResponse(status_code=status, text=zlib.decompress(body).decode(), headers=headers), elapsed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RecordingTransport:
+    """
+    Passes requests through to another transport and records each one, with its latency, to an archive.
+    """
+
+    def __init__(self, inner: Transport, archive: LLMArchive):
+        self.inner = inner
+        self.archive = archive
+        self.rate_limited = inner.rate_limited
+
+    def post(self, url: str, headers: dict, json: dict, timeout: float):
+        start = time.monotonic()
+        try:
+            response = self.inner.post(url, headers=headers, json=json, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            self.archive.record(json, TransportResponse(status_code=TRANSPORT_ERROR, text=str(e)), time.monotonic() - start)
+            raise
+        retry_after = response.headers.get("Retry-After")
+        recorded = TransportResponse(status_code=response.status_code, text=response.text,
+                                     headers={"Retry-After": retry_after} if retry_after is not None else {})
+        self.archive.record(json, recorded, time.monotonic() - start)
+        return response
+
+
+class ReplayTransport:
+    """
+    Answers requests from an archive without using the network.
+    """
+
+    def __init__(self, archive: LLMArchive, recorded_speed: bool = False, latency_multiplier: float = 1.0):
+        """
+        :param archive: The archive to replay.
+        :param recorded_speed: Wait as long as the original request took before answering, instead of answering at once.
+        :param latency_multiplier: Scales the recorded latencies, e.g. 2.0 to simulate a provider half as fast.
+        """
+        self.archive = archive
+        self.recorded_speed = recorded_speed
+        self.latency_multiplier = latency_multiplier
+        # Instant replays never reach the provider, so they don't need to respect its limits
+        self.rate_limited = recorded_speed
+
+    def post(self, url: str, headers: dict, json: dict, timeout: float):
+        found = self.archive.lookup(json)
+        if found is None:
+            metrics.incr("llm_transport.replay_miss")
+            logging.warning("No recorded response for LLM request, replaying as an error.")
+            return TransportResponse(status_code=404, text='{"error": "No recorded response for this request."}')
+        response, elapsed = found
+        metrics.incr("llm_transport.replay_hit")
+        if self.recorded_speed:
+            time.sleep(min(elapsed * self.latency_multiplier, timeout))
+        if response.status_code == TRANSPORT_ERROR:
+            raise requests.exceptions.ConnectionError(response.text)
+        return response
+
+
+def transport_from_env() -> Transport:
+    """
+    Creates the transport chosen by the LLM_TRANSPORT environment variable.
+    """
+    mode = os.getenv("LLM_TRANSPORT", "live").lower()
+    if mode == "live":
+        return HTTPTransport()
+    archive = LLMArchive(os.getenv("LLM_ARCHIVE", DEFAULT_ARCHIVE_PATH))
+    if mode == "record":
+        return RecordingTransport(HTTPTransport(), archive)
+    if mode == "replay":
+        return ReplayTransport(archive, recorded_speed=os.getenv("LLM_REPLAY_SPEED", "instant").lower() == "recorded",
+                               latency_multiplier=float(os.getenv("LLM_LATENCY_MULTIPLIER", 1.0)))
+    raise ValueError(f"Unknown LLM_TRANSPORT '{mode}', expected live, record or replay.")
+
+
+_transport: Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """
+    Returns the transport shared by every LLMClient in the process, creating it from the environment on first use.
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = transport_from_env()
+        return _transport
+
+
+def set_transport(transport: Optional[Transport]):
+    """
+    Replaces the shared transport. Passing None recreates it from the environment on next use.
+    """
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -0,0 +1,96 @@
+from typing import Dict
+import json, logging, os, threading
+
+
+class Metrics:
+    """
+    A thread-safe registry of counters, gauges and observed values, shared by the whole process.
+    Observed values keep a running count, total, min, max and last value rather than every sample.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._observations: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, amount: float = 1):
+        """
+        Increments a counter.
+
+        :param name: The counter name.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        """
+        Sets a gauge to its current value.
+
+        :param name: The gauge name.
+        :param value: The current value.
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """
+        Records a single observed value, e.g. a token count or a duration.
+
+        :param name: The observation name.
+        :param value: The observed value.
+        """
+        with self._lock:
+            stats = self._observations.get(name)
+            if stats is None:
+                self._observations[name] = {"count": 1, "total": value, "min": value, "max": value, "last": value}
+            else:
+                stats["count"] += 1
+                stats["total"] += value
+                stats["min"] = min(stats["min"], value)
+                stats["max"] = max(stats["max"], value)
+                stats["last"] = value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def gauge(self, name: str) -> float:
+        with self._lock:
+            return self._gauges.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of all current metrics.
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "observations": {name: dict(stats) for name, stats in self._observations.items()},
+            }
+
+    def log(self):
+        """
+        Logs a snapshot of all current metrics as one line of JSON.
+        """
+        logging.info(f"Metrics: {json.dumps(self.snapshot(), sort_keys=True)}")
+
+    def write(self, path: str):
+        """
+        Writes a snapshot of all current metrics to a JSON file, replacing it in one step.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._observations.clear()
+
+
+metrics = Metrics()
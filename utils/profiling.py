@@ -0,0 +1,212 @@
+"""
+Built-in profiling: cheap span timers around the main loop, screen drawing, LLM calls and saving/loading, and an
+optional stack sampler that writes a collapsed-stack file for flame graphs (e.g. with flamegraph.pl or speedscope).
+With profiling off a span is a single attribute check, so the timers can stay in place.
+
+Turned on from the environment, or toggled in game with the hidden PROFILE_KEY:
+    PROFILE=spans   span timers only
+    PROFILE=flame   span timers and the stack sampler
+    PROFILE_HZ      stack samples per second, 200 by default
+Each capture is written to PROFILE_DIR when it stops, as a span summary and, if sampling, a .collapsed file.
+"""
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import atexit, functools, logging, os, sys, threading, time
+
+from utils.metrics import metrics
+
+PROFILE_ENV = "PROFILE"
+PROFILE_KEY = ord('P')
+PROFILE_DIR = "profiles"
+DEFAULT_HZ = 200
+# Stacks deeper than this are cut off at the root end, to bound the cost of a sample
+MAX_DEPTH = 128
+
+_NO_SPAN = nullcontext()
+
+
+class _Span:
+    """
+    Times one block of code and adds it to the profiler's totals on exit.
+    """
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StackSampler:
+    """
+    Samples the stack of every thread at a fixed rate on a daemon thread, counting identical stacks.
+    """
+
+    def __init__(self, hz: int = DEFAULT_HZ):
+        self.interval = 1 / hz
+        self.stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames: List[str] = []
+                while frame is not None and len(frames) < MAX_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)).replace(" ", "_"))
+                stack = ";".join(reversed(frames))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def write(self, path: str):
+        """
+        Writes the samples in collapsed-stack format, one "frame;frame;frame count" line per distinct stack.
+        """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    The process-wide profiler. Spans are named by what they time, e.g. "llm.generate" or "save.pickle", and their
+    count, total and worst time are kept per name until the capture stops.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started_at: Optional[datetime] = None
+        self._totals: Dict[str, List[float]] = {}
+        self._sampler: Optional[StackSampler] = None
+        self._lock = threading.Lock()
+
+    def configure_from_env(self):
+        """
+        Starts a capture if PROFILE is set, which is written out when the process exits.
+        """
+        mode = os.getenv(PROFILE_ENV, "").lower()
+        if mode and mode not in ("0", "off", "false"):
+            self.start(sample=mode == "flame", hz=int(os.getenv("PROFILE_HZ", DEFAULT_HZ)))
+            atexit.register(self.stop)
+
+    def span(self, name: str):
+        """
+        A context manager timing the block under name, or doing nothing if profiling is off.
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            totals = self._totals.get(name)
+            if totals is None:
+                self._totals[name] = [1, seconds, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+        metrics.observe(f"profile.{name}", seconds)
+
+    def start(self, sample: bool = False, hz: int = DEFAULT_HZ):
+        """
+        Starts a capture, discarding the last one.
+
+        :param sample: Whether to also sample stacks for a flame graph.
+        :param hz: Stack samples per second.
+        """
+        with self._lock:
+            if self.enabled:
+                return
+            self._totals = {}
+            self.started_at = datetime.now()
+            if sample:
+                self._sampler = StackSampler(hz)
+                self._sampler.start()
+            self.enabled = True
+        logging.info(f"Profiling started{' with stack sampling' if sample else ''}.")
+
+    def stop(self) -> Optional[str]:
+        """
+        Stops the capture and writes it to PROFILE_DIR.
+
+        :return: The path of the span summary, or None if profiling wasn't on.
+        """
+        with self._lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+            sampler, self._sampler = self._sampler, None
+            totals = dict(self._totals)
+        if sampler is not None:
+            sampler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f"profile_{self.started_at.strftime('%Y-%m-%d_%H-%M-%S')}")
+        with open(base + ".txt", "w") as f:
+            f.write(self.report(totals))
+        if sampler is not None:
+            sampler.write(base + ".collapsed")
+        logging.info(f"Profiling stopped, written to {base}.*")
+        return base + ".txt"
+
+    def toggle(self) -> Optional[str]:
+        """
+        Stops the capture if one is running, otherwise starts one with stack sampling.
+
+        :return: The path of the span summary if a capture was stopped.
+        """
+        if self.enabled:
+            return self.stop()
+        self.start(sample=True, hz=int(os.getenv("PROFILE_HZ", DEFAULT_HZ)))
+        return None
+
+    @staticmethod
+    def report(totals: Dict[str, List[float]]) -> str:
+        """
+        Formats span totals as a table, slowest total first.
+        """
+        lines = [f"{'span':<32}{'count':>8}{'total s':>12}{'mean ms':>12}{'max ms':>12}"]
+        for name, (count, total, worst) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<32}{int(count):>8}{total:>12.3f}{total / count * 1000:>12.2f}{worst * 1000:>12.2f}")
+        return "\n".join(lines) + "\n"
+
+
+profiler = Profiler()
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorates a function to run inside a span of the given name.
+    """
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with _Span(profiler, name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -1,15 +1,63 @@
 import random
-from pydantic import BaseModel
-from typing import Dict
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+from utils.metrics import metrics
+
+# Rough characters-per-token ratio for English text. Cheap enough to run on every prompt.
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 300
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a piece of text without calling a tokenizer.
+
+    :param text: The text to estimate.
+    :return: The estimated token count.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Truncates text to roughly the given number of tokens, cutting at a word boundary.
+
+    :param text: The text to truncate.
+    :param max_tokens: The maximum number of tokens to keep.
+    :return: The truncated text, with '...' appended if anything was cut.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens * CHARS_PER_TOKEN - 3)]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut + "..."
+
+
+class ContextSlot(BaseModel):
+    """
+    A block of optional context (e.g. recent history) to append to a prompt if the token budget allows.
+    Slots with a lower priority value are filled first, and items within a slot are kept in order.
+    """
+    title: str = Field(...)
+    items: List[str] = Field(default_factory=list)
+    priority: int = Field(0)
+
 
 class Prompts(BaseModel):
     """
     This class contains the prompts used for the LLM.
     """
+    system_prompt: str = "You produce unique but relevant outputs each time you receive a prompt. \
+Use the seed to generate a unique response, but don't include the seed in your response. Always reply with plaintext and no formatting or headings."
+
     prompts: Dict[str, str] = {
         "name": "Generate a unique name for a {type} in a {theme} setting. Try to keep it realistic and not sterotypical.\
             Reply with just the name in plaintext with no formatting.",
 
+        "currency": "Create a unique name for a currency in a {theme} setting. Reply with just the name and no additional formatting.",
+
         "specialized_description": "Generate a one-sentence description for a {type} named {name} in a {theme}\
             setting. The {type} is a {specialization}. Try to keep it realistic and not sterotypical. Reply with just the description and no additional formatting.",
 
@@ -25,19 +73,99 @@ class Prompts(BaseModel):
 
         "outcome": "Generate a 1-paragraph outcome for the event described below with the chosen action '{choice}' and resulting outcome '{outcome}' in a \
             {theme} setting. Try to keep it realistic and not sterotypical. Reply with just the outcome.\nEvent prompt: {prompt}\nEvent description: {description}",
+
+        "summary": "Condense the history of the {type} {name} in a {theme} setting into at most 3 sentences, keeping names, injuries and lasting\
+            consequences. Reply with just the summary.\nEarlier summary: {summary}\nNew events:\n{events}",
+    }
+
+    # Maximum estimated tokens for the full user message of each prompt, including any context slots.
+    budgets: Dict[str, int] = {
+        "name": 100,
+        "currency": 100,
+        "specialized_description": 150,
+        "specialization": 100,
+        "description": 150,
+        "event": 600,
+        "outcome": 1000,
+        "summary": 600,
     }
 
-    def get_prompt(self, prompt_name: str, **kwargs) -> str:
+    def fit_context(self, prompt_name: str, context: List[ContextSlot], budget: int) -> str:
+        """
+        Renders as much of the given context as fits in the token budget, highest priority first.
+        Items that don't fit are dropped, except the first that overflows, which is truncated if there is room.
+
+        :param prompt_name: The prompt the context is for, used for metrics.
+        :param context: The context slots to render.
+        :param budget: The number of tokens available for context.
+        :return: The rendered context, or an empty string if nothing fits.
+        """
+        rendered = ""
+        dropped = 0
+        for slot in sorted(context, key=lambda slot: slot.priority):
+            if not slot.items:
+                continue
+            header = f"\n{slot.title}:"
+            remaining = budget - estimate_tokens(rendered + header)
+            lines = ""
+            for i, item in enumerate(slot.items):
+                line = f"\n- {item}"
+                cost = estimate_tokens(line)
+                if cost <= remaining:
+                    lines += line
+                    remaining -= cost
+                    continue
+                if remaining > 10:
+                    lines += truncate_to_tokens(line, remaining)
+                    remaining = 0
+                    dropped += len(slot.items) - i - 1
+                else:
+                    dropped += len(slot.items) - i
+                break
+            if lines:
+                rendered += header + lines
+
+        if dropped:
+            metrics.incr(f"prompt_context_dropped.{prompt_name}", dropped)
+        return rendered
+
+    def get_prompt(self, prompt_name: str, context: Optional[List[ContextSlot]] = None, seed: Optional[int] = None, **kwargs) -> str:
         """
         Get a prompt by its name and substitute in the relevant values.
+        The fixed template comes first and the seed last, so prompts of the same type share as long a prefix as possible.
+
+        :param prompt_name: The name of the prompt template.
+        :param context: Optional context slots to append, trimmed to the template's token budget.
+        :param seed: The seed to put in the prompt, normally drawn from the world's prompt stream. Random if not given.
+        :param kwargs: Values to substitute into the template.
+        :return: The assembled prompt.
         """
-        seed = str(random.randint(0, 1000000))
+        if seed is None:
+            seed = random.randint(0, 1000000)
         if prompt_name in self.prompts:
-            prompt = f"Seed: {seed}. " + self.prompts[prompt_name]
             try:
-                prompt = prompt.format(**kwargs)
+                prompt = self.prompts[prompt_name].format(**kwargs)
             except KeyError as e:
                 raise ValueError(f"Missing value in prompt {prompt_name}: {e}")
         else:
             raise ValueError(f"Prompt '{prompt_name}' not found.")
-        return prompt
\ No newline at end of file
+
+        seed_text = f"\nSeed: {seed}."
+        if context:
+            budget = self.budgets.get(prompt_name, DEFAULT_TOKEN_BUDGET)
+            prompt += self.fit_context(prompt_name, context, budget - estimate_tokens(prompt + seed_text))
+        prompt += seed_text
+
+        metrics.observe(f"prompt_tokens.{prompt_name}", estimate_tokens(prompt))
+        return prompt
+
+
+def strip_seed(prompt: str) -> str:
+    """
+    Removes the seed from a prompt built by Prompts.get_prompt, where it's always the last line, and normalises
+    whitespace, so prompts that differ only by seed compare equal.
+    """
+    lines = prompt.rstrip().split("\n")
+    if lines[-1].startswith("Seed:"):
+        lines = lines[:-1]
+    return " ".join(" ".join(lines).split())
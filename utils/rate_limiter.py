@@ -0,0 +1,297 @@
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from multiprocessing.managers import BaseManager
+from typing import Iterator, Optional
+import threading, time, logging, os
+
+from utils.metrics import metrics
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens refill continuously at `rate` per second up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: The most tokens the bucket can hold, i.e. the largest burst allowed.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1):
+        """
+        Blocks until the given number of tokens can be taken from the bucket.
+        Requests larger than the capacity are allowed once the bucket is full, leaving it in debt.
+
+        :param amount: The number of tokens to take.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def refund(self, amount: float):
+        """
+        Returns tokens to the bucket, e.g. when fewer were used than estimated. Negative amounts take more.
+
+        :param amount: The number of tokens to return.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of requests in flight, adjusting the limit AIMD-style: it grows by roughly one per
+    limit's worth of successful requests and is cut by a constant factor whenever the provider pushes back.
+    """
+
+    def __init__(self, initial: float = 8, min_limit: float = 1, max_limit: float = 64, decrease_factor: float = 0.5):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            metrics.set_gauge("rate_limiter.in_flight", self.in_flight)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            metrics.set_gauge("rate_limiter.in_flight", self.in_flight)
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            metrics.set_gauge("rate_limiter.concurrency_limit", self.limit)
+            self._condition.notify()
+
+    def on_overload(self):
+        with self._condition:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            metrics.set_gauge("rate_limiter.concurrency_limit", self.limit)
+
+
+class RateLimiter:
+    """
+    The process-wide gate for LLM requests: a requests-per-second bucket, a tokens-per-minute bucket and an
+    adaptive concurrency limit. When the provider returns 429 or a 5xx, the concurrency limit is cut and every
+    caller pauses until any Retry-After has passed.
+    """
+
+    def __init__(self, requests_per_second: float = 10, tokens_per_minute: float = 200000, initial_concurrency: float = 8,
+                 max_concurrency: float = 64):
+        self.requests = TokenBucket(requests_per_second, max(1, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, max_limit=max_concurrency)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Creates a rate limiter configured from the LLM_REQUESTS_PER_SECOND, LLM_TOKENS_PER_MINUTE and
+        LLM_MAX_CONCURRENCY environment variables, falling back to the defaults.
+        """
+        return cls(requests_per_second=float(os.getenv("LLM_REQUESTS_PER_SECOND", 10)),
+                   tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", 200000)),
+                   max_concurrency=float(os.getenv("LLM_MAX_CONCURRENCY", 64)))
+
+    def _wait_for_pause(self):
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def acquire(self, estimated_tokens: int):
+        """
+        Waits until a request may be sent and takes a concurrency slot, which must be given back with release().
+        Prefer slot(), which does both.
+
+        :param estimated_tokens: The estimated input plus maximum output tokens of the request.
+        """
+        self._wait_for_pause()
+        self.concurrency.acquire()
+        try:
+            self.requests.acquire()
+            self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self):
+        self.concurrency.release()
+
+    @contextmanager
+    def slot(self, estimated_tokens: int) -> Iterator[None]:
+        """
+        Waits until a request may be sent and holds a concurrency slot while it runs.
+
+        :param estimated_tokens: The estimated input plus maximum output tokens of the request.
+        """
+        start = time.monotonic()
+        self.acquire(estimated_tokens)
+        try:
+            metrics.observe("rate_limiter.wait_seconds", time.monotonic() - start)
+            yield
+        finally:
+            self.release()
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Corrects the token bucket once the real token usage of a request is known.
+        """
+        self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def report(self, status_code: int, retry_after: Optional[str] = None) -> float:
+        """
+        Feeds the result of a request back into the limiter.
+
+        :param status_code: The HTTP status code of the response.
+        :param retry_after: The Retry-After header, if any.
+        :return: How long callers will be paused for, in seconds.
+        """
+        if status_code == 429 or status_code >= 500:
+            self.concurrency.on_overload()
+            metrics.incr(f"rate_limiter.overload.{status_code}")
+            delay = parse_retry_after(retry_after)
+            if delay:
+                with self._lock:
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                logging.warning(f"LLM API asked to retry after {delay:.1f}s, pausing requests.")
+            return delay
+        if status_code < 400:
+            self.concurrency.on_success()
+        return 0.0
+
+
+class SharedRateLimiter:
+    """
+    A rate limiter served by another process, so a pool of worker processes stays inside one set of provider limits
+    between them. Has the same interface as RateLimiter. See serve_rate_limiter and connect_rate_limiter.
+    """
+
+    def __init__(self, remote, max_concurrency: float):
+        """
+        :param remote: A proxy for the RateLimiter in the serving process.
+        :param max_concurrency: The serving limiter's maximum concurrency.
+        """
+        self.remote = remote
+        # Only sizes this process's thread pools; the limit itself is enforced by the serving process
+        self.concurrency = AdaptiveConcurrency(max_limit=max_concurrency)
+
+    @contextmanager
+    def slot(self, estimated_tokens: int) -> Iterator[None]:
+        start = time.monotonic()
+        self.remote.acquire(estimated_tokens)
+        try:
+            metrics.observe("rate_limiter.wait_seconds", time.monotonic() - start)
+            yield
+        finally:
+            self.remote.release()
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        self.remote.settle(estimated_tokens, actual_tokens)
+
+    def report(self, status_code: int, retry_after: Optional[str] = None) -> float:
+        return self.remote.report(status_code, retry_after)
+
+
+class RateLimiterManager(BaseManager):
+    """
+    Serves a rate limiter to other processes over a local socket.
+    """
+    pass
+
+
+def serve_rate_limiter(limiter: RateLimiter) -> tuple[tuple[str, int], bytes]:
+    """
+    Serves a rate limiter to other processes from a daemon thread in this one, for as long as this process runs.
+
+    :return: The address and authentication key to pass to connect_rate_limiter.
+    """
+    authkey = os.urandom(16)
+    RateLimiterManager.register("rate_limiter", callable=lambda: limiter,
+                                exposed=("acquire", "release", "settle", "report"))
+    server = RateLimiterManager(address=("127.0.0.1", 0), authkey=authkey).get_server()
+    thread = threading.Thread(target=server.serve_forever, name="rate-limiter-server", daemon=True)
+    thread.start()
+    return server.address, authkey
+
+
+def connect_rate_limiter(address: tuple[str, int], authkey: bytes, max_concurrency: float) -> SharedRateLimiter:
+    """
+    Connects to a rate limiter served by serve_rate_limiter in another process.
+    """
+    RateLimiterManager.register("rate_limiter")
+    manager = RateLimiterManager(address=address, authkey=authkey)
+    manager.connect()
+    return SharedRateLimiter(manager.rate_limiter(), max_concurrency)
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """
+    Parses a Retry-After header given either in seconds or as an HTTP date.
+
+    :param value: The header value.
+    :return: The delay in seconds, or 0 if there is none or it can't be parsed.
+    """
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the rate limiter shared by every LLMClient in the process, creating it from the environment on first use.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter.from_env()
+        return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """
+    Replaces the shared rate limiter. Passing None recreates it from the environment on next use.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = limiter
@@ -0,0 +1,104 @@
+from typing import List, Optional, TextIO
+import re, threading
+
+# Key codes the client sends for backspace, mapped to the '\b' Screen.get_input expects
+BACKSPACE_CODES = (8, 127, 263)
+# A player token is random hex, see client.py
+TOKEN_RE = re.compile(r'[0-9a-f]{32,64}')
+
+
+def read_hello(rfile: TextIO) -> Optional[str]:
+    """
+    Reads the "HELLO <token>" line a client sends when it connects.
+
+    :return: The player's token, or None if the client didn't send a valid one.
+    """
+    parts = rfile.readline().split()
+    if len(parts) == 2 and parts[0] == "HELLO" and TOKEN_RE.fullmatch(parts[1]):
+        return parts[1]
+    return None
+
+
+class RemoteWindow:
+    """
+    Stands in for a curses window for a remote session. Drawing goes into an in-memory buffer which is sent to
+    the client as a frame on every refresh, and keypresses are read from the client one per line.
+
+    Protocol (one message per line, UTF-8):
+        client -> server: "HELLO <token>" once on connecting, identifying the player, see read_hello
+        server -> client: "FRAME <row count>", followed by that many rows of text
+        client -> server: "KEY <key code>"
+    """
+
+    def __init__(self, rfile: TextIO, wfile: TextIO, width: int = 70, height: int = 24):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.width = width
+        self.height = height
+        self.rows: List[str] = []
+        self.y = 0
+        self.x = 0
+        self._write_lock = threading.Lock()
+
+    def keypad(self, flag: bool):
+        pass
+
+    def getmaxyx(self) -> tuple[int, int]:
+        return self.height, self.width
+
+    def getyx(self) -> tuple[int, int]:
+        return self.y, self.x
+
+    def move(self, y: int, x: int):
+        self.y, self.x = y, x
+
+    def clear(self):
+        self.rows = []
+        self.y = self.x = 0
+
+    def addstr(self, *args):
+        """
+        Writes text at the given position, or at the cursor if no position is given, like curses.window.addstr.
+        """
+        if len(args) >= 3:
+            y, x, text = args[0], args[1], str(args[2])
+        else:
+            y, x, text = self.y, self.x, str(args[0])
+        while len(self.rows) <= y:
+            self.rows.append("")
+        row = self.rows[y].ljust(x)
+        self.rows[y] = row[:x] + text + row[x + len(text):]
+        self.y, self.x = y, x + len(text)
+
+    def instr(self, y: int, x: int, n: Optional[int] = None) -> bytes:
+        row = self.rows[y] if y < len(self.rows) else ""
+        text = row[x:] if n is None else row[x:x + n]
+        return text.encode('utf-8')
+
+    def refresh(self):
+        lines = [row.replace('\n', ' ') for row in self.rows]
+        with self._write_lock:
+            self.wfile.write(f"FRAME {len(lines)}\n" + "".join(line + "\n" for line in lines))
+            self.wfile.flush()
+
+    def getch(self) -> int:
+        """
+        Blocks until the client sends a key.
+
+        :return: The key code.
+        """
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                raise ConnectionError("Client disconnected.")
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == "KEY" and parts[1].lstrip('-').isdigit():
+                return int(parts[1])
+
+    def get_wch(self) -> str|int:
+        code = self.getch()
+        if code in BACKSPACE_CODES:
+            return '\b'
+        if code == 13:
+            return '\n'
+        return chr(code) if 0 <= code < 0x110000 else code
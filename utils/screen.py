@@ -1,16 +1,20 @@
 from pydantic import BaseModel, Field, field_serializer
 from typing import List, Optional
-import curses, time
+import curses, logging, time
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from support.gamestate import GameState
 import textwrap
 
+from utils.profiling import PROFILE_KEY, profiled, profiler
+
 class Screen(BaseModel):
     stdscr: Optional[curses.window] = Field(None)
     width: int = Field(default=70)
     height: int = Field(default=10)
+    # Whether PROFILE_KEY toggles the process-wide profiler. Off for remote sessions, which don't own the process.
+    profiling: bool = Field(True)
 
     def __getstate__(self):
         state = self.__dict__.copy()
@@ -46,7 +50,28 @@ class Screen(BaseModel):
         curses.curs_set(0)
         stdscr.keypad(True)
         return cls(stdscr=stdscr, width=width, height=height)
+
+    @classmethod
+    def create_for_window(cls, window, width: int = 70, height: int = 24, profiling: bool = True):
+        """
+        Creates a Screen that draws to an existing curses-like window (e.g. a remote session) instead of the local terminal.
+
+        :param window: An object providing the curses.window methods used by Screen.
+        :param width: The width of the screen.
+        :param height: The height of the screen.
+        :param profiling: Whether PROFILE_KEY toggles the profiler, rather than being passed on like any other key.
+        :return: A new Screen instance.
+        """
+        return cls.model_construct(stdscr=window, width=width, height=height, profiling=profiling)
     
+    @property
+    def is_terminal(self) -> bool:
+        """
+        Whether the screen draws to the local curses terminal rather than some other window-like object.
+        """
+        return isinstance(self.stdscr, curses.window)
+
+    @profiled("screen.wrap_text")
     def wrap_text(self, text: str|List[str], *args:str) -> List[str]:
         """
         Wraps the given text to fit within the specified width and splits it into lines.
@@ -68,6 +93,7 @@ class Screen(BaseModel):
 
         return new_text
 
+    @profiled("screen.draw")
     def display(self, text: str, *args: str, fromline: int = 0, clear: bool = True):
         """
         Displays a simple text message on the screen.
@@ -87,6 +113,7 @@ class Screen(BaseModel):
                 self.stdscr.addstr(i+fromline, 0, line)
             self.stdscr.refresh()
 
+    @profiled("screen.draw")
     def display_options(self, description: str = "", options: List[str] = [], fromline: int = 0, clear: bool = True):
         """
         Displays a list of options on the screen.
@@ -197,6 +224,7 @@ class Screen(BaseModel):
         """
         Handles keypress events in the curses window.\\
         If 'q' is pressed, it will save the game state and exit.\\
+        PROFILE_KEY toggles profiling, see utils.profiling, and then waits for another key.
         Otherwise, it will return the key pressed.
 
         :param stdscr: The curses window object.
@@ -204,17 +232,25 @@ class Screen(BaseModel):
         :return: The key pressed by the user, unless otherwise handled.
         """
         if self.stdscr is not None:
-            c = self.stdscr.getch()
+            with profiler.span("screen.wait_key"):
+                c = self.stdscr.getch()
 
             if c == ord('q'):
                 if game_state is not None: 
+                    # Nothing still generating is going to be used, so stop paying for it
+                    game_state.llm_client.cancel_token.cancel()
                     self.display("Quitting...", "Saving game...")
                     game_state.save()
                     self.temp_display(2, "Quitting...", "Saved game.")
                 else:
                     self.temp_display(2, "Quitting...")
                 exit(0)
-            
+
+            elif c == PROFILE_KEY and self.profiling:
+                written = profiler.toggle()
+                logging.info(f"Profile written to {written}." if written else "Profiling toggled on from the keyboard.")
+                return self.handle_keypress(game_state)
+
             else:
                 return c
         else:
@@ -248,10 +284,14 @@ class Screen(BaseModel):
                             x = len(prev_line)
                         self.stdscr.move(y, x-1)
                 elif charlim is None or len(user_input) < charlim:  # Limit input length to 50 characters
-                    curses.echo()
+                    if self.is_terminal:
+                        curses.echo()
                     user_input += str(char)
                     self.stdscr.addstr(str(char))
-                    curses.noecho()
-            curses.noecho()
+                    self.stdscr.refresh()
+                    if self.is_terminal:
+                        curses.noecho()
+            if self.is_terminal:
+                curses.noecho()
             return user_input
         return ""
\ No newline at end of file
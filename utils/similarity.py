@@ -0,0 +1,135 @@
+"""
+A small CPU-only index for spotting near-duplicate generated text. Each text is reduced to a MinHash signature
+over its character 3-grams, and the signatures are bucketed with locality-sensitive hashing, so checking a new
+item only compares it against the few existing items that share a bucket rather than against everything.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import re, threading, zlib
+import numpy as np
+
+# A prime above any 32-bit shingle hash, small enough that a * x + b can't overflow 64 bits
+PRIME = (1 << 31) - 1
+SHINGLE_SIZE = 3
+
+
+def normalise(text: str) -> str:
+    """
+    Lowercases text and strips punctuation, extra whitespace and a leading "the", so trivial variations match.
+    """
+    text = re.sub(r"[^\w\s]", "", text.lower())
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[4:] if text.startswith("the ") else text
+
+
+def shingles(text: str) -> np.ndarray:
+    """
+    Hashes the character n-grams of normalised text. Uses crc32 rather than hash() so signatures are the same in
+    every process and can be saved.
+    """
+    if len(text) <= SHINGLE_SIZE:
+        grams = {text}
+    else:
+        grams = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+class SimilarityIndex:
+    """
+    Near-duplicate detection over names, descriptions and other generated text, kept separately per kind.
+    Two texts count as duplicates when the estimated Jaccard similarity of their 3-grams reaches the threshold.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        """
+        :param threshold: The estimated similarity at or above which two texts are duplicates.
+        :param num_perm: The number of hash functions in each signature.
+        :param bands: The number of LSH bands the signature is split into. More bands catch less similar pairs.
+        :param seed: Seeds the hash functions. Must stay the same for saved signatures to remain comparable.
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)
+        self.texts: List[Tuple[str, str]] = []
+        self.signatures: List[np.ndarray] = []
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[Tuple[str, int, bytes], List[int]] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # The buckets are rebuilt from the signatures on load, which keeps saves small. Taken under the lock so a
+        # text being added on another thread can't leave the texts and signatures out of step.
+        with self._lock:
+            return {"threshold": self.threshold, "num_perm": self.num_perm, "bands": self.bands, "seed": self.seed,
+                    "texts": list(self.texts), "signatures": np.array(self.signatures, dtype=np.uint32).reshape(-1, self.num_perm)}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["threshold"], state["num_perm"], state["bands"], state["seed"])
+        for (kind, text), signature in zip(state["texts"], state["signatures"].astype(np.uint64)):
+            self._insert(kind, text, signature)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(normalise(text))
+        if len(hashes) == 0:
+            return np.full(self.num_perm, PRIME, dtype=np.uint64)
+        return ((hashes[:, None] * self._a[None, :] + self._b[None, :]) % PRIME).min(axis=0)
+
+    def _band_keys(self, kind: str, signature: np.ndarray) -> Iterable[Tuple[str, int, bytes]]:
+        rows = self.num_perm // self.bands
+        for band in range(self.bands):
+            yield kind, band, signature[band * rows:(band + 1) * rows].tobytes()
+
+    def _insert(self, kind: str, text: str, signature: np.ndarray):
+        item = len(self.texts)
+        self.texts.append((kind, text))
+        self.signatures.append(signature)
+        self._exact.setdefault((kind, normalise(text)), item)
+        for key in self._band_keys(kind, signature):
+            self._buckets.setdefault(key, []).append(item)
+
+    def _find(self, kind: str, text: str, signature: np.ndarray) -> Optional[str]:
+        exact = self._exact.get((kind, normalise(text)))
+        if exact is not None:
+            return self.texts[exact][1]
+        candidates = {item for key in self._band_keys(kind, signature) for item in self._buckets.get(key, [])}
+        for item in candidates:
+            if np.mean(self.signatures[item] == signature) >= self.threshold:
+                return self.texts[item][1]
+        return None
+
+    def find(self, kind: str, text: str) -> Optional[str]:
+        """
+        Looks for an existing text of the same kind that is a near-duplicate of this one.
+
+        :return: The existing text, or None if this one is new.
+        """
+        signature = self.signature(text)
+        with self._lock:
+            return self._find(kind, text, signature)
+
+    def add(self, kind: str, text: str):
+        signature = self.signature(text)
+        with self._lock:
+            self._insert(kind, text, signature)
+
+    def add_unique(self, kind: str, texts: List[Optional[str]]) -> List[int]:
+        """
+        Adds a batch of texts, skipping any that duplicate an existing text or an earlier text in the batch.
+        None entries are ignored.
+
+        :return: The positions in the batch of the texts that were duplicates and weren't added.
+        """
+        signatures = [self.signature(text) if text is not None else None for text in texts]
+        duplicates = []
+        with self._lock:
+            for i, (text, signature) in enumerate(zip(texts, signatures)):
+                if text is None:
+                    continue
+                if self._find(kind, text, signature) is not None:
+                    duplicates.append(i)
+                else:
+                    self._insert(kind, text, signature)
+        return duplicates
@@ -0,0 +1,90 @@
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Optional
+import threading
+
+from utils.cancellation import CancelToken
+
+
+@dataclass(slots=True)
+class Flight:
+    """
+    One call in progress, shared by everyone waiting on its result. It has its own cancel token, which is only
+    cancelled once every waiter has given up.
+    """
+    key: Hashable
+    token: CancelToken = field(default_factory=CancelToken)
+    # The result everyone waits on, and the underlying call that provides it
+    future: Future = field(default_factory=Future)
+    call: Optional[Future] = None
+    waiters: int = 1
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in progress, later calls for the same key wait
+    on its result instead of starting their own. Once the call finishes the key is forgotten, so results are never
+    cached, only shared between calls that overlap.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable, start: Callable[[CancelToken], Future]) -> tuple[Flight, bool]:
+        """
+        Waits on the call in progress for a key, or starts one.
+
+        :param key: Identifies calls that would return the same result.
+        :param start: Starts the call, given the flight's cancel token, and returns a future for its result.
+        :return: The flight, and whether it was already in progress.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.future.done():
+                flight.waiters += 1
+                return flight, True
+            flight = self._flights[key] = Flight(key=key)
+        # Started outside the lock; anyone joining meanwhile waits on the flight's own future
+        try:
+            flight.call = start(flight.token)
+        except BaseException as e:
+            self._forget(flight)
+            flight.future.set_exception(e)
+            return flight, False
+        flight.call.add_done_callback(lambda done: self._settle(flight, done))
+        return flight, False
+
+    def _settle(self, flight: Flight, done: Future):
+        self._forget(flight)
+        if done.cancelled():
+            flight.future.cancel()
+        elif done.exception() is not None:
+            flight.future.set_exception(done.exception())
+        else:
+            flight.future.set_result(done.result())
+
+    def _forget(self, flight: Flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def leave(self, flight: Flight) -> bool:
+        """
+        Gives up waiting on a flight. The last waiter to leave cancels the call.
+
+        :return: Whether the call was cancelled before it started.
+        """
+        with self._lock:
+            flight.waiters -= 1
+            last = flight.waiters == 0
+            if last and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if not last:
+            return False
+        flight.token.cancel()
+        return flight.call is not None and flight.call.cancel()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,217 @@
+"""
+Cost accounting and budgets for LLM calls. Every call's cost is recorded against its session, its world, its call
+site (the prompt type) and the day, and each can have a budget. As the tightest applicable budget runs down,
+generation degrades in stages rather than stopping: shorter replies, then cheaper models, then only reusing earlier
+replies, then template content only. This keeps a fleet of sessions inside a fixed daily budget.
+
+Configured from the environment, in USD, all optional:
+    LLM_BUDGET_SESSION  per session, for as long as the process runs
+    LLM_BUDGET_WORLD    per world, across every time it's loaded
+    LLM_BUDGET_DAILY    for the whole process, per UTC day
+    LLM_BUDGET_SITES    per call site per UTC day, e.g. "summary=0.5,event=2"
+"""
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+import datetime, logging, os, threading, zlib
+
+from utils.metrics import metrics
+from utils.prompts import strip_seed
+
+NORMAL, SHORT, CHEAP, CACHE_ONLY, FALLBACK = range(5)
+STAGES = ["normal", "short", "cheap", "cache_only", "fallback"]
+# The fraction of a budget used at which each stage starts
+STAGE_THRESHOLDS = [0.0, 0.7, 0.85, 0.95, 1.0]
+
+SHORT_TOKEN_FACTOR = 0.5     # max_tokens is scaled by this from the short stage on
+MIN_SHORT_TOKENS = 10        # but never below this
+CHEAP_MODEL_FRACTION = 0.3   # the cheapest fraction of models used from the cheap stage on
+
+CACHE_SIZE = 2048            # prompts remembered for the cache-only stage
+CACHE_VARIANTS = 8           # replies remembered per prompt, so reused names still vary
+
+
+class BudgetExceededError(Exception):
+    """
+    Raised instead of calling the LLM when a budget doesn't allow it, so the caller falls back to template content.
+    """
+    pass
+
+
+def parse_sites(value: str) -> Dict[str, float]:
+    budgets = {}
+    for part in value.split(","):
+        if "=" in part:
+            site, amount = part.split("=", 1)
+            budgets[site.strip()] = float(amount)
+    return budgets
+
+
+class SpendLedger:
+    """
+    Thread-safe running totals of LLM spend, and the budgets they're checked against.
+    """
+
+    def __init__(self, session_budget: Optional[float] = None, world_budget: Optional[float] = None,
+                 daily_budget: Optional[float] = None, site_budgets: Optional[Dict[str, float]] = None):
+        """
+        :param session_budget: The most one session may spend.
+        :param world_budget: The most one world may spend.
+        :param daily_budget: The most the process may spend per UTC day.
+        :param site_budgets: The most each call site may spend per UTC day, by prompt type.
+        """
+        self.session_budget = session_budget
+        self.world_budget = world_budget
+        self.daily_budget = daily_budget
+        self.site_budgets = site_budgets or {}
+        self._spent: Dict[Tuple[Hashable, ...], float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        def budget(name: str) -> Optional[float]:
+            value = os.getenv(name)
+            return float(value) if value else None
+        return cls(budget("LLM_BUDGET_SESSION"), budget("LLM_BUDGET_WORLD"), budget("LLM_BUDGET_DAILY"),
+                   parse_sites(os.getenv("LLM_BUDGET_SITES", "")))
+
+    def _scopes(self, session_id: Optional[str], world: Optional[int], site: str) -> List[Tuple[Tuple[Hashable, ...], Optional[float]]]:
+        """
+        The totals a call counts towards, each with its budget.
+        """
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        return [
+            (("session", session_id or "local"), self.session_budget),
+            (("world", world), self.world_budget),
+            (("day", today), self.daily_budget),
+            (("site", today, site), self.site_budgets.get(site)),
+        ]
+
+    def record(self, session_id: Optional[str], world: Optional[int], site: str, cost: float):
+        """
+        Adds the cost of a call to every total it counts towards.
+        """
+        with self._lock:
+            for key, _ in self._scopes(session_id, world, site):
+                self._spent[key] = self._spent.get(key, 0.0) + cost
+        metrics.incr("spend.usd", cost)
+        metrics.incr(f"spend.usd.{site}", cost)
+
+    def restore_world(self, world: int, cost: float):
+        """
+        Carries a loaded world's earlier spend over, so its budget covers every time it has been played.
+        """
+        with self._lock:
+            key = ("world", world)
+            self._spent[key] = max(self._spent.get(key, 0.0), cost)
+
+    @property
+    def budgeted(self) -> bool:
+        return bool(self.site_budgets) or any(budget is not None for budget in (self.session_budget, self.world_budget, self.daily_budget))
+
+    def spent(self, kind: str, *key: Hashable) -> float:
+        with self._lock:
+            return self._spent.get((kind, *key), 0.0)
+
+    def usage(self, session_id: Optional[str], world: Optional[int], site: Optional[str]) -> float:
+        """
+        The fraction used of the tightest budget a call would count towards, or 0 if none apply.
+
+        :param site: The call site, or None for the tightest of every site's budget, e.g. for display.
+        """
+        scopes = self._scopes(session_id, world, site or "")
+        if site is None:
+            today = scopes[-1][0][1]
+            scopes += [(("site", today, name), budget) for name, budget in self.site_budgets.items()]
+        with self._lock:
+            return max((self._spent.get(key, 0.0) / budget for key, budget in scopes
+                        if budget is not None and budget > 0), default=0.0)
+
+    def stage(self, session_id: Optional[str], world: Optional[int], site: str) -> int:
+        """
+        How far a call should degrade to stay inside its budgets, one of NORMAL, SHORT, CHEAP, CACHE_ONLY or FALLBACK.
+        """
+        usage = self.usage(session_id, world, site)
+        stage = max(i for i, threshold in enumerate(STAGE_THRESHOLDS) if usage >= threshold)
+        metrics.set_gauge("spend.stage", stage)
+        if stage != NORMAL:
+            metrics.incr(f"spend.degraded.{STAGES[stage]}")
+        return stage
+
+
+def short_tokens(max_tokens: int) -> int:
+    return max(MIN_SHORT_TOKENS, int(max_tokens * SHORT_TOKEN_FACTOR))
+
+
+def cheapest(models: list) -> list:
+    """
+    The cheapest CHEAP_MODEL_FRACTION of models, by combined input and output price. Always at least one.
+    """
+    ranked = sorted(models, key=lambda model: model.token_input_cost + model.token_output_cost)
+    return ranked[:max(1, round(len(ranked) * CHEAP_MODEL_FRACTION))]
+
+
+class ResponseCache:
+    """
+    Recent validated replies, by prompt type and prompt with the seed left out, so the cache-only stage can reuse
+    an earlier reply to the same request instead of paying for a new one. A few replies are kept per prompt and
+    picked between by seed, so repeated requests for e.g. names don't all get the same answer.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, variants: int = CACHE_VARIANTS):
+        self.size = size
+        self.variants = variants
+        self._entries: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(gen_type: str, prompt: str) -> Tuple[str, str]:
+        return gen_type, strip_seed(prompt)
+
+    def add(self, gen_type: str, prompt: str, text: str):
+        key = self.key(gen_type, prompt)
+        with self._lock:
+            replies = self._entries.setdefault(key, [])
+            self._entries.move_to_end(key)
+            if text not in replies:
+                replies.append(text)
+                del replies[:-self.variants]
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get(self, gen_type: str, prompt: str) -> Optional[str]:
+        """
+        Picks one of the replies remembered for a prompt, by its seed.
+        """
+        key = self.key(gen_type, prompt)
+        with self._lock:
+            replies = self._entries.get(key)
+            if not replies:
+                return None
+            self._entries.move_to_end(key)
+            return replies[zlib.crc32(prompt.encode()) % len(replies)]
+
+
+_ledger: Optional[SpendLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> SpendLedger:
+    """
+    Returns the spend ledger shared by every LLMClient in the process, creating it from the environment on first use.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = SpendLedger.from_env()
+            logging.info(f"LLM budgets: session {_ledger.session_budget}, world {_ledger.world_budget}, "
+                         f"daily {_ledger.daily_budget}, sites {_ledger.site_budgets}")
+        return _ledger
+
+
+def set_ledger(ledger: Optional[SpendLedger]):
+    """
+    Replaces the shared spend ledger. Passing None recreates it from the environment on next use.
+    """
+    global _ledger
+    with _ledger_lock:
+        _ledger = ledger
@@ -0,0 +1,132 @@
+"""
+Checks generated text against what each prompt type asked for (one line, one sentence, a few words, no markdown)
+and repairs what it can locally, so most badly formatted replies are fixed without another round trip to the LLM.
+Only replies that can't be repaired are regenerated, with the reason added to the prompt.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import re
+
+from utils.base_utils import slots_getstate, slots_setstate
+from utils.metrics import metrics
+
+
+class InvalidOutputError(Exception):
+    """
+    Raised when the LLM's reply still doesn't fit the prompt type after repair and regeneration.
+    """
+    pass
+
+
+@dataclass(slots=True)
+class OutputRules:
+    """
+    What a valid reply to one prompt type looks like.
+    """
+    single_line: bool = False
+    one_sentence: bool = False
+    max_words: Optional[int] = None
+    max_chars: Optional[int] = None
+
+    __getstate__ = slots_getstate
+    __setstate__ = slots_setstate
+
+
+RULES: Dict[str, OutputRules] = {
+    "name": OutputRules(single_line=True, max_words=6, max_chars=60),
+    "currency": OutputRules(single_line=True, max_words=4, max_chars=40),
+    "specialization": OutputRules(single_line=True, max_words=5, max_chars=60),
+    "description": OutputRules(single_line=True, one_sentence=True, max_chars=400),
+    "specialized_description": OutputRules(single_line=True, one_sentence=True, max_chars=400),
+    "event": OutputRules(max_chars=2000),
+    "outcome": OutputRules(max_chars=2000),
+    "summary": OutputRules(max_chars=1200),
+}
+
+# Labels the LLM sometimes puts before its answer, e.g. "Name: Ashford"
+LABEL = re.compile(r"^(name|description|skill|specialization|specialisation|currency|summary|outcome|event)\s*:\s*", re.IGNORECASE)
+HEADING = re.compile(r"^\s*#+\s*")
+BULLET = re.compile(r"^\s*(?:[-*+•]|\d+[.)])\s+")
+EMPHASIS = re.compile(r"(\*\*|__|\*|`)")
+MARKDOWN = re.compile(r"(^|\n)\s*#|\*\*|__|`|(^|\n)\s*[-*+]\s")
+SENTENCE_END = re.compile(r"(\w*)[.!?][\"'”’]?(?=\s+[\"'“‘]?[A-Z])")
+# Words ending in a full stop that don't end the sentence, common in place and character names
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "mt", "ft", "jr", "sr", "fr", "capt", "lt", "sgt", "col", "gen", "prof"}
+QUOTES = "\"'“”‘’"
+
+
+def repair(gen_type: str, text: str) -> str:
+    """
+    Fixes common formatting slips in a reply: code fences, headings, bullets, emphasis, labels and surrounding
+    quotes, then keeps only the first line or sentence if the prompt type asked for one.
+
+    :param gen_type: The prompt type the reply is for.
+    :param text: The reply.
+    :return: The repaired reply.
+    """
+    rules = RULES.get(gen_type, OutputRules())
+    lines = [line for line in text.replace("\r", "").split("\n") if line.strip() and not line.strip().startswith("```")]
+    # A heading followed by the actual content is just a title, so drop it
+    if len(lines) > 1 and HEADING.match(lines[0]):
+        lines = lines[1:]
+    lines = [LABEL.sub("", EMPHASIS.sub("", BULLET.sub("", HEADING.sub("", line)))).strip() for line in lines]
+    lines = [line for line in lines if line]
+    if rules.single_line:
+        lines = lines[:1]
+    text = "\n".join(lines).strip()
+    if len(text) > 1 and text[0] in QUOTES and text[-1] in QUOTES:
+        text = text[1:-1].strip()
+    if rules.one_sentence:
+        text = first_sentence(text)
+    if rules.max_words is not None:
+        # Names don't end in full stops, but the LLM often adds one
+        text = text.rstrip(".")
+    return re.sub(r"[ \t]+", " ", text)
+
+
+def first_sentence(text: str) -> str:
+    for match in SENTENCE_END.finditer(text):
+        if match.group(1).lower() not in ABBREVIATIONS:
+            return text[:match.end()].strip()
+    return text
+
+
+def validate(gen_type: str, text: str) -> Optional[str]:
+    """
+    Checks a reply against the rules for its prompt type.
+
+    :return: What's wrong with it, phrased to follow "it", or None if it's valid.
+    """
+    rules = RULES.get(gen_type, OutputRules())
+    if not text.strip():
+        return "it was empty"
+    if rules.single_line and "\n" in text.strip():
+        return "it ran over more than one line"
+    if rules.max_words is not None and len(text.split()) > rules.max_words:
+        return f"it was longer than {rules.max_words} words"
+    if rules.max_chars is not None and len(text) > rules.max_chars:
+        return f"it was longer than {rules.max_chars} characters"
+    if MARKDOWN.search(text):
+        return "it used markdown formatting"
+    return None
+
+
+def clean(gen_type: str, text: str) -> Tuple[str, Optional[str]]:
+    """
+    Repairs a reply and checks the result. Counts the replies that only passed because of the repair, each of
+    which would otherwise have cost another request.
+
+    :return: The repaired reply, and what's still wrong with it or None if it's valid.
+    """
+    repaired = repair(gen_type, text)
+    problem = validate(gen_type, repaired)
+    if problem is None and validate(gen_type, text) is not None:
+        metrics.incr(f"validation.repaired.{gen_type}")
+    return repaired, problem
+
+
+def retry_prompt(prompt: str, problem: str) -> str:
+    """
+    Adds the reason the last reply was rejected to a prompt, for a targeted regeneration.
+    """
+    return f"{prompt}\nYour last reply was rejected because {problem}. Reply again, following the instructions exactly."
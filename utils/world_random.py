@@ -0,0 +1,74 @@
+"""
+Seeded randomness for a world. One seed per world is split into an independent stream per subsystem (world layout,
+characters, events, prompt seeds, ...), so the same seed always builds the same world and plays out the same way,
+and adding a random draw to one subsystem doesn't shift the results of the others.
+"""
+from typing import Dict, Optional
+import hashlib, logging, os, random, secrets, threading
+
+# Set to replay a specific world
+SEED_ENV = "WORLD_SEED"
+
+PROMPT_SEED_RANGE = 1000000
+
+
+def derive_seed(*parts) -> int:
+    """
+    Hashes any number of values into a 64-bit seed. Stable across runs and machines, unlike hash().
+    """
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class WorldRandom:
+    """
+    The random number generators for one world, all derived from a single seed.
+    Pickled with the save, so a loaded game carries on from the same point in every stream.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        :param seed: The world seed. Defaults to the WORLD_SEED environment variable, or a fresh random seed.
+        """
+        if seed is None:
+            seed = int(os.environ[SEED_ENV]) if os.getenv(SEED_ENV) else secrets.randbits(63)
+        self.seed = seed
+        self._streams: Dict[str, random.Random] = {}
+        self._lock = threading.Lock()
+        logging.info(f"World seed: {seed}")
+
+    def __getstate__(self):
+        # Copied under the lock, since a stream may be created on another thread while the world is saved
+        with self._lock:
+            return {"seed": self.seed, "_streams": dict(self._streams)}
+
+    def __setstate__(self, state: dict):
+        self.seed = state["seed"]
+        self._streams = state["_streams"]
+        self._lock = threading.Lock()
+
+    def stream(self, name: str) -> random.Random:
+        """
+        Returns the generator for a subsystem, creating it on first use.
+        Draws from one stream should happen in a fixed order (e.g. on the game thread) to be reproducible.
+
+        :param name: The subsystem, e.g. "world", "events" or "prompts".
+        """
+        with self._lock:
+            rng = self._streams.get(name)
+            if rng is None:
+                rng = self._streams[name] = random.Random(derive_seed(self.seed, name))
+            return rng
+
+    def derive(self, *parts) -> random.Random:
+        """
+        Returns a one-off generator keyed on the world seed and the given values rather than on draw order,
+        for decisions made on worker threads where the order of calls isn't fixed.
+        """
+        return random.Random(derive_seed(self.seed, *parts))
+
+    def prompt_seed(self) -> int:
+        """
+        Draws the next seed to put in a prompt.
+        """
+        return self.stream("prompts").randrange(PROMPT_SEED_RANGE)